@@ -1,11 +1,16 @@
 """
 Generates a bunch of random data to test the boxplots
 for the PepTo software
+
+The data is seeded, so the same arguments always give the same files. Values are drawn for every file at once,
+and each file is written as plain text rather than through a pandas DataFrame, so 10^6 files are practical.
+
+Usage: python RandomData.py [n_files] [--seed SEED] [--output FOLDER] [--bulk] [--materials ...] [--anneal-types ...]
 """
 
-import pandas as pd
+import numpy as np
+import argparse
 import os
-from random import uniform, sample, randint
 
 anneal_types = [
     'annealed',
@@ -21,24 +26,119 @@ materials = [
     'aluminum'
 ]
 
-# Generate 100 random csv files of data for each material to test the program
-path = os.getcwd()
-
-for i in range(100):
-    # Data will be of the form
-    # Sample Name, S Parameter, S Uncertainty, Left W Parameter, Left W Uncertainty, Right W Parameter, Right W Uncertainty,
-    # The wing data is totally arbitrary and can always be zero for our needs
-    data = {
-        'Sample Name': \
-            f'{sample(materials, len(materials))[3]}_{sample(anneal_types, len(anneal_types))[0]}_{randint(1, 5_000)}_trial_0{randint(1, 9)}.csv',
-        'S Parameter': uniform(0.48, 0.62),
-        'S Uncertainty': uniform(0.0025, 0.0037),
-        'Left W Parameter': uniform(0.18, 0.32),
-        'Left W Uncertainty': uniform(0.0015, 0.0027),
-        'Right W Parameter': uniform(0.18, 0.32),
-        'Right W Uncertainty': uniform(0.0015, 0.0027),
-    }
-
-    data = pd.DataFrame(data, index = [0])
-    data.to_csv(f"{path}/{data['Sample Name'][0].split('.')[0] + '_pappy.csv'}", index = False)
-    print(f"{str(data['Sample Name'][0])} successfully saved!")
\ No newline at end of file
+# Header of a pappy.csv file
+header = 'Sample Name,S Parameter,S Uncertainty,Left W Parameter,Left W Uncertainty,Right W Parameter,Right W Uncertainty'
+
+# (low, high) of the uniform draw for each parameter
+# The wing data is totally arbitrary and can always be zero for our needs
+ranges = [
+    (0.48, 0.62),
+    (0.0025, 0.0037),
+    (0.18, 0.32),
+    (0.0015, 0.0027),
+    (0.18, 0.32),
+    (0.0015, 0.0027)
+]
+
+def GenerateRecords(n_records, seed = 0, materials = materials, anneal_types = anneal_types):
+    """Draws the sample names and parameters of n_records measurements
+
+    Sample IDs are the record numbers, so names never collide however many records are made.
+
+    Args:
+        n_records (int): number of measurements
+        seed (int): seed of the random generator
+        materials (list): materials to draw from
+        anneal_types (list): anneal types to draw from
+
+    Returns:
+        tuple: list of sample names ('material_anneal_id_trial_0N.csv') and (n_records, 6) array of parameters
+    """
+    rng = np.random.default_rng(seed)
+
+    material_draws = rng.integers(0, len(materials), n_records)
+    anneal_draws = rng.integers(0, len(anneal_types), n_records)
+    trials = rng.integers(1, 10, n_records)
+    values = np.column_stack([rng.uniform(low, high, n_records) for (low, high) in ranges])
+
+    names = [
+        f"{materials[material]}_{anneal_types[anneal]}_{index + 1}_trial_0{trial}.csv"
+        for index, (material, anneal, trial) in enumerate(zip(material_draws.tolist(), anneal_draws.tolist(), trials.tolist()))
+    ]
+
+    return names, values
+
+def FormatRow(name, values):
+    return name + ',' + ','.join(repr(value) for value in values)
+
+def GenerateFiles(folder, n_files, seed = 0, materials = materials, anneal_types = anneal_types, files_per_folder = 1000):
+    """Writes n_files single measurement pappy.csv files
+
+    Args:
+        folder (string): folder to write in
+        n_files (int): number of files
+        seed (int): seed of the random generator
+        materials (list): materials to draw from
+        anneal_types (list): anneal types to draw from
+        files_per_folder (int): files beyond this are spread over 'batch_0000', 'batch_0001', ... subfolders, None keeps them all in folder
+
+    Returns:
+        list: paths of the files relative to folder
+    """
+    names, values = GenerateRecords(n_files, seed, materials, anneal_types)
+    paths = []
+
+    for index, (name, row) in enumerate(zip(names, values.tolist())):
+        if files_per_folder is None or n_files <= files_per_folder:
+            subfolder = ''
+        else:
+            subfolder = f"batch_{index // files_per_folder:04d}/"
+            if index % files_per_folder == 0:
+                os.makedirs(os.path.join(folder, subfolder), exist_ok = True)
+
+        path = subfolder + name.split('.')[0] + '_pappy.csv'
+        with open(os.path.join(folder, path), 'w') as file:
+            file.write(header + '\n' + FormatRow(name, row) + '\n')
+        paths.append(path)
+
+    return paths
+
+def GenerateBulk(path, n_records, seed = 0, materials = materials, anneal_types = anneal_types):
+    """Writes the same records GenerateFiles would make as one csv file, one row per measurement
+
+    Args:
+        path (string): file to write
+        n_records (int): number of measurements
+        seed (int): seed of the random generator
+        materials (list): materials to draw from
+        anneal_types (list): anneal types to draw from
+
+    Returns:
+        string: path of the file
+    """
+    names, values = GenerateRecords(n_records, seed, materials, anneal_types)
+
+    with open(path, 'w') as file:
+        file.write(header + '\n')
+        file.writelines(FormatRow(name, row) + '\n' for name, row in zip(names, values.tolist()))
+
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate random pappy.csv files for testing PepTo')
+    parser.add_argument('n_files', nargs = '?', type = int, default = 100)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--output', default = os.getcwd())
+    parser.add_argument('--bulk', action = 'store_true', help = 'write one csv with a row per measurement instead of one file each')
+    parser.add_argument('--materials', nargs = '+', default = materials)
+    parser.add_argument('--anneal-types', nargs = '+', default = anneal_types)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok = True)
+
+    if args.bulk:
+        path = GenerateBulk(os.path.join(args.output, f"random_{args.n_files}_bulk.csv"), args.n_files, args.seed, args.materials, args.anneal_types)
+        print(f"{args.n_files} records successfully saved to '{path}'!")
+    else:
+        GenerateFiles(args.output, args.n_files, args.seed, args.materials, args.anneal_types)
+        print(f"{args.n_files} pappy files successfully saved to '{args.output}'!")
@@ -0,0 +1,208 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Persistent cache of parsed pappy.csv files for PepTo
+"""
+from PappyFiles import ReadPappyFiles, N_PARAMETERS
+import numpy as np
+import time
+import os
+
+# Default name of the cache file, kept next to the data
+CACHE_NAME = '.pepto_cache.npz'
+
+class ManifestCache(object):
+    def __init__(self, cache_path = None):
+        """Cache of already parsed pappy.csv files, keyed by path, modification time and size
+
+        Args:
+            cache_path (string): path to the .npz cache file, default None uses CACHE_NAME in the current working directory
+        """
+        self.cache_path = os.path.join(os.getcwd(), CACHE_NAME) if cache_path is None else cache_path
+
+        # Counts from the last Read() call
+        self.report = None
+
+        self.Load()
+
+        return None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def Clear(self):
+        """Empties the cache in memory, the file is left until the next Save()
+
+        Returns:
+            None
+        """
+        self.paths = np.empty(0, dtype = str)
+        self.stamps = np.empty((0, 2), dtype = np.int64) # (mtime in ns, size in bytes) of each file
+        self.values = np.empty((0, N_PARAMETERS), dtype = np.float64)
+        self.index = {}
+
+        return None
+
+    def Load(self):
+        """Loads the cache file if there is one, a missing or unreadable file gives an empty cache
+
+        Returns:
+            None
+        """
+        self.Clear()
+
+        if not os.path.exists(self.cache_path):
+            return None
+
+        try:
+            with np.load(self.cache_path, allow_pickle = False) as cache:
+                paths, stamps, values = cache['paths'], cache['stamps'], cache['values']
+        except (OSError, KeyError, ValueError):
+            # A damaged cache only costs a full read, so start over
+            return None
+
+        self.SetEntries(paths, stamps, values)
+
+        return None
+
+    def Prune(self):
+        """Evicts the cached files that no longer exist on disk, one stat per cached file
+
+        Returns:
+            int: number of files evicted
+        """
+        kept = [index for file_path, index in self.index.items() if os.path.exists(file_path)]
+        evictions = len(self.index) - len(kept)
+
+        if evictions > 0:
+            self.SetEntries(self.paths[kept], self.stamps[kept], self.values[kept])
+
+        return evictions
+
+    def Save(self, prune = True):
+        """Writes the cache file, through a temporary file so a crash never leaves half a cache behind
+
+        Args:
+            prune (bool): Default 'True' first evicts the files that no longer exist (see Prune), if 'False' writes the entries as they are
+
+        Returns:
+            int: number of files evicted
+        """
+        evictions = self.Prune() if prune else 0
+        temporary_path = self.cache_path + '.tmp'
+
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, paths = self.paths, stamps = self.stamps, values = self.values)
+
+        os.replace(temporary_path, self.cache_path)
+
+        return evictions
+
+    def SetEntries(self, paths, stamps, values):
+        """Replaces the entries of the cache and rebuilds the path lookup
+
+        Args:
+            paths (array): file paths
+            stamps (array): (n, 2) modification time in ns and size in bytes of each file
+            values (array): (n, 6) parsed parameters of each file
+
+        Returns:
+            None
+        """
+        self.paths = np.asarray(paths, dtype = str)
+        self.stamps = np.asarray(stamps, dtype = np.int64).reshape(-1, 2)
+        self.values = np.asarray(values, dtype = np.float64).reshape(-1, N_PARAMETERS)
+        self.index = {path: index for index, path in enumerate(self.paths.tolist())}
+
+        return None
+
+    def Read(self, file_paths, workers = None, processes = False, quarantine = False, progress = None):
+        """Reads pappy.csv files through the cache, parsing only files that are new or have changed
+
+        Files are hits when their path, modification time and size match the cache. Misses are parsed with
+        ReadPappyFiles() and stored. Cached files that were not asked for are kept as they are, so a read only costs
+        a stat of the files asked for; files that no longer exist are evicted by Prune() (or Save()). Files holding
+        several measurements are parsed every time, they are a single read already.
+
+        Args:
+            file_paths (list): paths to the pappy.csv files
+            workers (int): number of parallel readers for the misses, default None reads them serially
+            processes (bool): Default 'False' uses a thread pool, if 'True' uses a process pool
+            quarantine (bool): Default 'False' raises on a file that can't be read, if 'True' its row is NaN, the error goes in the report and the file is not cached
+            progress (callable): Default 'None', otherwise called as progress(files done, total) as the misses are parsed, hits count as done up front
+
+        Returns:
+            tuple: (n, 6) float64 array in the order of file_paths (one row per measurement), and a report dictionary with the number of files, seconds, files per second, hits, misses and the 'rows' and 'names' of ReadPappyFiles
+        """
+        file_paths = list(file_paths)
+        start = time.perf_counter()
+
+        # Stat every requested file, this is all a hit costs
+        stamps = np.empty((len(file_paths), 2), dtype = np.int64)
+        for index, file_path in enumerate(file_paths):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                if not quarantine:
+                    raise
+                # A missing file is never a hit, reading it then reports the error
+                stamps[index] = (-1, -1)
+                continue
+            stamps[index] = (stat.st_mtime_ns, stat.st_size)
+
+        # A file is a hit when it is in the cache with the same modification time and size
+        cached = np.array([self.index.get(file_path, -1) for file_path in file_paths], dtype = np.intp)
+        hits = cached >= 0
+        hits[hits] = (self.stamps[cached[hits]] == stamps[hits]).all(axis = 1)
+
+        # Parse only the new and changed files
+        misses = [file_path for file_path, hit in zip(file_paths, hits) if not hit]
+        if progress is not None:
+            n_hits = len(file_paths) - len(misses)
+            progress(n_hits, len(file_paths))
+            miss_values, read_report = ReadPappyFiles(misses, workers, processes, quarantine = quarantine, progress = lambda done, _: progress(n_hits + done, len(file_paths)))
+        else:
+            miss_values, read_report = ReadPappyFiles(misses, workers, processes, quarantine = quarantine)
+
+        # Every hit is one row, the misses' rows go after the rows of the files before them
+        rows = np.ones(len(file_paths), dtype = np.int64)
+        rows[~hits] = read_report['rows']
+        starts = np.cumsum(rows) - rows
+        values = np.empty((int(rows.sum()), N_PARAMETERS), dtype = np.float64)
+        values[starts[hits]] = self.values[cached[hits]]
+        miss_rows = read_report['rows']
+        within = np.arange(len(miss_values)) - np.repeat(np.cumsum(miss_rows) - miss_rows, miss_rows)
+        values[np.repeat(starts[~hits], miss_rows) + within] = miss_values
+
+        # Files that failed are reported by their position in file_paths, and left out of the cache so they are read
+        # again, as are the files holding several measurements
+        miss_positions = np.flatnonzero(~hits)
+        errors = {int(miss_positions[index]): message for index, message in read_report.get('errors', {}).items()}
+        names = {int(miss_positions[index]): miss_names for index, miss_names in read_report['names'].items()}
+        stored = rows == 1
+        stored[list(errors)] = False
+
+        # The other cached files are kept, the requested ones are replaced by what was just read
+        requested = set(file_paths)
+        kept = [index for file_path, index in self.index.items() if file_path not in requested]
+
+        self.SetEntries(
+            np.concatenate((self.paths[kept], np.asarray(file_paths, dtype = str)[stored])),
+            np.concatenate((self.stamps[kept], stamps[stored])),
+            np.concatenate((self.values[kept], values[starts[stored]]))
+        )
+
+        seconds = time.perf_counter() - start
+        self.report = {
+            'files': len(file_paths),
+            'seconds': seconds,
+            'files_per_second': len(file_paths) / seconds if seconds > 0 else float('inf'),
+            'hits': int(hits.sum()),
+            'misses': len(misses),
+            'rows': rows,
+            'names': names
+        }
+        if quarantine:
+            self.report['errors'] = errors
+
+        return values, self.report
@@ -0,0 +1,632 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Reading of pappy.csv files for PepTo
+"""
+import concurrent.futures
+import collections
+import fnmatch
+import numpy as np
+import time
+import csv
+import os
+import re
+
+# Number of float parameters after the sample name in a pappy.csv row
+N_PARAMETERS = 6
+
+# Header of a pappy.csv file, checked when reading with quarantine on so swapped columns are caught
+PAPPY_HEADER = ['Sample Name', 'S Parameter', 'S Uncertainty', 'Left W Parameter', 'Left W Uncertainty', 'Right W Parameter', 'Right W Uncertainty']
+
+# Errors a single malformed or vanished pappy file can raise while being read
+READ_ERRORS = (OSError, ValueError, IndexError, StopIteration)
+
+# Strict pattern of a pappy.csv file name, e.g. 'tungsten_unannealed_2144_trial_05_pappy.csv'
+PAPPY_PATTERN = re.compile(r'^(?P<material>[a-z]+)_(?P<anneal>[a-z]+)_(?P<sample>\d+)_trial_(?P<trial>\d+)_pappy\.csv$')
+
+# Pattern of the 'Sample Name' column inside a pappy.csv file, e.g. 'tungsten_unannealed_2144_trial_05.csv', with the
+# same optional 'key-value' tags as TAGGED_PATTERN, e.g. 'tungsten_unannealed_temperature-300K_2144_trial_05.csv'
+SAMPLE_PATTERN = re.compile(r'^(?P<material>[a-z]+)_(?P<anneal>[a-z]+)(?P<tags>(?:_[a-z]+-[A-Za-z0-9.+-]+)*)_(?P<sample>\d+)_trial_(?P<trial>\d+)\.csv$')
+
+# Pappy file name with any number of 'key-value' tags after the anneal type,
+# e.g. 'tungsten_unannealed_temperature-300K_dose-1e14_detector-hpge2_2144_trial_05_pappy.csv'
+TAGGED_PATTERN = re.compile(r'^(?P<material>[a-z]+)_(?P<anneal>[a-z]+)(?P<tags>(?:_[a-z]+-[A-Za-z0-9.+-]+)*)_(?P<sample>\d+)_trial_(?P<trial>\d+)_pappy\.csv$')
+
+# Patterns of the record names made by RecordNames(), a pappy file or a 'file:sample name' row of a file holding several
+RECORD_PATTERNS = (TAGGED_PATTERN, SAMPLE_PATTERN)
+
+# Name and version of the PackPappyFiles layout
+PACK_FORMAT = 'pappy-pack-1'
+
+# Worker count for the parallel readers, the same default the standard library uses for I/O bound thread pools
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+def CompilePatterns(patterns):
+    """Compiles glob patterns into a pair of regular expressions, one for entry names and one for relative paths
+
+    Patterns without a '/' are matched against the name of the entry, patterns with one against its path relative to
+    the scan root. Joining them into one expression each keeps the walk to a single match call per entry.
+
+    Args:
+        patterns (list): glob patterns such as '*_pappy.csv' or 'old/*'
+
+    Returns:
+        tuple: compiled name and path expressions, None where there are no patterns of that kind
+    """
+    name_patterns = [fnmatch.translate(pattern) for pattern in patterns if '/' not in pattern]
+    path_patterns = [fnmatch.translate(pattern) for pattern in patterns if '/' in pattern]
+
+    return tuple(re.compile('|'.join(group)) if len(group) > 0 else None for group in (name_patterns, path_patterns))
+
+def MatchesAny(name, relative_path, compiled):
+    """Checks an entry against patterns compiled by CompilePatterns()
+
+    Args:
+        name (string): name of the file or folder
+        relative_path (string): '/' separated path from the scan root
+        compiled (tuple): compiled name and path expressions
+
+    Returns:
+        bool: True if any of the patterns match
+    """
+    name_pattern, path_pattern = compiled
+
+    return (name_pattern is not None and name_pattern.match(name) is not None) or \
+        (path_pattern is not None and path_pattern.match(relative_path) is not None)
+
+def ScanDirectories(root = None, include = ('*_pappy.csv',), exclude = (), max_depth = None):
+    """Lazily walks the tree below root and yields the pappy.csv files it finds
+
+    The walk is breadth first with os.scandir(), so files come out in the same order as GetDirectories() listed them,
+    and the file type comes from the cached directory entry instead of guessing from a dot in the name. Paths are
+    yielded as soon as they are found, so reading can start before the walk is done.
+
+    Args:
+        root (string): folder to start from, default None uses the current working directory
+        include (list): glob patterns a file must match to be yielded, patterns with a '/' match the relative path
+        exclude (list): glob patterns for files and folders to skip, a skipped folder is not entered
+        max_depth (int): how many folders deep to go below root, default None has no limit (0 only scans root)
+
+    Yields:
+        string: '/' separated path of the file relative to root
+    """
+    root = os.getcwd() if root is None else root
+    include_name, include_path = CompilePatterns(include)
+    exclude = CompilePatterns(exclude)
+    check_exclude = exclude != (None, None)
+
+    # Queue of (absolute folder, relative folder, depth) still to scan
+    folders = collections.deque([(root, '', 0)])
+
+    while folders:
+        folder, relative_folder, depth = folders.popleft()
+        descend = max_depth is None or depth < max_depth
+
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            # Folders that vanish or can't be read are skipped rather than ending the walk
+            continue
+
+        with entries:
+            for entry in entries:
+                name = entry.name
+
+                if check_exclude and MatchesAny(name, relative_folder + name, exclude):
+                    continue
+
+                if entry.is_dir(follow_symlinks = False):
+                    if descend:
+                        folders.append((entry.path, relative_folder + name + '/', depth + 1))
+                elif include_name is not None and include_name.match(name) is not None:
+                    yield relative_folder + name
+                elif include_path is not None and include_path.match(relative_folder + name) is not None:
+                    yield relative_folder + name
+
+def MatchName(file_name, pattern):
+    """Matches the last part of a name, the sample name of a 'file:sample name' record or else the file name
+
+    Args:
+        file_name (string): file name, with or without the folders it is in
+        pattern (Pattern): pattern to match, or a tuple of patterns tried in order
+
+    Returns:
+        Match: the first match, or None if the name follows none of the patterns
+    """
+    name = os.path.basename(file_name).rsplit(':', 1)[-1]
+
+    for candidate in (pattern if isinstance(pattern, tuple) else (pattern,)):
+        match = candidate.match(name)
+        if match is not None:
+            return match
+
+    return None
+
+def ParsePappyName(file_name, pattern = PAPPY_PATTERN):
+    """Parses the metadata out of a pappy.csv file name ('material_anneal_sampleid_trial_NN_pappy.csv')
+
+    Args:
+        file_name (string): file name, with or without the folders it is in
+        pattern (Pattern): Default PAPPY_PATTERN for file names, SAMPLE_PATTERN for the sample names inside a file, or a tuple of patterns such as RECORD_PATTERNS
+
+    Returns:
+        dictionary: material, anneal type, sample id (int) and trial (int), or None if the name doesn't follow the pattern
+    """
+    match = MatchName(file_name, pattern)
+
+    if match is None:
+        return None
+
+    return {'material': match['material'], 'anneal': match['anneal'], 'sample': int(match['sample']), 'trial': int(match['trial'])}
+
+def ParseTags(file_name, pattern = TAGGED_PATTERN):
+    """Parses the categorical keys out of a tagged pappy.csv file name, see TAGGED_PATTERN, or a tagged sample name
+
+    Args:
+        file_name (string): file name, with or without the folders it is in
+        pattern (Pattern): Default TAGGED_PATTERN, or a tuple of patterns tried in order
+
+    Returns:
+        dictionary: material, anneal and every tag as strings, plus sample id (int) and trial (int), or None if the name doesn't follow the pattern
+    """
+    match = MatchName(file_name, pattern)
+
+    if match is None:
+        return None
+
+    keys = {'material': match['material'], 'anneal': match['anneal']}
+    tags = match.groupdict().get('tags') or ''
+    for tag in tags.split('_')[1:]:
+        key, value = tag.split('-', 1)
+        keys[key] = value
+    keys['sample'] = int(match['sample'])
+    keys['trial'] = int(match['trial'])
+
+    return keys
+
+class PappyIndex(object):
+    def __init__(self, file_paths = (), pattern = PAPPY_PATTERN):
+        """In-memory index of pappy.csv files by material, anneal type, sample id and trial
+
+        Every file name is parsed once, with the strict PAPPY_PATTERN. Materials and anneal types are stored as integer
+        codes and sample ids and trials as integers, so selections are array comparisons that never look at the
+        names of the files they don't return. Names that don't follow the pattern are kept in self.rejected.
+
+        Args:
+            file_paths (list): paths of pappy.csv files, e.g. from ScanDirectories(), or the sample names of the rows of a bulk file
+            pattern (Pattern): Default PAPPY_PATTERN for file names, SAMPLE_PATTERN for sample names
+        """
+        self.pattern = pattern
+        self.paths = []
+        self.rejected = []
+
+        # Position of every indexed entry among all the names added, so values read alongside the names line up
+        self.positions = np.empty(0, dtype = np.intp)
+        self.n_added = 0
+
+        # Vocabulary of each categorical key, name -> code
+        self.material_codes = {}
+        self.anneal_codes = {}
+
+        self.materials = np.empty(0, dtype = np.intp)
+        self.anneals = np.empty(0, dtype = np.intp)
+        self.samples = np.empty(0, dtype = np.int64)
+        self.trials = np.empty(0, dtype = np.int64)
+
+        self.Add(file_paths)
+
+        return None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def Add(self, file_paths):
+        """Parses and adds more files to the index
+
+        Args:
+            file_paths (list): paths of pappy.csv files
+
+        Returns:
+            int: number of files added (rejected names are not counted)
+        """
+        materials = []
+        anneals = []
+        samples = []
+        trials = []
+        positions = []
+        n_before = len(self.paths)
+
+        for position, file_path in enumerate(file_paths, self.n_added):
+            metadata = ParsePappyName(file_path, self.pattern)
+            self.n_added = position + 1
+
+            if metadata is None:
+                self.rejected.append(file_path)
+                continue
+
+            self.paths.append(file_path)
+            positions.append(position)
+            materials.append(self.material_codes.setdefault(metadata['material'], len(self.material_codes)))
+            anneals.append(self.anneal_codes.setdefault(metadata['anneal'], len(self.anneal_codes)))
+            samples.append(metadata['sample'])
+            trials.append(metadata['trial'])
+
+        self.materials = np.concatenate((self.materials, np.asarray(materials, dtype = np.intp)))
+        self.anneals = np.concatenate((self.anneals, np.asarray(anneals, dtype = np.intp)))
+        self.samples = np.concatenate((self.samples, np.asarray(samples, dtype = np.int64)))
+        self.trials = np.concatenate((self.trials, np.asarray(trials, dtype = np.int64)))
+        self.positions = np.concatenate((self.positions, np.asarray(positions, dtype = np.intp)))
+
+        return len(self.paths) - n_before
+
+    def Codes(self, vocabulary, names):
+        """Looks up the codes of the requested category names, skipping names that are not in the index
+        """
+        names = [names] if isinstance(names, str) else names
+        return [vocabulary[name] for name in names if name in vocabulary]
+
+    def Mask(self, materials = None, anneal_types = None, samples = None, trials = None):
+        """Finds the files matching every given filter, a filter left as None matches everything
+
+        Args:
+            materials (list): material names, or a single name
+            anneal_types (list): anneal type names, or a single name
+            samples (list): sample ids
+            trials (list): trial numbers, e.g. range(3, 8) for trials 3 to 7
+
+        Returns:
+            array: boolean mask over self.paths
+        """
+        mask = np.ones(len(self.paths), dtype = bool)
+
+        if materials is not None:
+            mask &= np.isin(self.materials, self.Codes(self.material_codes, materials))
+        if anneal_types is not None:
+            mask &= np.isin(self.anneals, self.Codes(self.anneal_codes, anneal_types))
+        if samples is not None:
+            mask &= np.isin(self.samples, list(samples))
+        if trials is not None:
+            mask &= np.isin(self.trials, list(trials))
+
+        return mask
+
+    def Select(self, materials = None, anneal_types = None, samples = None, trials = None):
+        """Selects the files matching every given filter, e.g. Select('tungsten', 'unannealed', trials = range(3, 8))
+
+        Args:
+            materials (list): material names, or a single name
+            anneal_types (list): anneal type names, or a single name
+            samples (list): sample ids
+            trials (list): trial numbers
+
+        Returns:
+            list: paths of the matching files, in the order they were added
+        """
+        return [self.paths[index] for index in np.flatnonzero(self.Mask(materials, anneal_types, samples, trials))]
+
+    def Metadata(self, index):
+        """Gets the metadata of the file at a position in the index
+
+        Args:
+            index (int): position in self.paths
+
+        Returns:
+            dictionary: path, material, anneal type, sample id and trial
+        """
+        material_names = list(self.material_codes)
+        anneal_names = list(self.anneal_codes)
+
+        return {
+            'path': self.paths[index],
+            'material': material_names[self.materials[index]],
+            'anneal': anneal_names[self.anneals[index]],
+            'sample': int(self.samples[index]),
+            'trial': int(self.trials[index])
+        }
+
+def ReadPappyFile(file_path, header = PAPPY_HEADER):
+    """Reads the measurement rows of a pappy.csv file
+
+    A single measurement file, the usual case, is read row by row with the csv module. A file holding more rows than
+    one is read again in one go with ReadPappyRows(), once its header has been checked, so every row is kept.
+
+    Args:
+        file_path (string): path to the pappy.csv file
+        header (list): Default PAPPY_HEADER, the column names the header must start with, or None to skip it unread
+
+    Raises:
+        ValueError: If its header doesn't match, or a value is not a number
+
+    Returns:
+        tuple: the sample name of every row and their 6 float parameters (S, S uncertainty, left W, left W uncertainty, right W, right W uncertainty), as a list of rows
+    """
+    with open(file_path, 'r', newline = '') as file:
+        reader = csv.reader(file)
+
+        # Check (or skip) the header, then take the measurement row
+        names = next(reader)
+        if header is not None and [name.strip() for name in names[:len(header)]] != header:
+            message = f"\n'{file_path}' has an unexpected header\nExpected {header} but got {names} instead"
+            raise ValueError(message)
+        row = next(reader)
+
+        # Blank lines at the end are fine, anything else is another measurement
+        more = any(len(extra) > 0 for extra in reader)
+
+    if more:
+        names, values = ReadPappyRows(file_path)
+        return names, values.tolist()
+
+    values = [float(data) for data in row[1:N_PARAMETERS + 1]]
+    if len(values) != N_PARAMETERS:
+        message = f"\n'{file_path}' has {len(values)} parameters in its measurement row, expected {N_PARAMETERS}"
+        raise ValueError(message)
+
+    return row[:1], [values]
+
+def ReadPappyChunk(file_paths):
+    """Reads a batch of pappy.csv files into one array, used as the unit of work by the worker pools
+
+    Args:
+        file_paths (list): paths to the pappy.csv files
+
+    Returns:
+        tuple: (n, 6) float64 array with one row per measurement, number of rows of every file, and position in the batch -> sample names of the files holding more than one
+    """
+    values = []
+    rows = np.ones(len(file_paths), dtype = np.int64)
+    names = {}
+
+    for index, file_path in enumerate(file_paths):
+        file_names, file_values = ReadPappyFile(file_path, PAPPY_HEADER)
+        values.extend(file_values)
+        if len(file_values) > 1:
+            rows[index] = len(file_values)
+            names[index] = file_names
+
+    return np.array(values, dtype = np.float64).reshape(-1, N_PARAMETERS), rows, names
+
+def ReadPappyChunkSafe(file_paths):
+    """Reads a batch of pappy.csv files like ReadPappyChunk, but a file that can't be read doesn't stop the batch
+
+    Args:
+        file_paths (list): paths to the pappy.csv files
+
+    Returns:
+        tuple: the three results of ReadPappyChunk (a file that failed has one row of NaN), and a dictionary of position in the batch -> error message
+    """
+    values = []
+    rows = np.ones(len(file_paths), dtype = np.int64)
+    names = {}
+    errors = {}
+
+    for index, file_path in enumerate(file_paths):
+        try:
+            file_names, file_values = ReadPappyFile(file_path, PAPPY_HEADER)
+        except READ_ERRORS as error:
+            file_values = [[np.nan] * N_PARAMETERS]
+            # One line per error, an empty file ends with a bare StopIteration
+            reason = str(error).strip().replace('\n', ' - ') if not isinstance(error, StopIteration) else 'the file ended before its measurement row'
+            errors[index] = f"{type(error).__name__}: {reason}"
+
+        values.extend(file_values)
+        if len(file_values) > 1:
+            rows[index] = len(file_values)
+            names[index] = file_names
+
+    return np.array(values, dtype = np.float64).reshape(-1, N_PARAMETERS), rows, names, errors
+
+def ReadPappyFiles(file_paths, workers = None, processes = False, chunk_size = 256, quarantine = False, progress = None):
+    """Reads many pappy.csv files, optionally in parallel, into one array in the same order as file_paths
+
+    The files are split into batches of chunk_size which are handed to a bounded pool of worker threads (or
+    processes), so the per-file latency of a network share is overlapped. The results are identical to reading the
+    files one by one. A file holding several measurements gives one row for each, in the order of the file; see
+    RecordNames() for naming them.
+
+    Args:
+        file_paths (list): paths to the pappy.csv files
+        workers (int): number of workers, default None reads the files serially in the calling thread
+        processes (bool): Default 'False' uses a thread pool, if 'True' uses a process pool
+        chunk_size (int): number of files handed to a worker at a time
+        quarantine (bool): Default 'False' raises on the first file that can't be read, if 'True' its row is NaN and the error goes in the report
+        progress (callable): Default 'None', otherwise called as progress(files read, total) in the calling thread after every batch, an exception it raises stops the read and cancels the batches not started
+
+    Returns:
+        tuple: (n, 6) float64 array of the parameters, and a report dictionary with the number of files, seconds, files per second, 'rows': number of rows of every file, 'names': position -> sample names of the files holding more than one (and with quarantine on, 'errors': position -> message)
+    """
+    file_paths = list(file_paths)
+    start = time.perf_counter()
+
+    # Split the files into batches for the workers
+    chunks = [file_paths[index:index + chunk_size] for index in range(0, len(file_paths), chunk_size)]
+
+    read = ReadPappyChunkSafe if quarantine else ReadPappyChunk
+
+    def Collect(results):
+        blocks = []
+        for number, block in enumerate(results):
+            blocks.append(block)
+            if progress is not None:
+                progress(min((number + 1) * chunk_size, len(file_paths)), len(file_paths))
+        return blocks
+
+    if workers is None or workers <= 1 or len(chunks) <= 1:
+        blocks = Collect(read(chunk) for chunk in chunks)
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor if processes else concurrent.futures.ThreadPoolExecutor
+        with executor(max_workers = workers) as pool:
+            # map() hands back the batches in the order they were submitted, closing it cancels the ones not started
+            results = pool.map(read, chunks)
+            try:
+                blocks = Collect(results)
+            finally:
+                results.close()
+
+    # Shift the sample names and errors of every batch to positions in file_paths
+    names = {}
+    errors = {}
+    for number, block in enumerate(blocks):
+        names.update({number * chunk_size + index: block_names for index, block_names in block[2].items()})
+        if quarantine:
+            errors.update({number * chunk_size + index: message for index, message in block[3].items()})
+
+    if len(blocks) > 0:
+        values = np.concatenate([block[0] for block in blocks])
+        rows = np.concatenate([block[1] for block in blocks])
+    else:
+        values = np.empty((0, N_PARAMETERS), dtype = np.float64)
+        rows = np.empty(0, dtype = np.int64)
+
+    seconds = time.perf_counter() - start
+    report = {
+        'files': len(file_paths),
+        'seconds': seconds,
+        'files_per_second': len(file_paths) / seconds if seconds > 0 else float('inf'),
+        'rows': rows,
+        'names': names
+    }
+    if quarantine:
+        report['errors'] = errors
+
+    return values, report
+
+def RecordNames(file_paths, rows, names):
+    """Names every row read by ReadPappyFiles, so the rows of a file holding several measurements get their own metadata
+
+    A single measurement file's row is named by the file. A row of a file holding more is named 'file:sample name'
+    when its Sample Name column follows SAMPLE_PATTERN, and by the file otherwise. ParsePappyName() and ParseTags()
+    read such a name from its sample name, so an index made with RECORD_PATTERNS covers both.
+
+    Args:
+        file_paths (list): the files read
+        rows (array): number of rows of every file, report['rows'] of ReadPappyFiles
+        names (dictionary): position -> sample names of the files holding more than one row, report['names'] of ReadPappyFiles
+
+    Returns:
+        list: name of every row
+    """
+    if len(names) == 0:
+        return list(file_paths)
+
+    records = []
+    for position, file_path in enumerate(file_paths):
+        if position not in names:
+            records.extend([file_path] * int(rows[position]))
+            continue
+        records.extend(f"{file_path}:{name}" if SAMPLE_PATTERN.match(name) else file_path for name in names[position])
+
+    return records
+
+def ReadPappyRows(file_path, strict = True):
+    """Reads every measurement row of a pappy.csv file, e.g. a bulk file with one row per measurement
+
+    The file is read in one go and the numbers are parsed by numpy, so a bulk file of many rows is one sequential
+    read instead of one open per measurement.
+
+    Args:
+        file_path (string): path to the csv file, with the usual pappy.csv header
+        strict (bool): Default 'True' raises on a malformed row, if 'False' its parameters are NaN so it can be quarantined
+
+    Raises:
+        ValueError: If strict and a row is malformed
+
+    Returns:
+        tuple: list of the sample names and (n, 6) float64 array of the parameters, one row per measurement
+    """
+    with open(file_path, 'r', newline = '') as file:
+        lines = [line for line in file.read().splitlines()[1:] if len(line) > 0]
+
+    names = [line.split(',', 1)[0] for line in lines]
+    if len(lines) == 0:
+        return names, np.empty((0, N_PARAMETERS), dtype = np.float64)
+
+    try:
+        values = np.loadtxt(lines, delimiter = ',', usecols = range(1, N_PARAMETERS + 1), dtype = np.float64, ndmin = 2)
+    except ValueError:
+        if strict:
+            raise
+        # Fall back to parsing row by row, so only the malformed rows are lost
+        values = np.full((len(lines), N_PARAMETERS), np.nan)
+        for index, line in enumerate(lines):
+            try:
+                values[index] = [float(data) for data in line.split(',')[1:N_PARAMETERS + 1]]
+            except ValueError:
+                pass
+
+    return names, values
+
+def PackPappyFiles(file_paths, pack_path, root = None, workers = None):
+    """Merges pappy.csv files into one indexed pack file
+
+    The pack is an uncompressed .npz holding the parameters, the material, anneal type, sample id and trial of every
+    row as integer codes, and the path of the file each row came from ('file:sample name' for the rows of a file
+    holding several measurements). Loading it (LoadPappyPack) is one sequential read, with no file names to parse.
+
+    Args:
+        file_paths (list): paths of the pappy.csv files relative to root, e.g. from ScanDirectories()
+        pack_path (string): file to write, '.npz' is added if missing
+        root (string): Default 'None' reads the paths relative to the current working directory, otherwise relative to root
+        workers (int): number of parallel readers, default None reads the files serially
+
+    Returns:
+        dictionary: path of the pack, number of rows packed, names rejected by the pattern and seconds taken
+    """
+    start = time.perf_counter()
+    path = os.getcwd() if root is None else root
+
+    # Tagged names are packed too, their tags are read back from the stored paths
+    files = PappyIndex(file_paths, TAGGED_PATTERN)
+    values, report = ReadPappyFiles([path + '/' + file_path for file_path in files.paths], workers)
+
+    # Files holding several measurements are packed row by row, each row under its own 'file:sample name'
+    index = PappyIndex(RecordNames(files.paths, report['rows'], report['names']), RECORD_PATTERNS)
+    values = values[index.positions]
+
+    pack_path = pack_path if pack_path.endswith('.npz') else pack_path + '.npz'
+    np.savez(
+        pack_path,
+        format = np.array(PACK_FORMAT),
+        values = values,
+        sources = np.array([file_path.encode('utf-8') for file_path in index.paths], dtype = bytes),
+        material_names = np.array(list(index.material_codes), dtype = str),
+        anneal_names = np.array(list(index.anneal_codes), dtype = str),
+        materials = index.materials,
+        anneals = index.anneals,
+        samples = index.samples,
+        trials = index.trials
+    )
+
+    return {'path': pack_path, 'rows': len(index), 'rejected': len(files.rejected), 'seconds': time.perf_counter() - start}
+
+def LoadPappyPack(pack_path):
+    """Loads a pack written by PackPappyFiles
+
+    Args:
+        pack_path (string): path to the .npz pack
+
+    Raises:
+        ValueError: If the file is not a pappy pack
+
+    Returns:
+        tuple: PappyIndex of the rows (its paths are the files the rows came from) and the (n, 6) array of the parameters
+    """
+    with np.load(pack_path) as pack:
+        if 'format' not in pack.files or str(pack['format']) != PACK_FORMAT:
+            message = f"\n'{pack_path}' is not a pappy pack\nExpected format '{PACK_FORMAT}'"
+            raise ValueError(message)
+
+        # The index is filled straight from the stored codes, nothing is parsed again
+        index = PappyIndex()
+        index.paths = [source.decode('utf-8') for source in pack['sources'].tolist()]
+        index.material_codes = {name: code for code, name in enumerate(pack['material_names'].tolist())}
+        index.anneal_codes = {name: code for code, name in enumerate(pack['anneal_names'].tolist())}
+        index.materials = pack['materials']
+        index.anneals = pack['anneals']
+        index.samples = pack['samples']
+        index.trials = pack['trials']
+        index.positions = np.arange(len(index.paths), dtype = np.intp)
+        index.n_added = len(index.paths)
+        values = pack['values']
+
+    return index, values
@@ -3,31 +3,35 @@ BYU-Idaho Positron Annihilation Spectroscopy Team
 
 Pictoral Extrapolator for Pappy Tabulated Observations - PepTo
 """
-import matplotlib.pyplot as plt
+from PappyFiles import ScanDirectories, PappyIndex, ReadPappyFiles, RecordNames, RECORD_PATTERNS
+import numpy as np
 import csv
 import copy
 import os
 
+# Columns of the DataFrame built by BuildDataFrame, in order
+COLUMN_ORDER = [
+    'Sample Name',
+    'Anneal Type',
+    'S Parameter',
+    'S Uncertainty',
+    'Left W Parameter',
+    'Left W Uncertainty',
+    'Right W Parameter',
+    'Right W Uncertainty'
+]
+
 # Function to get the file names and directories for each
-def GetDirectories():
-    # Get current directory path
-    path = os.getcwd()
-    
-    # Get the files and folders list within this directory
-    files = [file for file in os.listdir(path) if file.split('_')[-1] == 'pappy.csv']
-    folders = [folder for folder in os.listdir(path) if len(folder.split('.')) == 1]
-    
-    for folder in folders:
-        path = os.getcwd() + '/' + folder
-        for file in os.listdir(path):
-            if file.split('_')[-1] == 'pappy.csv':
-                files.append(folder + '/' + file)
-            elif len(file.split('.')) == 1:
-                folders.append(folder + '/' + file)
-            else:
-                pass
-    
-    return files
+def GetDirectories(root = None):
+    """Gets a full working list of directories for pappy.csv files beginning at the directory from which the program is located
+
+    Args:
+        root (string): folder to start from, default None uses the current working directory
+
+    Returns:
+        list: returns a complete list of the files in the directory within or below the installed location of the program
+    """
+    return list(ScanDirectories(root))
 
 # Function to generate the dataset of the samples
 def SampleDataSet(materials):
@@ -43,76 +47,109 @@ def SampleDataSet(materials):
     
     return Data
 
+# Function to build the dataset as a Pandas dataframe in one pass
+def BuildDataFrame(files, materials = None, root = None, dtype = np.float64, workers = None):
+    """Reads the pappy files once and builds the whole dataframe at the end, along with the sums of every group
+
+    The parameters of all the files are read into one array (see ReadPappyFiles), and the material and anneal type
+    of every file come from its name, so the frame is made in a single step instead of growing it file by file.
+    'Sample Name' (the material) and 'Anneal Type' are categorical columns, and the rows are sorted by material
+    keeping the order the files were given in within each material.
+
+    Args:
+        files (list or PappyIndex): file names relative to root, or an index of them
+        materials (list): materials to give sums for, default None uses the materials of the files
+        root (string): Default 'None' reads the file names relative to the current working directory, otherwise relative to root
+        dtype (type): float type of the parameter columns, e.g. np.float32 to halve their memory
+        workers (int): Default 'None' reads the files serially, otherwise the number of parallel readers
+
+    Returns:
+        tuple: the pandas dataframe with the columns of COLUMN_ORDER, and a dictionary laid out like SampleDataSet,
+            {'material': {'anneal_type': [num_samples, sum of s-parameters, sum of s-parameter uncertainties]}}
+    """
+    import pandas as pd
+
+    path = os.getcwd() if root is None else root
+    index = files if isinstance(files, PappyIndex) else PappyIndex(files)
+
+    values, report = ReadPappyFiles([path + '/' + file for file in index.paths], workers)
+
+    # A file holding several measurements gives a row for each, with the metadata of its sample names
+    if len(report['names']) > 0:
+        index = PappyIndex(RecordNames(index.paths, report['rows'], report['names']), RECORD_PATTERNS)
+        values = values[index.positions]
+
+    # Material and anneal type codes of every file, read from the validated file name pattern
+    material_names = list(index.material_codes)
+    anneal_names = list(index.anneal_codes)
+
+    # Sums of every (material, anneal type) group, from the float64 values of the same read
+    groups = index.materials * len(anneal_names) + index.anneals
+    n_groups = len(material_names) * len(anneal_names)
+    counts = np.bincount(groups, minlength = n_groups)
+    s_sums = np.bincount(groups, values[:, 0], minlength = n_groups)
+    uncertainty_sums = np.bincount(groups, values[:, 1], minlength = n_groups)
+
+    sums = SampleDataSet(material_names if materials is None else materials)
+    for material in sums:
+        for anneal in sums[material]:
+            if material in index.material_codes and anneal in index.anneal_codes:
+                group = index.material_codes[material] * len(anneal_names) + index.anneal_codes[anneal]
+                sums[material][anneal] = [int(counts[group]), float(s_sums[group]), float(uncertainty_sums[group])]
+
+    # Categories in name order, so sorting by the category codes sorts by name
+    material_categories = sorted(material_names)
+    anneal_categories = sorted(anneal_names)
+    material_order = np.array([material_categories.index(name) for name in material_names], dtype = np.int64)
+    anneal_order = np.array([anneal_categories.index(name) for name in anneal_names], dtype = np.int64)
+
+    codes = material_order[index.materials]
+    order = np.argsort(codes, kind = 'stable')
+
+    columns = {
+        'Sample Name': pd.Categorical.from_codes(codes[order], material_categories),
+        'Anneal Type': pd.Categorical.from_codes(anneal_order[index.anneals][order], anneal_categories)
+    }
+    for depth, column in enumerate(COLUMN_ORDER[2:]):
+        columns[column] = values[order, depth].astype(dtype)
+
+    return pd.DataFrame(columns, columns = COLUMN_ORDER), sums
+
 # Function to build the dataset as a Pandas dataframe
 def DisplayDataSimple(file_data, files, print_ = True):
     """Basic display of the dataset as a dictionary to the console
 
     Args:
-        file_data (list): raw data from the files
+        file_data (list): raw data from the files, the number of samples and sums of every group are added to it
         files (list): list of the file names in the directory to open
         print_ (bool): Set to false if no need to display findings, default set to true
 
     Returns:
         dictionary: dataset used for the display function below
     """
-    data = pd.DataFrame()
-    
-    # Columns order
-    column_order = [
-        'Sample Name',
-        'Anneal Type',
-        'S Parameter',
-        'S Uncertainty',
-        'Left W Parameter',
-        'Left W Uncertainty',
-        'Right W Parameter',
-        'Right W Uncertainty'
-    ]
-    
-    # We need the path again to build the complete file directory for hidden files in folders
-    path = os.getcwd()
-    
-    # Also, we need to define a few named indeces
-    material = 0
-    anneal_type = 1
-    trial_number = -2
-    
     print(f'\nFile information:\n')
-    if len(files) > 0:
-        for file in files:
-            # Read the csv file and put into a pandas dataframe
-            # The columns are filename, s-parameter, s-param uncertainty, and the rest don't matter to us yet
-            csv_data = pd.read_csv(path + '/' + file)
-            file = (file.split('/')[-1]).split('_')
-            
-            if print_ == True:
-                print(f"Material: {file[material].title()} \
-                    | Anneal Type: {file[anneal_type].title()} \
-                    | Trial {int(file[trial_number])}")
-
-            # Add 1 to the number of samples row in the list
-            file_data[file[material]][file[anneal_type]][0] += 1
-            # Then add the s-parameter from the csv to the second row of the list
-            file_data[file[material]][file[anneal_type]][1] += csv_data['S Parameter'].iloc[0]
-            # Finally, add the s-param uncertainty to the 3rd row in the list
-            file_data[file[material]][file[anneal_type]][2] += csv_data['S Uncertainty'].iloc[0]
-            csv_data["Anneal Type"] = file[anneal_type]
-            csv_data["Sample Name"] = file[material]
-            
-            try:
-                csv_data = csv_data.drop(columns = ["Unnamed: 7"])
-            except KeyError:
-                pass
-            
-            data = pd.concat((data, csv_data))
-
-        data = data.reindex(columns = column_order).reset_index(drop = True)
-        return data.sort_values(by = 'Sample Name')
-    
-    else:
+    if len(files) == 0:
         print("No PapPy files found!")
         return None
 
+    index = files if isinstance(files, PappyIndex) else PappyIndex(files)
+    data, sums = BuildDataFrame(index, list(file_data))
+
+    if print_ == True:
+        for position in range(len(index)):
+            file = index.Metadata(position)
+            print(f"Material: {file['material'].title()} \
+                | Anneal Type: {file['anneal'].title()} \
+                | Trial {file['trial']}")
+
+    # Add the number of samples, sum of s-parameters and sum of s-param uncertainties to the lists
+    for material in file_data:
+        for anneal in file_data[material]:
+            for position, value in enumerate(sums[material][anneal]):
+                file_data[material][anneal][position] += value
+
+    return data
+
 # Create a function that computes and plots the data from a sample in the dictionary format
 # created below
 def DisplayDataComplex(dataset):
@@ -156,12 +193,13 @@ def PlotBox(dataset, show = False):
     """Generates a box plot of a pandas dataframe
 
     Args:
-        dataset (pandas dataframe): dataset given from the .csv pappy files
+        dataset (pandas dataframe): dataset given from the .csv pappy files, e.g. from BuildDataFrame
 
     Returns:
         None
     """
     if show:
+        import matplotlib.pyplot as plt
         boxplot = dataset.boxplot(column = ["S Parameter", "S Uncertainty"], by = ["Sample Name", "Anneal Type"], grid = False, rot = 45)
         plt.show()
     
@@ -176,9 +214,6 @@ def DataToCSV(date, data):
 def main():
     """Runs all previous functions
     """
-    # Get the file and folder names
-    files = GetDirectories()
-    
     # Sample names to generate the dictionary
     sampled_elements = [
         'aluminum',
@@ -188,12 +223,12 @@ def main():
         'tungsten'
     ]
     
-    # Empty dataframe to contain all of the data from everywhere below this directory
-    # from a pappy file
-    file_data = SampleDataSet(sampled_elements)
+    # Get the file and folder names, indexed by their metadata so only the sampled elements are opened
+    files = PappyIndex(GetDirectories()).Select(sampled_elements, ['annealed', 'unannealed'])
     
-    # Generate another dataset as a pandas dataframe for plotting
-    data = DisplayDataSimple(file_data, files, False)
+    # Read every pappy file below this directory once, into a pandas dataframe for plotting
+    # along with the number of samples and sums of every group
+    data, file_data = BuildDataFrame(files, sampled_elements)
     
     # Show the data to the console
     DisplayDataComplex(file_data)
@@ -205,4 +240,5 @@ def main():
     # Plot the data on boxplot
     PlotBox(data, True)
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
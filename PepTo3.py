@@ -3,46 +3,154 @@ BYU-Idaho Positron Annihilation Spectroscopy Team
 
 Pictoral Extrapolator for Pappy Tabulated Observations - PepTo
 """
-import matplotlib.pyplot as plt
 import numpy as np
+from PappyFiles import ReadPappyFiles, ReadPappyRows, RecordNames, LoadPappyPack, ScanDirectories, PappyIndex, ParseTags, SAMPLE_PATTERN, TAGGED_PATTERN, RECORD_PATTERNS, DEFAULT_WORKERS
+from PappyCache import ManifestCache
+from PepToStats import GroupStatistics
+from PepToFit import FitGroups, FitAccumulator, ComputeW
+from PepToProfile import Measure
+from PepToSpill import SpillStore
+from PepToQuality import MakeQualityCheck, DEFAULT_QUALITY
+from PepToDensity import DensityPyramid, DensityPanel, BASE_BINS, TARGET_BINS
+import PepToProfile
+import itertools
+import json
+import time
 import csv
 import os
 
+# Name and version of the DataSet.ToBinary folder layout
+BINARY_FORMAT = 'pepto-columns-2'
+
+# Name and version of the DataSet.Summary layout
+SUMMARY_FORMAT = 'pepto-summary-2'
+
+# Anneal types a DataSet groups by when none are given
+ANNEAL_TYPES = ['annealed', 'unannealed']
+
+# Keys every DataSet groups by, any others (e.g. 'temperature', 'dose', 'detector') come from the tags of the file names
+BASE_KEYS = ['material', 'anneal']
+
+# Parts of a file name that are not categories to group by
+RESERVED_KEYS = BASE_KEYS + ['sample', 'trial']
+
+# Category of a record that has no value for a key, e.g. a file name without a dose tag
+MISSING = ''
+
+# Statistics DataSet.DisplayData can show, read from the GroupStatistics accumulators
+STATISTICS = {
+    'mean': GroupStatistics.Mean,
+    'weighted mean': GroupStatistics.WeightedMean,
+    'weighted mean uncertainty': GroupStatistics.WeightedMeanUncertainty,
+    'std': GroupStatistics.StandardDeviation,
+    'min': lambda stats: np.where(stats.count[:, None] > 0, stats.minimum, np.nan),
+    'max': lambda stats: np.where(stats.count[:, None] > 0, stats.maximum, np.nan)
+}
+
+# Most points SvW draws in a single panel before decimating
+DEFAULT_MAX_POINTS = 2000
+
+# Files read per batch by DataSet.StreamDataSet
+BATCH_SIZE = 10_000
+
+def GridShape(n_panels, max_cols = 4):
+    """Picks a grid of subplots for any number of panels
+
+    Args:
+        n_panels (int): number of panels to fit
+        max_cols (int): widest the grid may be
+
+    Returns:
+        tuple: number of rows and columns
+    """
+    ncols = max(1, min(n_panels, max_cols))
+    return max(1, -(-n_panels // ncols)), ncols
+
+def PrepareFigure(fig, nrows, ncols, size):
+    """Gets a figure with a grid of axes, reusing (and clearing) the given figure instead of making a new one
+
+    Args:
+        fig (Figure): figure to reuse, or None to make a new pyplot figure
+        nrows (int): rows of axes
+        ncols (int): columns of axes
+        size (tuple): figure size in inches
+
+    Returns:
+        tuple: the figure and a 2D array of its axes
+    """
+    if fig is None:
+        # pyplot is only imported once a plot is made, so headless runs skip its startup cost
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize = size)
+    else:
+        fig.clf()
+        fig.set_size_inches(size)
+    
+    fig.set_layout_engine('constrained')
+    fig.set_facecolor('lightgray')
+    
+    return fig, fig.subplots(nrows, ncols, squeeze = False)
+
+def Decimate(n_points, max_points):
+    """Evenly thins out a set of points for drawing
+
+    Args:
+        n_points (int): number of points
+        max_points (int): most points to keep, None keeps them all
+
+    Returns:
+        slice: a strided slice, so indexing an array with it gives a view rather than a copy
+    """
+    if max_points is None or n_points <= max_points:
+        return slice(None)
+    
+    return slice(None, None, -(-n_points // max_points))
+
+def BatchGroups(codes):
+    """Numbers the distinct key combinations of a batch on their own, e.g. to check records before they make any groups
+
+    Args:
+        codes (array): (n, number of keys) key codes
+
+    Returns:
+        tuple: the batch group of every record and the number of batch groups
+    """
+    if len(codes) == 0:
+        return np.empty(0, dtype = np.intp), 0
+    
+    combinations, inverse = np.unique(codes, axis = 0, return_inverse = True)
+    return inverse.reshape(-1), len(combinations)
+
 # Function to get the file names and directories for each
-def GetDirectories():
+def GetDirectories(root = None):
     """Gets a full working list of directories for pappy.csv files beginning at the directory from which the program is located
 
+    Args:
+        root (string): folder to start from, default None uses the current working directory
+
     Returns:
         list: returns a complete list of the files in the directory within or below the installed location of the program
     """
-    # Get current directory path
-    path = os.getcwd()
-    
-    # Get the files and folders list within this directory
-    files = [file for file in os.listdir(path) if file.split('_')[-1] == 'pappy.csv']
-    folders = [folder for folder in os.listdir(path) if len(folder.split('.')) == 1]
-    
-    for folder in folders:
-        path = os.getcwd() + '/' + folder
-        for file in os.listdir(path):
-            if file.split('_')[-1] == 'pappy.csv':
-                files.append(folder + '/' + file)
-            elif len(file.split('.')) == 1:
-                folders.append(folder + '/' + file)
-            else:
-                pass
-    
-    return files
+    return list(ScanDirectories(root))
 
 # Function to generate the dataset of the samples
 class DataSet(object):
-    def __init__(self, materials):
+    def __init__(self, materials, keep_samples = True, spill = None, anneal_types = None, keys = None):
         if type(materials) != list:
             message = f"GenerateDataSet function called with incorrect parameter input\n\nExpected type 'list' but got type {type(materials)} instead"
             raise TypeError(message)
         
+        # Keys besides the material and anneal type, their categories are read from the tags of the file names
+        keys = [] if keys is None else list(keys)
+        reserved = [key for key in keys if key in RESERVED_KEYS or keys.count(key) > 1]
+        if len(reserved) > 0:
+            message = f"\nKeys {reserved} can't be grouped on\nThe material and anneal type are always grouped on, the sample id and trial never, and every key is given once"
+            raise ValueError(message)
+        
         # Make a dictionary for easy mapping of element names to an index for rows, columns, and depth
-        self.row_indeces = {'annealed': 0, 'unannealed': 1}
+        # (files of anneal types not listed are skipped like other materials, never a KeyError)
+        anneal_types = ANNEAL_TYPES if anneal_types is None else list(anneal_types)
+        self.row_indeces = {anneal_type: row for row, anneal_type in enumerate(anneal_types)}
         self.col_indeces = {material: materials.index(material) for material in materials}
         self.depth_indeces = {
             'S Parameter': 0,
@@ -59,73 +167,762 @@ class DataSet(object):
         self.cols = len(materials) # Possible material options
         self.depth = len(self.depth_indeces) # Number of values stored to dimension 3 of the tensor
         
+        # Every key is a vocabulary of category names coded as integers, name -> code and code -> name
+        # The materials and anneal types are the ones given, the other keys add new categories as they show up
+        self.keys = BASE_KEYS + keys
+        self.categories = [self.col_indeces, self.row_indeces] + [{} for _ in keys]
+        self.category_names = [list(self.col_indeces), list(self.row_indeces)] + [[] for _ in keys]
+        
+        # The float parameters read from the pappy files, stored as one column each (the sample count is derived)
+        self.parameters = [name for name, depth in self.depth_indeces.items() if depth < self.depth - 1]
+        
+        # With keep_samples set to False only the streaming statistics are kept, so memory does not grow with the records
+        # A spill folder keeps the samples on disk instead (see SpillStore), so they can still be plotted
+        self.keep_samples = keep_samples and spill is None
+        self.spill = None if spill is None else SpillStore(spill, 0, self.parameters)
+        
+        # Derived quantities (W columns, fits, statistics tables, box plot stats), kept until records change
+        self.memo = {}
+        # Bumped whenever the records change, so outside caches can tell their copies are stale
+        self.version = 0
+        
         # Generate the empty dataset
-        self.dataset = self.EmptyDataSet()
+        self.EmptyDataSet()
+        
+        # Timing of the last FillDataSet call, filled in by ReadPappyFiles
+        self.ingest_report = None
         
         return None
     
     def size(self):
         return f"[{self.rows} rows, {self.cols} cols, {self.depth} in depth]"
     
+    @property
+    def n_groups(self):
+        return len(self.group_keys)
+    
     def EmptyDataSet(self):
-        """Builds an empty 3 dimensional tensor for the sample data
+        """Resets the columnar store to hold no records and no groups
+
+        Every record is one pappy file. The parameters are kept as one contiguous float64 array each, with the
+        group of every record kept as an integer code. A group is one combination of key categories (material,
+        anneal type and any other keys) that has records, so there are only as many groups as there are non-empty
+        combinations. Records are kept sorted by group so that each group is a contiguous slice of every column.
+
+        Returns:
+            None: Returns None, but resets the self.columns, self.record_groups, self.group_keys and self.group_offsets elements
+        """
+        # One float64 array per parameter
+        self.columns = {parameter: np.empty(0, dtype = np.float64) for parameter in self.parameters}
+        
+        # Group of every record
+        self.record_groups = np.empty(0, dtype = np.intp)
+        
+        # Key codes of every group, one row per group in the order of self.keys, and the reverse lookup from codes to group
+        self.group_keys = np.empty((0, len(self.keys)), dtype = np.intp)
+        self.lookup = {}
+        
+        # Group g spans records group_offsets[g] to group_offsets[g + 1]
+        self.group_offsets = np.zeros(1, dtype = np.intp)
+        
+        # Count, mean, variance, min/max and weighted mean of every group, updated as records are added
+        self.stats = GroupStatistics(0, len(self.parameters))
+        
+        # Moments of the S vs. W line fit of every group, also updated as records are added
+        self.fit_stats = FitAccumulator(0)
+        
+        # Spilled samples are dropped along with the rest
+        if self.spill is not None:
+            self.spill.Clear()
+        
+        self.Invalidate()
+        
+        return None
+    
+    def Memoized(self, key, compute):
+        """Gets a derived quantity, computing it only the first time it is asked for since the records last changed
+
+        Args:
+            key (tuple): name of the quantity, e.g. ('fit', 'ols')
+            compute (callable): makes the quantity when it is not stored yet
+
+        Returns:
+            the stored quantity
+        """
+        if key not in self.memo:
+            self.memo[key] = compute()
+        
+        return self.memo[key]
+    
+    def Invalidate(self):
+        """Drops every memoized quantity, called whenever records are added or replaced
+
+        Returns:
+            None
+        """
+        self.memo.clear()
+        self.version += 1
+        
+        return None
+    
+    def CodeNames(self, position, names):
+        """Codes category names of one key, adding the ones not seen before to its vocabulary
+
+        Args:
+            position (int): index of the key in self.keys
+            names (list): category names
+
+        Returns:
+            array: code of every name
+        """
+        vocabulary = self.categories[position]
+        reverse = self.category_names[position]
+        
+        for name in names:
+            if name not in vocabulary:
+                vocabulary[name] = len(reverse)
+                reverse.append(name)
+        
+        return np.array([vocabulary[name] for name in names], dtype = np.intp)
+    
+    def LoadCategories(self, categories):
+        """Adds the category names of the keys other than the material and anneal type, in code order
+
+        Args:
+            categories (dictionary): key -> list of category names, e.g. from Summary() or another dataset's category_names
+
+        Returns:
+            None
+        """
+        for position, key in enumerate(self.keys[len(BASE_KEYS):], len(BASE_KEYS)):
+            self.CodeNames(position, list(categories[key]))
+        
+        return None
+    
+    def KeyCodes(self, cols, rows, names = (), metadata = None):
+        """Codes the keys of a batch of records, the other keys coming from the tags of their names (see PappyFiles.TAGGED_PATTERN)
+
+        Args:
+            cols (array): n material (column) indeces
+            rows (array): n anneal type (row) indeces
+            names (list): file or sample name of every record (see PappyFiles.RECORD_PATTERNS), only read when there are keys besides the material and anneal type
+            metadata (dictionary): name -> {key: value} for keys not in the names (e.g. from a run log), these win over the name's tags
+
+        Returns:
+            array: (n, number of keys) key codes, records lacking a key get the MISSING category
+        """
+        codes = np.empty((len(cols), len(self.keys)), dtype = np.intp)
+        codes[:, 0] = cols
+        codes[:, 1] = rows
+        
+        if len(self.keys) == len(BASE_KEYS):
+            return codes
+        
+        metadata = {} if metadata is None else metadata
+        records = []
+        for name in names:
+            tags = ParseTags(name, RECORD_PATTERNS) or {}
+            tags.update(metadata.get(name, {}))
+            records.append(tags)
+        
+        for position, key in enumerate(self.keys[len(BASE_KEYS):], len(BASE_KEYS)):
+            # Only the distinct names of a key are looked up, every record gets its code by indexing
+            values, inverse = np.unique(np.array([str(record.get(key, MISSING)) for record in records], dtype = str), return_inverse = True)
+            codes[:, position] = self.CodeNames(position, values.tolist())[inverse.reshape(-1)]
+        
+        return codes
+    
+    def AddGroupKeys(self, codes):
+        """Makes new groups, growing the statistics, fit moments, group offsets and spill files to match
+
+        Args:
+            codes (array): (n, number of keys) key codes of combinations that have no group yet, numbered in this order
+
+        Returns:
+            None
+        """
+        codes = np.asarray(codes, dtype = np.intp).reshape(-1, len(self.keys))
+        if len(codes) == 0:
+            return None
+        
+        for combination in map(tuple, codes.tolist()):
+            self.lookup[combination] = len(self.lookup)
+        
+        self.group_keys = np.concatenate((self.group_keys, codes))
+        self.group_offsets = np.concatenate((self.group_offsets, np.full(len(codes), self.group_offsets[-1], dtype = np.intp)))
+        self.stats.Resize(self.n_groups)
+        self.fit_stats.Resize(self.n_groups)
+        if self.spill is not None:
+            self.spill.Resize(self.n_groups)
+        
+        self.Invalidate()
+        
+        return None
+    
+    def GroupsOf(self, codes):
+        """Finds the group of every row of key codes, making groups for combinations not seen before
+
+        Args:
+            codes (array): (n, number of keys) key codes, e.g. from KeyCodes()
+
+        Returns:
+            array: n group indeces
+        """
+        codes = np.asarray(codes, dtype = np.intp).reshape(-1, len(self.keys))
+        if len(codes) == 0:
+            return np.empty(0, dtype = np.intp)
+        
+        # Each distinct combination is looked up once, new ones are numbered in sorted order
+        combinations, inverse = np.unique(codes, axis = 0, return_inverse = True)
+        new = [combination for combination in map(tuple, combinations.tolist()) if combination not in self.lookup]
+        self.AddGroupKeys(new)
+        
+        groups = np.array([self.lookup[combination] for combination in map(tuple, combinations.tolist())], dtype = np.intp)
+        
+        return groups[inverse.reshape(-1)]
+    
+    def AddRecords(self, values, groups):
+        """Appends a block of records to the columnar store and regroups it
+
+        Args:
+            values (array): (n, 6) array of the float parameters in the order of self.parameters
+            groups (array): n group indeces, from GroupsOf()
+
+        Returns:
+            None: Returns None, but updates the columnar store
+        """
+        values = np.asarray(values, dtype = np.float64).reshape(-1, len(self.parameters))
+        groups = np.asarray(groups, dtype = np.intp)
+        
+        # Nothing to add, so the store is left as is
+        if len(values) == 0:
+            return None
+        
+        # Everything derived from the old records is out of date
+        self.Invalidate()
+        
+        # The statistics and fit moments are always updated, the samples themselves only when they are kept
+        self.stats.Add(values, groups)
+        self.fit_stats.Add(np.hypot(values[:, 2], values[:, 4]), values[:, 0], groups)
+        self.AppendSamples(values, groups)
+        
+        return None
+    
+    def AppendSamples(self, values, groups):
+        """Appends records to the stored samples only, leaving the statistics and fit moments alone
+
+        Args:
+            values (array): (n, 6) array of the float parameters in the order of self.parameters
+            groups (array): n group indeces
+
+        Returns:
+            None: Returns None, but updates the columnar store (or the spill files)
+        """
+        groups = np.asarray(groups, dtype = np.intp)
+        
+        if self.spill is not None:
+            self.spill.Append(values, groups)
+            return None
+        if not self.keep_samples:
+            return None
+        
+        # Only the new records are sorted by group (stably, so each group keeps the order they were read), then
+        # every one is slotted in behind the old records of its group, so the store is never sorted again in full
+        order = np.argsort(groups, kind = 'stable')
+        positions = self.group_offsets[groups[order] + 1]
+        
+        self.record_groups = np.insert(self.record_groups, positions, groups[order])
+        for depth, parameter in enumerate(self.parameters):
+            self.columns[parameter] = np.insert(self.columns[parameter], positions, values[order, depth])
+        
+        # Every group's slice grows by its new records
+        counts = np.bincount(groups, minlength = self.n_groups)
+        self.group_offsets = self.group_offsets + np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+        
+        return None
+    
+    def Merge(self, other):
+        """Merges another DataSet over the same materials, anneal types and keys into this one, e.g. the partial result of another shard
+
+        The other's groups are matched to this one's by their category names, making any that are new here. The
+        statistics and fit moments are merged (see GroupStatistics.Merge) and the other's samples are put behind
+        this one's within every group. Merging the DataSets of separate FillDataSet calls in order gives exactly the
+        same statistics and samples as making those calls one after another on a single DataSet.
+
+        Args:
+            other (DataSet): the dataset to merge in, left unchanged
+
+        Raises:
+            ValueError: If the materials, anneal types or keys don't match, or this dataset keeps samples the other doesn't have
+
+        Returns:
+            None: Returns None, but updates the dataset
+        """
+        if other.category_names[:len(BASE_KEYS)] != self.category_names[:len(BASE_KEYS)] or other.keys != self.keys:
+            message = f"\nCannot merge a dataset of {list(other.col_indeces)} {list(other.row_indeces)} {other.keys} into {list(self.col_indeces)} {list(self.row_indeces)} {self.keys}"
+            raise ValueError(message)
+        
+        if (self.keep_samples or self.spill is not None) and not other.keep_samples:
+            message = "\nCannot merge a dataset made with keep_samples = False into one that keeps its samples"
+            raise ValueError(message)
+        
+        # The other's category codes of every key translated to this dataset's
+        codes = np.array(other.group_keys)
+        for position in range(len(BASE_KEYS), len(self.keys)):
+            codes[:, position] = self.CodeNames(position, other.category_names[position])[other.group_keys[:, position]]
+        mapping = self.GroupsOf(codes)
+        
+        self.Invalidate()
+        self.stats.Merge(other.stats.Expand(mapping, self.n_groups))
+        self.fit_stats.Merge(other.fit_stats.Expand(mapping, self.n_groups))
+        
+        if other.keep_samples and len(other.record_groups) > 0:
+            values = np.column_stack([other.columns[parameter] for parameter in other.parameters])
+            self.AppendSamples(values, mapping[other.record_groups])
+        
+        return None
+    
+    def Summary(self):
+        """Gets everything needed to rebuild this dataset as plain lists and arrays, small enough to send between processes
+
+        Returns:
+            dictionary: materials, anneal types, keys and their categories, the groups, the statistics and fit moments, the samples (None when not kept) and the ingest report
+        """
+        summary = {
+            'format': SUMMARY_FORMAT,
+            'materials': list(self.col_indeces),
+            'anneal_types': list(self.row_indeces),
+            'keys': self.keys[len(BASE_KEYS):],
+            'categories': {key: list(names) for key, names in zip(self.keys[len(BASE_KEYS):], self.category_names[len(BASE_KEYS):])},
+            'group_keys': np.array(self.group_keys),
+            'stats': self.stats.State(),
+            'fit_stats': self.fit_stats.State(),
+            'values': None,
+            'groups': None,
+            'ingest_report': self.ingest_report
+        }
+        
+        if self.keep_samples:
+            summary['values'] = np.column_stack([self.columns[parameter] for parameter in self.parameters])
+            summary['groups'] = np.array(self.record_groups)
+        
+        return summary
+    
+    def Key(self, group):
+        """Category names of a group
+
+        Args:
+            group (int): group index
+
+        Returns:
+            dictionary: key -> category name, in the order of self.keys
+        """
+        return {key: names[code] for key, names, code in zip(self.keys, self.category_names, self.group_keys[group].tolist())}
+    
+    def Label(self, key, separator = ' '):
+        """Names a group for plot titles, e.g. 'Nickel annealed' or 'Nickel annealed, temperature 300K'
+
+        Args:
+            key (dictionary): key -> category name, as from Key()
+            separator (string): put between the material and the anneal type
+
+        Returns:
+            string: the label, keys with the MISSING category are left out
+        """
+        tags = ''.join(f", {name} {key[name]}" for name in self.keys[len(BASE_KEYS):] if key.get(name, MISSING) != MISSING)
+        return key['material'].title() + separator + key['anneal'] + tags
+    
+    def KeyPositions(self, keys):
+        """Finds the positions of key names in self.keys
+
+        Raises:
+            IndexError: If a key is not grouped on
+
+        Returns:
+            list: index of every key in self.keys
+        """
+        missing = [key for key in keys if key not in self.keys]
+        if len(missing) > 0:
+            message = f"\nKeys {missing} are not grouped on\nEnter some of the options: {self.keys}"
+            raise IndexError(message)
+        
+        return [self.keys.index(key) for key in keys]
+    
+    def Select(self, **filters):
+        """Finds the groups matching every filter, e.g. Select(material = 'tungsten', detector = ['hpge1', 'hpge2'])
+
+        Args:
+            filters: key -> category name, or a list of them
+
+        Raises:
+            IndexError: If a key is not grouped on
+
+        Returns:
+            array: indeces of the matching groups
+        """
+        mask = np.ones(self.n_groups, dtype = bool)
+        
+        for position, (key, names) in zip(self.KeyPositions(list(filters)), filters.items()):
+            names = [names] if isinstance(names, str) else names
+            codes = [self.categories[position][name] for name in names if name in self.categories[position]]
+            mask &= np.isin(self.group_keys[:, position], codes)
+        
+        return np.flatnonzero(mask)
+    
+    def KeyOrder(self, group_keys, positions):
+        """Orders rows of key codes by material and anneal type in the order they were given, then by the names of the other keys
+
+        Args:
+            group_keys (array): (n, len(positions)) key codes
+            positions (list): index in self.keys of the key of every column
+
+        Returns:
+            array: row indeces in order
+        """
+        if len(group_keys) == 0:
+            return np.empty(0, dtype = np.intp)
+        
+        columns = []
+        for column, position in enumerate(positions):
+            codes = group_keys[:, column]
+            if position >= len(BASE_KEYS):
+                # Rank of every code among the sorted names, so the order doesn't depend on which name was seen first
+                codes = np.argsort(np.argsort(np.array(self.category_names[position], dtype = str)))[codes]
+            columns.append(codes)
+        
+        return np.lexsort(columns[::-1])
+    
+    def DisplayOrder(self):
+        """Orders the groups for tables and plots, see KeyOrder
+
+        Returns:
+            array: group indeces in display order
+        """
+        return self.Memoized(('order',), lambda: self.KeyOrder(self.group_keys, list(range(len(self.keys)))))
+    
+    def PanelGroups(self):
+        """Groups in plotting order: every material and anneal type, then every group of that pair
+
+        A (material, anneal type) pair without any records still gets one panel, as group -1, so the plots show
+        which pairs have no data. Pairs are only ever split by the other keys of the groups that exist.
+
+        Returns:
+            list: (group, key) of every panel, key being the category names as from Key()
+        """
+        pairs = {}
+        for group in self.DisplayOrder().tolist():
+            pairs.setdefault(tuple(self.group_keys[group, :len(BASE_KEYS)].tolist()), []).append(group)
+        
+        panels = []
+        for material, col in self.col_indeces.items():
+            for anneal_type, row in self.row_indeces.items():
+                for group in pairs.get((col, row), [-1]):
+                    key = self.Key(group) if group >= 0 else {name: MISSING for name in self.keys}
+                    key.update({'material': material, 'anneal': anneal_type})
+                    panels.append((group, key))
+        
+        return panels
+    
+    def Reduced(self, keys):
+        """Statistics and fit moments with the groups rolled up to fewer keys, merging the accumulators of the groups that fall together
+
+        Args:
+            keys (list): a subset of self.keys, e.g. ['material'] or ['material', 'anneal']
+
+        Raises:
+            IndexError: If a key is not grouped on
+
+        Returns:
+            tuple: (n, len(keys)) key codes of the rolled up groups, their GroupStatistics and their FitAccumulator
+        """
+        positions = self.KeyPositions(keys)
+        
+        # Grouping by every key is just the groups themselves
+        if positions == list(range(len(self.keys))):
+            return self.group_keys, self.stats, self.fit_stats
+        
+        def Compute():
+            combinations, mapping = np.unique(self.group_keys[:, positions], axis = 0, return_inverse = True)
+            mapping = mapping.reshape(-1)
+            n_groups = len(combinations)
+            return combinations.reshape(-1, len(keys)), self.stats.Reduce(mapping, n_groups), self.fit_stats.Reduce(mapping, n_groups)
+        
+        return self.Memoized(('reduced', tuple(keys)), Compute)
+    
+    def StatisticTable(self, statistic, keys = None):
+        """A statistic of every parameter for every group, or for the groups rolled up to fewer keys
+
+        Args:
+            statistic (string): one of the keys of STATISTICS
+            keys (list): Default 'None' uses every key, otherwise a subset of self.keys to roll the groups up to
+
+        Returns:
+            array: (number of groups, 6) values of the statistic
+        """
+        keys = self.keys if keys is None else list(keys)
+        return self.Memoized(('statistic', statistic, tuple(keys)), lambda: STATISTICS[statistic](self.Reduced(keys)[1]))
+    
+    def Rollup(self, keys):
+        """Groups by fewer of the keys besides the material and anneal type, e.g. to plot every temperature together
+
+        Args:
+            keys (list): a subset of the other keys, [] groups by the material and anneal type alone
+
+        Raises:
+            IndexError: If a key is not one of the other keys of this dataset
+
+        Returns:
+            DataSet: the coarser dataset, holding the samples too when this one keeps them in memory
+        """
+        extra = self.keys[len(BASE_KEYS):]
+        missing = [key for key in keys if key not in extra]
+        if len(missing) > 0:
+            message = f"\nKeys {missing} can't be rolled up to\nEnter some of the options: {extra}"
+            raise IndexError(message)
+        
+        rolled = DataSet(list(self.col_indeces), keep_samples = self.keep_samples, anneal_types = list(self.row_indeces), keys = keys)
+        rolled.LoadCategories(dict(zip(self.keys, self.category_names)))
+        
+        positions = list(range(len(BASE_KEYS))) + self.KeyPositions(keys)
+        combinations, mapping = np.unique(self.group_keys[:, positions], axis = 0, return_inverse = True)
+        mapping = mapping.reshape(-1)
+        rolled.AddGroupKeys(combinations)
+        rolled.stats = self.stats.Reduce(mapping, rolled.n_groups)
+        rolled.fit_stats = self.fit_stats.Reduce(mapping, rolled.n_groups)
+        
+        if self.keep_samples and len(self.record_groups) > 0:
+            values = np.column_stack([self.columns[parameter] for parameter in self.parameters])
+            rolled.AppendSamples(values, mapping[self.record_groups])
+        
+        rolled.ingest_report = self.ingest_report
+        
+        return rolled
+    
+    def GroupSlice(self, group):
+        """Gets the slice of the columns holding a single group
+
+        Args:
+            group (int): group index
+
+        Returns:
+            slice: the records of the group
+        """
+        return slice(self.group_offsets[group], self.group_offsets[group + 1])
+    
+    def GetGroup(self, group, depth_index):
+        """Gets one parameter of a single group as a view of its column
+
+        Args:
+            group (int): group index, -1 (a panel without records, see PanelGroups) is empty
+            depth_index (int or string): parameter name or index in self.depth_indeces
+
+        Returns:
+            array: view of the parameter column for the group, or the number of samples for 'N Samples'
+        """
+        if type(depth_index) == str:
+            depth_index = self.depth_indeces[depth_index]
+        
+        # The sample count comes from the statistics, so it is there even when the samples are not kept
+        if depth_index == self.depth - 1:
+            return int(self.stats.count[group]) if group >= 0 else 0
+        
+        if group < 0:
+            return np.empty(0, dtype = np.float64)
+        
+        # Spilled samples are memory mapped from disk
+        if self.spill is not None:
+            return self.spill.Group(group, depth_index)
+        
+        return self.columns[self.parameters[depth_index]][self.GroupSlice(group)]
+    
+    def SelectIndexed(self, index):
+        """Finds the entries of an index belonging to the materials and anneal types of this dataset
+
+        Args:
+            index (PappyIndex): index of pappy files or rows
 
         Returns:
-            tensor: empty data tensor
+            tuple: positions of the selected entries in the index, and their anneal type (row) and material (column) indeces
         """
-        return [[[[] if _ < self.depth - 1 else 0 for _ in range(self.depth)] for j in range(self.cols)] for k in range(self.rows)]
+        selected = np.flatnonzero(index.Mask(list(self.col_indeces), list(self.row_indeces)))
+        
+        # Translate the index codes to the rows and columns of this dataset
+        row_of_code = np.array([self.row_indeces.get(name, -1) for name in index.anneal_codes], dtype = np.intp)
+        col_of_code = np.array([self.col_indeces.get(name, -1) for name in index.material_codes], dtype = np.intp)
+        
+        return selected, row_of_code[index.anneals[selected]], col_of_code[index.materials[selected]]
     
-    def FillDataSet(self, file_names):
-        """Fills the self.dataset with data from the list of files inputted
+    def FillDataSet(self, file_names, workers = None, processes = False, cache = None, root = None, quality = None, progress = None, metadata = None):
+        """Fills the columnar store with data from the list of files inputted
+
+        A file holding several measurements adds all of its rows, each with the material, anneal type (and tags) of
+        its Sample Name column, or of the file name when the sample name doesn't follow the pappy pattern.
 
         Args:
-            file_names (list): list of file names, and files inside of folders with appended reference (on each inside of a folder)
+            file_names (list or PappyIndex): list of file names, and files inside of folders with appended reference (on each inside of a folder), or an index of them
+            workers (int): Default 'None' reads the files serially, otherwise the number of parallel readers
+            processes (bool): Default 'False' reads with a thread pool, if 'True' uses a process pool
+            cache (ManifestCache): Default 'None' parses every file, otherwise only new or changed files are parsed and the cache is saved
+            root (string): Default 'None' reads the file names relative to the current working directory, otherwise relative to root
+            quality (QualityCheck): Default 'None' stops on the first file that can't be read, otherwise files that can't be read and records failing the checks are quarantined into its report
+            progress (callable): Default 'None', otherwise called as progress(files read, files selected) while the files are read, see ReadPappyFiles
+            metadata (dictionary): Default 'None', otherwise file name -> {key: value} for keys not tagged in the names, see KeyCodes
 
         Returns:
-            None: Returns None, but updates the self.dataset element
+            None: Returns None, but updates the columnar store and self.ingest_report
         """
         # Get the path directory for reference
-        path = os.getcwd()
+        path = os.getcwd() if root is None else root
         
-        # Take apart the file names and extrapolate row and column information
-        file_name_information = [file_name.split('_') for file_name in file_names]
+        # Parse the file names once into an index of material, anneal type, sample and trial (tagged names included)
+        index = file_names if isinstance(file_names, PappyIndex) else PappyIndex(file_names, TAGGED_PATTERN)
         
-        # Extrapolate the row and column data
-        rows = [self.row_indeces[row_[1]] for row_ in file_name_information]
+        # Only the materials and anneal types stated to be analyzed are selected, so unwanted files are never opened
+        selected, rows, cols = self.SelectIndexed(index)
         
-        # If the material was not stated to be analyzed, we skip it with a None filler to the blank to maintain list length
-        cols = [self.col_indeces[col_[0]] if col_[0] in self.col_indeces else None for col_ in file_name_information]
+        # Read the files in one batch, then add data to the dataset as one block
+        file_paths = [path + '/' + index.paths[position] for position in selected]
+        if cache is None:
+            values, self.ingest_report = ReadPappyFiles(file_paths, workers, processes, quarantine = quality is not None, progress = progress)
+        else:
+            values, self.ingest_report = cache.Read(file_paths, workers, processes, quarantine = quality is not None, progress = progress)
+            self.ingest_report['evictions'] = cache.Save()
         
-        # Add the data to the dataset through iteration
-        for (row, col, file_name) in zip(rows, cols, file_names):
-            # Check to make sure the column name being iterated is desired by the user, AKA not None
-            if col == None:
-                # If it is None, skip the loop
-                continue
+        names = [index.paths[position] for position in selected]
+        sources = file_paths
+        errors = self.ingest_report.pop('errors', None)
+        skipped = len(index) - len(selected)
+        
+        # Files holding several measurements give a record per row, selected again by the metadata of their sample names
+        multiple = self.ingest_report.pop('names')
+        file_rows = self.ingest_report.pop('rows')
+        if len(multiple) > 0:
+            records = PappyIndex(RecordNames(names, file_rows, multiple), RECORD_PATTERNS)
+            kept, rows, cols = self.SelectIndexed(records)
+            files = np.repeat(np.arange(len(names)), file_rows)[kept]
+            values = values[kept]
+            names = [records.paths[position] for position in kept]
+            sources = [file_paths[file] + names[position][len(index.paths[selected[file]]):] for position, file in enumerate(files.tolist())]
+            skipped += len(records) - len(kept)
+            if metadata is not None:
+                metadata = {name: metadata[index.paths[selected[file]]] for name, file in zip(names, files.tolist()) if index.paths[selected[file]] in metadata}
             
-            # Open the file to read the information before passing to csv.reader()
-            file = open((path + '/' + file_name), 'r')
+            # An unreadable file is one row of NaN, its error goes to that row
+            if errors:
+                first = {file: position for position, file in reversed(list(enumerate(files.tolist())))}
+                errors = {first[file]: message for file, message in errors.items() if file in first}
+        
+        codes = self.KeyCodes(cols, rows, names, metadata)
+        
+        # Bad files and records are set aside before they reach the statistics, so groups are only made for records that passed
+        if quality is not None:
+            passed = quality.Check(values, *BatchGroups(codes), sources, errors)
+            values, codes = values[passed], codes[passed]
+            self.ingest_report['quarantined'] = int(np.count_nonzero(~passed))
+        
+        self.AddRecords(values, self.GroupsOf(codes))
+        
+        # Files (and rows) left out because of their material or anneal type, and names that don't follow the pappy pattern
+        self.ingest_report['skipped'] = skipped
+        self.ingest_report['rejected'] = len(index.rejected)
+        
+        return None
+    
+    def FillFromBulk(self, file_path, quality = None):
+        """Fills the dataset from one file holding many measurements, a pack from PackPappyFiles or a csv with many rows
+
+        A pack ('.npz') already holds the material and anneal type codes of every row. The rows of a csv get theirs
+        from the 'Sample Name' column, e.g. 'nickel_annealed_13_trial_01.csv', and the other keys from its tags, e.g.
+        'nickel_annealed_temperature-300K_13_trial_01.csv'. Either way the file is one sequential read.
+
+        Args:
+            file_path (string): path to the pack or csv file
+            quality (QualityCheck): Default 'None' adds every row (a malformed csv row raises), otherwise malformed rows and rows failing the checks are quarantined into its report
+
+        Returns:
+            None: Returns None, but updates the columnar store and self.ingest_report
+        """
+        start = time.perf_counter()
+        
+        if file_path.endswith('.npz'):
+            index, values = LoadPappyPack(file_path)
+            sources = index.paths
+        else:
+            names, values = ReadPappyRows(file_path, strict = quality is None)
+            index = PappyIndex(names, SAMPLE_PATTERN)
+            values = values[index.positions]
+            sources = [f"{file_path}:{name}" for name in index.paths]
+        
+        selected, rows, cols = self.SelectIndexed(index)
+        values = values[selected]
+        codes = self.KeyCodes(cols, rows, [index.paths[position] for position in selected])
+        
+        quarantined = 0
+        if quality is not None:
+            passed = quality.Check(values, *BatchGroups(codes), [sources[position] for position in selected])
+            values, codes = values[passed], codes[passed]
+            quarantined = int(np.count_nonzero(~passed))
+        
+        self.AddRecords(values, self.GroupsOf(codes))
+        
+        seconds = time.perf_counter() - start
+        self.ingest_report = {
+            'files': 1,
+            'records': len(values),
+            'seconds': seconds,
+            'files_per_second': 1 / seconds if seconds > 0 else float('inf'),
+            'skipped': len(index) - len(selected),
+            'rejected': len(index.rejected),
+            'quarantined': quarantined
+        }
+        
+        return None
+    
+    def StreamDataSet(self, root = None, batch_size = BATCH_SIZE, workers = None, processes = False, quality = None):
+        """Fills the dataset from every pappy file below root, in fixed size batches straight from the directory scan
+
+        The file list is never built in full: each batch of batch_size paths is taken from the scan as it goes, read,
+        folded into the statistics and fit moments, and dropped. Made with keep_samples = False (or with a spill
+        folder for the box plots), memory then stays flat however many pappy files there are.
+
+        Args:
+            root (string): Default 'None' scans the current working directory, otherwise the folder to scan
+            batch_size (int): number of files read per batch
+            workers (int): Default 'None' reads the files serially, otherwise the number of parallel readers
+            processes (bool): Default 'False' reads with a thread pool, if 'True' uses a process pool
+            quality (QualityCheck): Default 'None' stops on the first file that can't be read, otherwise bad records are quarantined (outliers are judged within each batch)
+
+        Returns:
+            None: Returns None, but updates the dataset and sets self.ingest_report for all the batches together
+        """
+        files = ScanDirectories(root)
+        report = {'files': 0, 'seconds': 0.0, 'skipped': 0, 'rejected': 0, 'quarantined': 0, 'batches': 0}
+        
+        while True:
+            batch = list(itertools.islice(files, batch_size))
+            if len(batch) == 0:
+                break
             
-            # Save the data from the csv file to a list while removing the first column (file name)
-            csv_data = [float(data) for data in list(csv.reader(file))[1][1:]]
+            self.FillDataSet(batch, workers, processes, root = root, quality = quality)
             
-            # Add data to the dataset
-            for _, depth in self.depth_indeces.items():
-                # If the index is at the counting index (6), be sure not to use the csv data
-                if depth == 6:
-                    # Add to the n-samples deep layer
-                    self.dataset[row][col][depth] += 1
-                else:
-                    # Add the parameter to the specified location in the tensor
-                    self.dataset[row][col][depth].append(csv_data[depth])
+            for key in ('files', 'seconds', 'skipped', 'rejected', 'quarantined'):
+                report[key] += self.ingest_report.get(key, 0)
+            report['batches'] += 1
+        
+        report['files_per_second'] = report['files'] / report['seconds'] if report['seconds'] > 0 else 0.0
+        self.ingest_report = report
         
         return None
     
-    def DisplayData(self, depth_index):
+    def DisplayData(self, depth_index, statistic = 'mean'):
         """Generates a console output to show the averaged S parameters and propogated uncertainties
 
+        The table is read from the streaming statistics in self.stats, so it works without the samples being kept.
+        Groups split by keys besides the material and anneal type are rolled up into one cell, see DisplayGroups for them.
+
         Args:
             depth_index (string): A string name for which parameter to examine (ie. 'S Parameter', 'L Wing Parameter', 'R Wing Parameter')
+            statistic (string): Default 'mean', or one of the other keys of STATISTICS (ie. 'weighted mean', 'std', 'min', 'max')
 
         Raises:
             IndexError: If the name is not found in the data report, it will raise an error of the index
@@ -144,6 +941,19 @@ class DataSet(object):
             else:
                 depth_index = self.depth_indeces[depth_index]
         
+        if statistic not in STATISTICS:
+            message = f"\nStatistic ({statistic}) is not available\nEnter one of the options: {list(STATISTICS)}"
+            raise IndexError(message)
+        
+        # Every (material, anneal type) group's value of the statistic, the sample count is shown as it is
+        group_keys, stats, _ = self.Reduced(BASE_KEYS)
+        cells = {tuple(codes): group for group, codes in enumerate(group_keys.tolist())}
+        counts = stats.count
+        if depth_index == self.depth - 1:
+            table = counts.astype(np.float64)
+        else:
+            table = self.StatisticTable(statistic, BASE_KEYS)[:, depth_index]
+        
         # Make the sample material names
         script = f"\n{'':<12}"
         
@@ -161,8 +971,9 @@ class DataSet(object):
             script = f"\n{name.title():^12}"
             for col in range(self.cols):
                 # If the dataset is empty, then don't average. Otherwise, present the mean for visualization
-                if np.sum(self.dataset[row][col][depth_index]) > 0:
-                    mean = np.mean(self.dataset[row][col][depth_index])
+                group = cells.get((col, row), -1)
+                if group >= 0 and counts[group] > 0 and not np.isnan(table[group]):
+                    mean = table[group]
                     script += f"{mean:^12.6f}"
                 else:
                     mean = '(NO DATA)'
@@ -172,121 +983,291 @@ class DataSet(object):
         
         return None
     
-    def SvW(self, trendline = False):
-        """Scatter plot of S vs W parameters
+    def Table(self, depth_index = 'S Parameter', statistic = 'mean', keys = None):
+        """One row per non-empty group with its category names, record count and a statistic of a parameter
+
+        Args:
+            depth_index (string): parameter name or index in self.depth_indeces
+            statistic (string): Default 'mean', or one of the other keys of STATISTICS
+            keys (list): Default 'None' uses every key, otherwise a subset of self.keys to roll the groups up to, e.g. ['material']
+
+        Raises:
+            IndexError: If the parameter, statistic or a key is not available
+
+        Returns:
+            list: dictionary of key -> category name, 'count' and the statistic for every group, ordered by the keys
+        """
+        if type(depth_index) == str:
+            if depth_index not in self.depth_indeces:
+                message = f"\nKey ({depth_index}) was not found in the dictionary\nEnter one of the options from the analysis: {list(self.depth_indeces.keys())}"
+                raise IndexError(message)
+            depth_index = self.depth_indeces[depth_index]
+        
+        if statistic not in STATISTICS:
+            message = f"\nStatistic ({statistic}) is not available\nEnter one of the options: {list(STATISTICS)}"
+            raise IndexError(message)
+        
+        keys = self.keys if keys is None else list(keys)
+        positions = self.KeyPositions(keys)
+        group_keys, stats, _ = self.Reduced(keys)
+        values = stats.count.astype(np.float64) if depth_index == self.depth - 1 else self.StatisticTable(statistic, keys)[:, depth_index]
+        
+        # Ordered like DisplayOrder, by the given materials and anneal types and by the names of the other keys
+        order = self.KeyOrder(group_keys, positions)
+        
+        rows = []
+        for group in order:
+            # Groups whose every record was quarantined are left out
+            if stats.count[group] == 0:
+                continue
+            row = {key: self.category_names[position][code] for key, position, code in zip(keys, positions, group_keys[group].tolist())}
+            row['count'] = int(stats.count[group])
+            row[statistic] = float(values[group])
+            rows.append(row)
+        
+        return rows
+    
+    def DisplayGroups(self, depth_index = 'S Parameter', statistic = 'mean', keys = None):
+        """Prints Table() with one column per key, e.g. to see every temperature of every material
+
+        Returns:
+            None: Outputs a display, returns None
+        """
+        keys = self.keys if keys is None else list(keys)
+        rows = self.Table(depth_index, statistic, keys)
+        
+        print('\n' + ''.join(f"{key.title():<14}" for key in keys) + f"{'Count':>8}{statistic.title():>16}")
+        for row in rows:
+            names = ''.join(f"{row[key] if row[key] != MISSING else '-':<14}" for key in keys)
+            print(f"{names}{row['count']:>8}{row[statistic]:>16.6f}")
+        
+        return None
+    
+    def WColumns(self):
+        """Combines the wing columns into W and its uncertainty for every record
+
+        Returns:
+            tuple: W and W uncertainty arrays, in the same record order as the other columns
+        """
+        return self.Memoized(('W',), lambda: ComputeW(
+            self.columns['Left W Parameter'], self.columns['Right W Parameter'], self.columns['Left W Uncertainty'], self.columns['Right W Uncertainty']
+        ))
+    
+    def GroupW(self, group):
+        """W and its uncertainty for a single group
+
+        Args:
+            group (int): group index, -1 is empty
+
+        Returns:
+            tuple: W and W uncertainty arrays of the group's records
+        """
+        # Spilled samples are combined group by group and not kept, so memory stays flat
+        if self.spill is not None or group < 0:
+            return ComputeW(*(self.GetGroup(group, depth) for depth in (2, 4, 3, 5)))
+        
+        # Otherwise the group is a view of the memoized W columns
+        W, W_error = self.WColumns()
+        records = self.GroupSlice(group)
+        return W[records], W_error[records]
+    
+    def FitSvW(self, method = 'ols'):
+        """Fits S = slope * W + intercept for every group at once, without plotting
+
+        The 'ols' fit comes from the running moments in self.fit_stats, so it costs nothing per record and works
+        without the samples being kept. The 'york' fit needs the samples, and flags any group whose iteration ran
+        out before its slope converged in 'converged' (with a RuntimeWarning).
+
+        Args:
+            method (string): Default 'ols', or 'york' to weight the fit by the S and W uncertainties
+
+        Raises:
+            ValueError: If 'york' is asked for on a dataset that doesn't keep its samples
+
+        Returns:
+            dictionary: method, n, slope, intercept, r_squared, covariance and converged arrays indexed by group
+        """
+        if method == 'ols':
+            return self.Memoized(('fit', method), self.fit_stats.Fit)
+        
+        if not self.keep_samples:
+            raise ValueError(f"\nThe '{method}' fit needs the samples, but this dataset was made with keep_samples = False")
+        
+        def Compute():
+            W, W_error = self.WColumns()
+            return FitGroups(W, self.columns['S Parameter'], self.record_groups, self.n_groups, W_error, self.columns['S Uncertainty'], method)
+        
+        return self.Memoized(('fit', method), Compute)
+    
+    def SvW(self, trendline = False, method = 'ols', fig = None, max_points = DEFAULT_MAX_POINTS):
+        """Scatter plot of S vs W parameters, one panel for every group (see PanelGroups)
 
         Args:
             trendline [bool]: Default 'False', if 'True' displays a trendline for each plot
+            method (string): Default 'ols', or 'york' for an uncertainty weighted trendline (see FitSvW)
+            fig (Figure): Default 'None' makes a new pyplot figure, otherwise the figure is cleared and reused
+            max_points (int): most points drawn per panel, larger groups are decimated (the fit always uses every point)
+
+        Returns:
+            tuple: the figure and a 2D array of its axes
         """
-        fig, ax = plt.subplots(2, 3)
-        fig.subplots_adjust(bottom = 0.18, top = 0.9, wspace = 0.5, hspace = 0.8)
-        #fig.tight_layout()
-        fig.set_facecolor('lightgray')
+        # Groups in plotting order, iterating through the materials and then the anneal types
+        panels = self.PanelGroups()
         
-        # Lists to store the parameter and uncertainty data
-        labels = []
-        s_parameters = []
-        s_uncertainty = []
-        l_parameters = []
-        l_uncertainty = []
-        r_parameters = []
-        r_uncertainty = []
+        nrows, ncols = GridShape(len(panels))
+        fig, ax = PrepareFigure(fig, nrows, ncols, (4.0 * ncols, 3.6 * nrows))
         
         # List of plot colors
         colors = ['salmon', 'cadetblue', 'magenta', 'cyan', 'olivedrab', 'goldenrod']
         
-        # Iterate through the columns which are the material names
-        for material, col in self.col_indeces.items():
-            # Iterate through the rows of the data which are the two anneal types
-            for annealing_type, row in self.row_indeces.items():
-                # Append to all of the lists to store them conveniently for plotting and analysis
-                s_parameters.append(self.dataset[row][col][0])
-                s_uncertainty.append(self.dataset[row][col][1])
-                l_parameters.append(self.dataset[row][col][2])
-                l_uncertainty.append(self.dataset[row][col][3])
-                r_parameters.append(self.dataset[row][col][4])
-                r_uncertainty.append(self.dataset[row][col][5])
-                labels.append(material.title() + ' ' + annealing_type)
-
-        # Add a trendline if necessary
-        if trendline == True:
-            for index, S, s_uncert, L, l_uncert, R, r_uncert in zip(range(self.cols), s_parameters, s_uncertainty, l_parameters, l_uncertainty, r_parameters, r_uncertainty):
-                # Generate a list of the summed errors by propogation of the wing uncertainties
-                W = [np.sqrt(l * l + r * r) for l, r in zip(L, R)]
-                W_error = [np.sqrt(l_ * l_ + r_ * r_) for l_, r_ in zip(l_uncert, r_uncert)]
-                # Get the line fit coefficients
-                b, a = np.polyfit(W, S, deg=1)
-                # Get the r_squared metric by using numpy correlation method and squaring it whilst maintaining the sign +/-
-                r_squared = np.corrcoef(W, S)[0, 1] * np.corrcoef(W, S)[0, 1]
-                # Generate a sequence of x points to plot
-                xseq = np.linspace(0.99 * min(W), 1.01 * max(W), int((max(W) - min(W)) * 1000))
-                # Set the x  and y labels, x label includes the print out of the line fit equation with the r^2 metric
-                ax[0 if index < 3 else 1][index % 3].set_xlabel(f"W Parameter \n\nLine fit: S(W) = {b:.6f} * W + ({a:.6f}) \nr^2 value: {r_squared:.4f}", weight = 'bold', fontsize = 10.0)
-                ax[0 if index < 3 else 1][index % 3].set_ylabel("S Parameter", weight = 'bold', fontsize = 10.0)
-                # Establish the error bars
-                ax[0 if index < 3 else 1][index % 3].errorbar(W, S, yerr = s_uncert, xerr = W_error, ls = 'None')
-                # Plot the scatter points of the parameters
-                ax[0 if index < 3 else 1][index % 3].scatter(W, S, color = colors[index], s = 1)
-                # Add the title
-                ax[0 if index < 3 else 1][index % 3].set_title(f"S vs. W -> {list(self.col_indeces)[index].title()}")
+        # Every group's line fit is computed once, up front
+        fit = self.FitSvW(method) if trendline == True else None
+        
+        for index, (group, key) in enumerate(panels):
+            axis = ax[index // ncols][index % ncols]
+
+            # Add the title
+            axis.set_title(f"S vs. W -> {self.Label(key)}")
+            axis.set_ylabel("S Parameter", weight = 'bold', fontsize = 10.0)
+            
+            # The group's columns, as views of the store or memory mapped from the spill folder
+            S = self.GetGroup(group, 0)
+            if len(S) == 0:
+                axis.set_xlabel("W Parameter \n\n(NO DATA)", weight = 'bold', fontsize = 10.0)
+                continue
+            
+            # W and its propogated uncertainty
+            W, W_error = self.GroupW(group)
+            
+            # Only every step-th point is drawn once a group has more than max_points
+            shown = Decimate(len(W), max_points)
+            
+            # Establish the error bars
+            axis.errorbar(W[shown], S[shown], yerr = self.GetGroup(group, 1)[shown], xerr = W_error[shown], ls = 'None')
+            # Plot the scatter points of the parameters
+            axis.scatter(W[shown], S[shown], color = colors[index % len(colors)], s = 1)
+            
+            # Add a trendline if necessary
+            if trendline == True:
+                # Get the line fit coefficients and r^2 metric of the group
+                b = fit['slope'][group]
+                a = fit['intercept'][group]
+                r_squared = fit['r_squared'][group]
+                # The two ends of the line are all it takes to draw it, however wide the W range is
+                W_min, W_max = self.Memoized(('W range', group), lambda: (W.min(), W.max()))
+                xseq = np.array([0.99 * W_min, 1.01 * W_max])
+                # Set the x label, it includes the print out of the line fit equation with the r^2 metric
+                axis.set_xlabel(f"W Parameter \n\nLine fit: S(W) = {b:.6f} * W + ({a:.6f}) \nr^2 value: {r_squared:.4f}", weight = 'bold', fontsize = 10.0)
                 # Plot the line fit equation using the x sequence data we created previously
-                ax[0 if index < 3 else 1][index % 3].plot(xseq, a + b * xseq, color = 'k', lw = 2.5)
+                axis.plot(xseq, a + b * xseq, color = 'k', lw = 2.5)
+            else:
+                axis.set_xlabel("W Parameter", weight = 'bold', fontsize = 10.0)
+        
+        # Hide the panels left over at the end of the grid
+        for index in range(len(panels), nrows * ncols):
+            ax[index // ncols][index % ncols].set_visible(False)
         
         return fig, ax
     
-    def BoxPlots(self):
+    def DensityTiles(self, base_bins = BASE_BINS):
+        """Multi-resolution S vs. W histograms of every group, see PepToDensity
+
+        Returns:
+            list: DensityPyramid of every group, indexed by group
+        """
+        def Compute():
+            return [DensityPyramid(self.GroupW(group)[0], self.GetGroup(group, 0), base_bins = base_bins) for group in range(self.n_groups)]
+        
+        return self.Memoized(('density', base_bins), Compute)
+    
+    def SvWDensity(self, trendline = False, method = 'ols', fig = None, target_bins = TARGET_BINS, max_points = DEFAULT_MAX_POINTS):
+        """S vs. W density of every group (see PanelGroups), for datasets too large to scatter
+
+        Each panel shows one level of the group's DensityTiles, picked and cropped for the visible range, so
+        drawing costs the same for a hundred points or millions. Zooming or panning a panel (e.g. with the toolbar
+        of an interactive window) swaps in the level fitting the new range, and once zoomed past the finest level
+        with at most max_points left in view the points are drawn with their error bars instead.
+
+        Args:
+            trendline [bool]: Default 'False', if 'True' displays a trendline for each plot
+            method (string): Default 'ols', or 'york' for an uncertainty weighted trendline (see FitSvW)
+            fig (Figure): Default 'None' makes a new pyplot figure, otherwise the figure is cleared and reused
+            target_bins (int): bins drawn across each panel, whatever the zoom
+            max_points (int): most points drawn one by one when zoomed in
+
+        Returns:
+            tuple: the figure and a 2D array of its axes
+        """
+        panels = self.PanelGroups()
+        
+        nrows, ncols = GridShape(len(panels))
+        fig, ax = PrepareFigure(fig, nrows, ncols, (4.0 * ncols, 3.6 * nrows))
+        
+        tiles = self.DensityTiles()
+        fit = self.FitSvW(method) if trendline == True else None
+        
+        for index, (group, key) in enumerate(panels):
+            axis = ax[index // ncols][index % ncols]
+            
+            axis.set_title(f"S vs. W -> {self.Label(key)}")
+            axis.set_ylabel("S Parameter", weight = 'bold', fontsize = 10.0)
+            
+            if self.GetGroup(group, self.depth - 1) == 0:
+                axis.set_xlabel("W Parameter \n\n(NO DATA)", weight = 'bold', fontsize = 10.0)
+                continue
+            
+            # The points are only read when a panel is zoomed in far enough to draw them
+            def Points(group = group):
+                W, W_error = self.GroupW(group)
+                return W, self.GetGroup(group, 0), W_error, self.GetGroup(group, 1)
+            
+            DensityPanel(axis, tiles[group], Points, target_bins, max_points)
+            
+            if trendline == True:
+                b = fit['slope'][group]
+                a = fit['intercept'][group]
+                r_squared = fit['r_squared'][group]
+                xseq = np.array(tiles[group].extent[:2])
+                axis.set_xlabel(f"W Parameter \n\nLine fit: S(W) = {b:.6f} * W + ({a:.6f}) \nr^2 value: {r_squared:.4f}", weight = 'bold', fontsize = 10.0)
+                axis.plot(xseq, a + b * xseq, color = 'k', lw = 2.5)
+            else:
+                axis.set_xlabel("W Parameter", weight = 'bold', fontsize = 10.0)
+        
+        for index in range(len(panels), nrows * ncols):
+            ax[index // ncols][index % ncols].set_visible(False)
+        
+        return fig, ax
+    
+    def BoxPlots(self, fig = None):
+        """Box plots of every parameter, one box for every group (see PanelGroups)
+
+        Args:
+            fig (Figure): Default 'None' makes a new pyplot figure, otherwise the figure is cleared and reused
+
+        Returns:
+            tuple: the figure and a 2D array of its axes
+        """
+        from matplotlib import cbook
+        
         theta = 45
         font_size = 6
         
-        fig, ax = plt.subplots(3, 2)
-        fig.subplots_adjust(bottom = 0.15, top = 0.95, wspace = 0.5, hspace = 1.0)
-        fig.tight_layout()
-        fig.set_facecolor('lightgray')
+        # The panels are the parameters, so the grid is fixed and the boxes grow with the number of materials
+        panels = self.PanelGroups()
+        fig, ax = PrepareFigure(fig, 3, 2, (max(6.4, 0.9 * len(panels)), 7.2))
         
-        labels = []
-        s_parameters = []
-        s_uncertainties = []
-        l_parameters = []
-        l_uncertainties = []
-        r_parameters = []
-        r_uncertainties = []
+        labels = [self.Label(key, '\n') for _, key in panels]
+        titles = ['S Parameters', 'S Uncertainties', 'Left Wing Parameters', 'Left Wing Uncertainties', 'Right Wing Parameters', 'Right Wing Uncertainties']
         
-        for material, col in self.col_indeces.items():
-            for annealing_type, row in self.row_indeces.items():
-                s_parameters.append(self.dataset[row][col][0])
-                s_uncertainties.append(self.dataset[row][col][1])
-                l_parameters.append(self.dataset[row][col][2])
-                l_uncertainties.append(self.dataset[row][col][3])
-                r_parameters.append(self.dataset[row][col][4])
-                r_uncertainties.append(self.dataset[row][col][5])
-                labels.append(material.title() + f'\n' + annealing_type)
-        
-        ax[0][0].set_title('S Parameters')
-        ax[0][0].boxplot(s_parameters, widths = 0.9, patch_artist = True)
-        ax[0][0].tick_params(labelsize = font_size)
-        ax[0][0].set_xticklabels(labels, rotation = theta)
-        ax[0][1].set_title('S Uncertainties')
-        ax[0][1].boxplot(s_uncertainties, widths = 0.9, patch_artist = True)
-        ax[0][1].tick_params(labelsize = font_size)
-        ax[0][1].set_xticklabels(labels, rotation = theta)
-        
-        ax[1][0].set_title('Left Wing Parameters')
-        ax[1][0].boxplot(l_parameters, widths = 0.9, patch_artist = True)
-        ax[1][0].tick_params(labelsize = font_size)
-        ax[1][0].set_xticklabels(labels, rotation = theta)
-        ax[1][1].set_title('Left Wing Uncertainties')
-        ax[1][1].boxplot(l_uncertainties, widths = 0.9, patch_artist = True)
-        ax[1][1].tick_params(labelsize = font_size)
-        ax[1][1].set_xticklabels(labels, rotation = theta)
-        
-        ax[2][0].set_title('Right Wing Parameters')
-        ax[2][0].boxplot(r_parameters, widths = 0.9, patch_artist = True)
-        ax[2][0].tick_params(labelsize = font_size)
-        ax[2][0].set_xticklabels(labels, rotation = theta)
-        ax[2][1].set_title('Right Wing Uncertainties')
-        ax[2][1].boxplot(r_uncertainties, widths = 0.9, patch_artist = True)
-        ax[2][1].tick_params(labelsize = font_size)
-        ax[2][1].set_xticklabels(labels, rotation = theta)
+        for depth, title in enumerate(titles):
+            axis = ax[depth // 2][depth % 2]
+            axis.set_title(title)
+            # The box and whisker stats of every group are computed once, then only drawn on later calls
+            stats = self.Memoized(('box', depth), lambda: cbook.boxplot_stats([self.GetGroup(group, depth) for group, _ in panels]))
+            axis.bxp(stats, widths = 0.9, patch_artist = True)
+            axis.tick_params(labelsize = font_size)
+            axis.set_xticks(range(1, len(labels) + 1))
+            axis.set_xticklabels(labels, rotation = theta)
         
         return fig, ax
     
@@ -298,31 +1279,239 @@ class DataSet(object):
         file_name = f"{path}/{date}_all_samples_pepto.csv"
         file = open(file_name, 'w')
         csv_writer = csv.writer(file)
-        csv_writer.writerow(["Material", "Anneal Type"] + list([item for item in self.depth_indeces.keys()]))
-        for material, col in self.col_indeces.items():
-            for anneal_type, row in self.row_indeces.items():
-                csv_writer.writerow([material, anneal_type] + self.dataset[row][col])
+        extra = self.keys[len(BASE_KEYS):]
+        csv_writer.writerow(["Material", "Anneal Type"] + [key.title() for key in extra] + list([item for item in self.depth_indeces.keys()]))
+        for group, key in self.PanelGroups():
+            # Each parameter cell is written as the list of the group's values, followed by the sample count
+            cells = [self.GetGroup(group, depth).tolist() for depth in range(self.depth - 1)]
+            csv_writer.writerow([key['material'], key['anneal']] + [key[name] for name in extra] + cells + [self.GetGroup(group, self.depth - 1)])
         
         print(f"\t\nSuccessfully saved to '{file_name}'!\n")
+    
+    def RebuildStatistics(self):
+        """Recomputes the streaming statistics from the stored columns, e.g. after they were loaded from disk
+
+        Returns:
+            None: Returns None, but replaces self.stats
+        """
+        self.Invalidate()
+        self.stats = GroupStatistics(self.n_groups, len(self.parameters))
+        self.fit_stats = FitAccumulator(self.n_groups)
+        values = np.column_stack([self.columns[parameter] for parameter in self.parameters])
+        self.stats.Add(values, self.record_groups)
+        self.fit_stats.Add(self.WColumns()[0], self.columns['S Parameter'], self.record_groups)
+        
+        return None
+    
+    def ToBinary(self, date):
+        """Saves the columnar store losslessly as a folder of .npy columns with a small JSON header
+
+        Each column is its own .npy file, so a downstream job can memory map a single parameter without loading the
+        rest (see LoadColumn). The records are stored in group order, with the keys, their categories, the key codes
+        of every group and the group offsets in the header. The samples of a spill dataset are read back from its
+        spill files.
+
+        Args:
+            date (string): date used to name the folder, as in ToCSV
+
+        Raises:
+            ValueError: If the dataset doesn't keep its samples (made with keep_samples = False and no spill folder)
+
+        Returns:
+            string: path to the saved folder
+        """
+        if not self.keep_samples and self.spill is None:
+            raise ValueError("\nToBinary saves the samples, but this dataset was made with keep_samples = False")
+        
+        path = os.getcwd()
+        folder = f"{path}/{date}_all_samples_pepto"
+        os.makedirs(folder, exist_ok = True)
+        
+        # Column files are named after the parameters, e.g. 'S Parameter' -> 's_parameter.npy'
+        column_files = {parameter: parameter.lower().replace(' ', '_') + '.npy' for parameter in self.parameters}
+        
+        if self.spill is None:
+            record_groups, group_offsets = self.record_groups, self.group_offsets
+            for parameter, column_file in column_files.items():
+                np.save(f"{folder}/{column_file}", np.ascontiguousarray(self.columns[parameter], dtype = np.float64))
+        else:
+            # Spilled samples are copied group by group into memory mapped column files, so they never all sit in memory
+            group_offsets = np.concatenate(([0], np.cumsum(self.spill.counts))).astype(np.intp)
+            record_groups = np.repeat(np.arange(self.n_groups, dtype = np.intp), self.spill.counts)
+            for parameter, column_file in column_files.items():
+                column = np.lib.format.open_memmap(f"{folder}/{column_file}", mode = 'w+', dtype = np.float64, shape = (int(group_offsets[-1]),))
+                for group in np.flatnonzero(self.spill.counts):
+                    column[group_offsets[group]:group_offsets[group + 1]] = self.GetGroup(group, parameter)
+                column.flush()
+                del column
+        np.save(f"{folder}/record_groups.npy", record_groups)
+        
+        header = {
+            'format': BINARY_FORMAT,
+            'materials': list(self.col_indeces),
+            'anneal_types': list(self.row_indeces),
+            'keys': self.keys[len(BASE_KEYS):],
+            'categories': {key: list(names) for key, names in zip(self.keys[len(BASE_KEYS):], self.category_names[len(BASE_KEYS):])},
+            'records': int(len(record_groups)),
+            'group_keys': self.group_keys.tolist(),
+            'group_offsets': group_offsets.tolist(),
+            'columns': column_files
+        }
+        with open(f"{folder}/header.json", 'w') as file:
+            json.dump(header, file, indent = 4)
+        
+        print(f"\t\nSuccessfully saved to '{folder}'!\n")
+        
+        return folder
+
+def ReadBinaryHeader(folder):
+    """Reads the JSON header of a folder saved by DataSet.ToBinary
+
+    Args:
+        folder (string): path to the saved folder
+
+    Raises:
+        ValueError: If the folder was not written by DataSet.ToBinary
+
+    Returns:
+        dictionary: the header
+    """
+    with open(f"{folder}/header.json", 'r') as file:
+        header = json.load(file)
+    
+    if header.get('format') != BINARY_FORMAT:
+        message = f"\n'{folder}' is not a PepTo binary dataset\nExpected format '{BINARY_FORMAT}' but got {header.get('format')} instead"
+        raise ValueError(message)
+    
+    return header
+
+def LoadColumn(folder, parameter, mmap = True):
+    """Loads a single parameter column of a folder saved by DataSet.ToBinary without touching the others
+
+    Args:
+        folder (string): path to the saved folder
+        parameter (string): parameter name, e.g. 'S Parameter'
+        mmap (bool): Default 'True' memory maps the column read-only, if 'False' reads it into memory
+
+    Raises:
+        IndexError: If the parameter is not in the saved dataset
 
-def main():
+    Returns:
+        array: the column in group order, see the header 'group_offsets' for the group boundaries
+    """
+    header = ReadBinaryHeader(folder)
+    
+    if parameter not in header['columns']:
+        message = f"\nKey ({parameter}) was not found in the saved dataset\nEnter one of the options: {list(header['columns'])}"
+        raise IndexError(message)
+    
+    return np.load(f"{folder}/{header['columns'][parameter]}", mmap_mode = 'r' if mmap else None)
+
+def FromBinary(folder, mmap = False):
+    """Rebuilds a DataSet from a folder saved by DataSet.ToBinary
+
+    Args:
+        folder (string): path to the saved folder
+        mmap (bool): Default 'False' reads the columns into memory, if 'True' memory maps them read-only
+
+    Returns:
+        DataSet: the dataset, equal to the one that was saved
+    """
+    header = ReadBinaryHeader(folder)
+    
+    dset = DataSet(header['materials'], anneal_types = header['anneal_types'], keys = header['keys'])
+    dset.LoadCategories(header['categories'])
+    dset.AddGroupKeys(header['group_keys'])
+    
+    # The records were saved in group order, so the columns are used as they are
+    for parameter in dset.parameters:
+        dset.columns[parameter] = LoadColumn(folder, parameter, mmap)
+    dset.record_groups = np.load(f"{folder}/record_groups.npy", mmap_mode = 'r' if mmap else None)
+    dset.group_offsets = np.asarray(header['group_offsets'], dtype = np.intp)
+    dset.RebuildStatistics()
+    
+    return dset
+
+def FromSummary(summary):
+    """Rebuilds a DataSet from DataSet.Summary()
+
+    Args:
+        summary (dictionary): the summary
+
+    Raises:
+        ValueError: If it is not a DataSet summary
+
+    Returns:
+        DataSet: the dataset, equal to the one that was summarized
+    """
+    if summary.get('format') != SUMMARY_FORMAT:
+        message = f"\nNot a PepTo dataset summary\nExpected format '{SUMMARY_FORMAT}' but got {summary.get('format')} instead"
+        raise ValueError(message)
+    
+    dset = DataSet(list(summary['materials']), keep_samples = summary['values'] is not None, anneal_types = summary['anneal_types'], keys = summary['keys'])
+    
+    # The groups are made in the same order, so the accumulators and samples line up with them
+    dset.LoadCategories(summary['categories'])
+    dset.AddGroupKeys(summary['group_keys'])
+    dset.stats.LoadState(summary['stats'])
+    dset.fit_stats.LoadState(summary['fit_stats'])
+    if summary['values'] is not None:
+        dset.AppendSamples(summary['values'], summary['groups'])
+    dset.ingest_report = summary['ingest_report']
+    
+    return dset
+
+def main(profile = False, quality = DEFAULT_QUALITY):
+    """Runs the whole analysis from the current working directory
+
+    Args:
+        profile (bool): Default 'False', if 'True' records the time and memory of every stage (see PepToProfile, also switched on by the PEPTO_PROFILE environment variable)
+        quality (string): Default 'basic' quarantines files that can't be read and invalid records, 'mad' or 'sigma' outliers of that test too, 'none' keeps every record (a bad file stops the run), see PepToQuality
+    """
+    if profile:
+        PepToProfile.Enable()
+    
     materials = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
 
     # Instantiate the dataset object and submit the materials you'd like to summarize
     dset = DataSet(materials)
 
+    # Find the pappy files below the working directory
+    with Measure('GetDirectories') as stage:
+        files = GetDirectories()
+        stage.items = len(files)
+
     # Fill up the dataset object with the file output
-    dset.FillDataSet(GetDirectories())
+    # Files parsed on an earlier run are taken from the cache next to the data, bad files are quarantined so one of
+    # them can't stop the run, outliers only when their test is asked for
+    quality = MakeQualityCheck(quality)
+    with Measure('FillDataSet', len(files)):
+        dset.FillDataSet(files, workers = DEFAULT_WORKERS, cache = ManifestCache(), quality = quality)
+    print(f"\nRead {dset.ingest_report['files']} pappy files in {dset.ingest_report['seconds']:.3f} s ({dset.ingest_report['files_per_second']:.1f} files/sec)")
+    print(f"Cache: {dset.ingest_report['hits']} hits, {dset.ingest_report['misses']} misses, {dset.ingest_report['evictions']} evictions")
+    if quality is not None and quality.method is not None:
+        print(f"Quality checks on: records failing them and '{quality.method}' outliers are left out of every statistic, fit and plot")
+    if quality is not None:
+        quality.PrintReport()
 
     # Display the output from the dataset using its built-in method
-    dset.DisplayData('S Parameter')
+    with Measure('DisplayData', dset.n_groups):
+        dset.DisplayData('S Parameter')
     
     # Save the sample data to new pepto.csv file - Obviously, set the current date
-    dset.ToCSV('06_15_2023')
+    with Measure('ToCSV', len(dset.record_groups)):
+        dset.ToCSV('06_15_2023')
 
     # Make the plots
     #dset.BoxPlots()
-    dset.SvW(True)
+    with Measure('SvW', len(dset.record_groups)):
+        dset.SvW(True)
+    
+    if PepToProfile.ENABLED:
+        PepToProfile.PrintSummary()
+        print(f"\nProfile saved to '{PepToProfile.WriteSummary()}'")
+    
+    import matplotlib.pyplot as plt
     plt.show()
     
     # Stay open until the console needs to be closed
@@ -334,7 +1523,5 @@ def main():
     """
     return None
 
-if __name__ == '__main__()':
-    main()
-else:
-    pass
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
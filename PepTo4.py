@@ -1,35 +1,271 @@
 from tkinter import *
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import ttk
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import threading
+import queue
 import PepTo3
+from PepToQuality import MakeQualityCheck
 
-# WINDOW INSTANTIATION
-root = Tk()
-root.title("PepTo - Positron Annihilation Analysis")
-root.configure(background = 'lightgray')
-
-# WINDOW SETUP
-# Get window max width and height
-width = root.winfo_screenwidth()
-height = root.winfo_screenheight()
-root.maxsize(width, height)
-root.geometry("%dx%d" % (width, height))
-
-# BUILD PEPTO OBJECT AND RUN ITS COMMANDS
-datast = PepTo3.DataSet(['nickel', 'aluminum', 'copper', 'lead', 'gold', 'tungsten'])
-datast.FillDataSet(PepTo3.GetDirectories())
-fig, ax = datast.SvW()
-canvas = FigureCanvasTkAgg(fig, root)
-
-def PlotBoxes():
-    canvas.draw()
-    canvas.get_tk_widget().pack()
-    return None
+# Materials shown by the app
+MATERIALS = ['nickel', 'aluminum', 'copper', 'lead', 'gold', 'tungsten']
+
+# Plots the app can show, and the DataSet method drawing each into a figure
+PLOTS = {
+    'svw': lambda dset, fig: dset.SvW(True, fig = fig),
+    'box': lambda dset, fig: dset.BoxPlots(fig),
+    'density': lambda dset, fig: dset.SvWDensity(True, fig = fig)
+}
+
+class Cancelled(Exception):
+    """Raised from the progress callback to stop a load part way"""
+
+def LoadAndRender(cancel, report, workers = PepTo3.DEFAULT_WORKERS):
+    """Loads the pappy files below the working directory, fits them and draws every plot, meant to run off the Tk thread
+
+    The files are read in one cached pass. Progress is reported and cancel is checked from the reader every time a
+    batch of files is done, so the parse cache is read and saved once however many files there are. The figures are
+    plain Agg figures, which are handed to Tk canvases on the main thread afterwards.
+
+    Args:
+        cancel (threading.Event): stops the work (between batches of files, or between plots) when set
+        report (callable): called as report(done, total, message) with the progress
+        workers (int): number of parallel readers
+
+    Returns:
+        tuple: the DataSet and a dictionary of plot name -> Figure, or None if cancelled
+    """
+    report(0, 1, 'Scanning for pappy files...')
+    index = PepTo3.PappyIndex(PepTo3.GetDirectories(), PepTo3.TAGGED_PATTERN)
+
+    dset = PepTo3.DataSet(MATERIALS)
+    n_files = len(dset.SelectIndexed(index)[0])
+    total = n_files + len(PLOTS)
+
+    def Progress(done, selected):
+        if cancel.is_set():
+            raise Cancelled()
+        report(done, total, f"Loaded {done} of {selected} pappy files")
+
+    try:
+        # A file that can't be read is quarantined, so one bad file doesn't lose the whole load
+        dset.FillDataSet(index, workers = workers, cache = PepTo3.ManifestCache(), quality = MakeQualityCheck(), progress = Progress)
+    except Cancelled:
+        return None
+
+    figures = {}
+    for done, (plot, draw) in enumerate(PLOTS.items()):
+        if cancel.is_set():
+            return None
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        draw(dset, fig)
+        figures[plot] = fig
+        report(n_files + done + 1, total, f"Drew {plot} plot")
+
+    return dset, figures
+
+class PepToApp(object):
+    def __init__(self, root):
+        """Tk window that loads and fits the data in a worker thread, so the window stays responsive
+
+        Args:
+            root (Tk): the Tk root window
+        """
+        # WINDOW SETUP
+        self.root = root
+        self.root.title("PepTo - Positron Annihilation Analysis")
+        self.root.configure(background = 'lightgray')
+
+        # Get window max width and height
+        width = self.root.winfo_screenwidth()
+        height = self.root.winfo_screenheight()
+        self.root.maxsize(width, height)
+        self.root.geometry("%dx%d" % (width, height))
+
+        # Messages from the worker thread, read on the Tk thread by CheckMessages
+        self.messages = queue.Queue()
+        self.cancel = threading.Event()
+        self.worker = None
+
+        # Loaded data, its figures and the Tk frames showing them, each a canvas with its zoom/pan toolbar
+        # (made the first time each plot is shown)
+        self.dset = None
+        self.figures = {}
+        self.canvases = {}
+        self.shown = None
+
+        # WIDGETS - ADD ALL BUTTONS AND SWITCHES
+        controls = Frame(self.root, background = 'lightgray')
+        controls.pack()
+
+        self.load_button = Button(controls, height = 2, width = 10, text = 'Reload Data', command = self.Load)
+        self.svw_button = Button(controls, height = 2, width = 10, text = 'Run S vs. W', command = lambda: self.ShowPlot('svw'))
+        self.box_button = Button(controls, height = 2, width = 10, text = 'Run Box Plots', command = lambda: self.ShowPlot('box'))
+        self.density_button = Button(controls, height = 2, width = 12, text = 'S vs. W Density', command = lambda: self.ShowPlot('density'))
+        self.cancel_button = Button(controls, height = 2, width = 10, text = 'Cancel', command = self.Cancel)
+        for button in (self.load_button, self.svw_button, self.box_button, self.density_button, self.cancel_button):
+            button.pack(side = LEFT, padx = 4, pady = 4)
+
+        self.progress = ttk.Progressbar(self.root, length = 400, mode = 'determinate')
+        self.progress.pack()
+        self.status = Label(self.root, text = '', background = 'lightgray')
+        self.status.pack()
+
+        self.plot_frame = Frame(self.root)
+        self.plot_frame.pack(fill = BOTH, expand = True)
+
+        self.root.after(100, self.CheckMessages)
+        self.Load()
+
+        return None
+
+    def SetBusy(self, busy):
+        """Enables the buttons that fit the current state
+
+        Args:
+            busy (bool): True while the worker is running
+
+        Returns:
+            None
+        """
+        self.load_button.config(state = DISABLED if busy else NORMAL)
+        self.cancel_button.config(state = NORMAL if busy else DISABLED)
+        for button in (self.svw_button, self.box_button, self.density_button):
+            button.config(state = NORMAL if len(self.figures) > 0 else DISABLED)
+
+        return None
 
-# WIDGETS - ADD ALL BUTTONS AND SWITCHES
-plot_button = Button(root, height = 2, width = 10, text = 'Run Box Plots', command = PlotBoxes)
+    def Load(self):
+        """Starts loading, fitting and drawing in the worker thread
 
-plot_button.pack()
+        Returns:
+            None
+        """
+        if self.worker is not None and self.worker.is_alive():
+            return None
+
+        self.cancel.clear()
+        self.worker = threading.Thread(target = self.Work, daemon = True)
+        self.worker.start()
+        self.SetBusy(True)
+
+        return None
+
+    def Work(self):
+        # Runs on the worker thread, everything goes back to Tk through the message queue
+        try:
+            result = LoadAndRender(self.cancel, lambda done, total, message: self.messages.put(('progress', done, total, message)))
+            self.messages.put(('cancelled',) if result is None else ('done',) + result)
+        except Exception as error:
+            self.messages.put(('error', f"{type(error).__name__}: {error}"))
+
+        return None
+
+    def Cancel(self):
+        self.cancel.set()
+        self.status.config(text = 'Cancelling...')
+        return None
+
+    def CheckMessages(self):
+        """Applies the worker's messages on the Tk thread, then checks again in 100 ms
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == 'progress':
+                _, done, total, text = message
+                self.progress.config(maximum = total, value = done)
+                self.status.config(text = text)
+            elif message[0] == 'done':
+                self.ReplaceData(message[1], message[2])
+                self.status.config(text = f"Loaded {len(self.dset.record_groups)} measurements")
+                self.SetBusy(False)
+            elif message[0] == 'cancelled':
+                self.status.config(text = 'Cancelled, keeping the previous data')
+                self.SetBusy(False)
+            elif message[0] == 'error':
+                self.status.config(text = f"Loading failed - {message[1]}")
+                self.SetBusy(False)
+
+        self.root.after(100, self.CheckMessages)
+
+        return None
+
+    def ReplaceData(self, dset, figures):
+        """Swaps in newly loaded data and figures, dropping the canvases of the old figures
+
+        Args:
+            dset (DataSet): the loaded dataset
+            figures (dictionary): plot name -> Figure
+
+        Returns:
+            None
+        """
+        shown = self.shown
+
+        for frame in self.canvases.values():
+            frame.destroy()
+
+        self.dset = dset
+        self.figures = figures
+        self.canvases = {}
+        self.shown = None
+
+        # Keep showing the same plot, now with the new data
+        if shown is not None:
+            self.ShowPlot(shown)
+
+        return None
+
+    def ShowPlot(self, plot):
+        """Shows one of the precomputed figures, switching plots never recomputes anything
+
+        Args:
+            plot (string): key of PLOTS
+
+        Returns:
+            None
+        """
+        if plot not in self.figures or plot == self.shown:
+            return None
+
+        if self.shown is not None:
+            self.canvases[self.shown].pack_forget()
+
+        # A Tk canvas is made for a figure the first time it is shown, then kept
+        # (zooming the density plot with the toolbar swaps in finer tiles, see DataSet.SvWDensity)
+        if plot not in self.canvases:
+            frame = Frame(self.plot_frame)
+            canvas = FigureCanvasTkAgg(self.figures[plot], frame)
+            toolbar = NavigationToolbar2Tk(canvas, frame, pack_toolbar = False)
+            toolbar.pack(side = BOTTOM, fill = X)
+            canvas.get_tk_widget().pack(fill = BOTH, expand = True)
+            canvas.draw()
+            self.canvases[plot] = frame
+
+        self.canvases[plot].pack(fill = BOTH, expand = True)
+        self.shown = plot
+
+        return None
+
+def main():
+    # WINDOW INSTANTIATION
+    root = Tk()
+    PepToApp(root)
+
+    # RUN APP
+    root.mainloop()
+
+    return None
 
-# RUN APP
-root.mainloop()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
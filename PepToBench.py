@@ -0,0 +1,276 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Benchmarks for the PepTo pipeline
+"""
+from Data.RandomData import GenerateFiles
+from PappyFiles import ScanDirectories, DEFAULT_WORKERS
+import contextlib
+import datetime
+import platform
+import tempfile
+import PepTo3
+import json
+import time
+import sys
+import io
+import os
+
+# Sizes (number of pappy files) RunSuite measures by default
+DEFAULT_SIZES = (1_000, 10_000)
+
+# Stages RunSuite times, in pipeline order
+STAGES = ['discovery', 'ingestion', 'aggregation', 'regression', 'export', 'rendering']
+
+# Default file RunSuite saves to and compares against
+RESULTS_NAME = 'bench_results.json'
+
+# The os.listdir() walk GetDirectories() used before ScanDirectories(), kept here as the benchmark baseline
+def LegacyGetDirectories():
+    # Get current directory path
+    path = os.getcwd()
+
+    # Get the files and folders list within this directory
+    files = [file for file in os.listdir(path) if file.split('_')[-1] == 'pappy.csv']
+    folders = [folder for folder in os.listdir(path) if len(folder.split('.')) == 1]
+
+    for folder in folders:
+        path = os.getcwd() + '/' + folder
+        for file in os.listdir(path):
+            if file.split('_')[-1] == 'pappy.csv':
+                files.append(folder + '/' + file)
+            elif len(file.split('.')) == 1:
+                folders.append(folder + '/' + file)
+            else:
+                pass
+
+    return files
+
+def MakeSyntheticTree(root, n_files, files_per_folder = 1000, folders_per_level = 10):
+    """Builds a tree of empty pappy.csv files to walk
+
+    Args:
+        root (string): folder to build the tree in
+        n_files (int): number of files to make
+        files_per_folder (int): number of files in each leaf folder
+        folders_per_level (int): number of folders in each parent folder
+
+    Returns:
+        int: number of files made
+    """
+    n_folders = -(-n_files // files_per_folder)
+
+    for folder_index in range(n_folders):
+        # Nest the folders two levels deep, e.g. 'run03/day07'
+        folder = os.path.join(root, f"run{folder_index // folders_per_level:02d}", f"day{folder_index % folders_per_level:02d}")
+        os.makedirs(folder, exist_ok = True)
+
+        for file_index in range(folder_index * files_per_folder, min(n_files, (folder_index + 1) * files_per_folder)):
+            open(os.path.join(folder, f"nickel_annealed_{file_index}_trial_01_pappy.csv"), 'w').close()
+
+    return n_files
+
+def TimeCall(function, repeats = 3):
+    """Times the best of a few calls of a function
+
+    Args:
+        function (callable): function to call without arguments
+        repeats (int): number of calls
+
+    Returns:
+        tuple: best time in seconds, and the result of the last call
+    """
+    best = float('inf')
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+def BenchmarkScan(n_files = 100_000, repeats = 3):
+    """Compares LegacyGetDirectories() to ScanDirectories() on a synthetic tree
+
+    Args:
+        n_files (int): number of files in the tree
+        repeats (int): number of timed walks per function, the best is kept
+
+    Returns:
+        dictionary: seconds for each function and the speedup
+    """
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as root:
+        MakeSyntheticTree(root, n_files)
+
+        # The legacy walk only works from the current working directory
+        os.chdir(root)
+        try:
+            legacy_seconds, legacy_files = TimeCall(LegacyGetDirectories, repeats)
+            scan_seconds, scan_files = TimeCall(lambda: list(ScanDirectories(root)), repeats)
+            # The scanner is lazy, so reading can start as soon as the first path comes out
+            first_seconds, _ = TimeCall(lambda: next(ScanDirectories(root)), repeats)
+        finally:
+            os.chdir(cwd)
+
+    if sorted(legacy_files) != sorted(scan_files):
+        raise RuntimeError("LegacyGetDirectories() and ScanDirectories() found different files")
+
+    results = {
+        'files': n_files,
+        'legacy_seconds': legacy_seconds,
+        'scan_seconds': scan_seconds,
+        'scan_first_path_seconds': first_seconds,
+        'speedup': legacy_seconds / scan_seconds
+    }
+
+    print(f"\nDirectory scan of {n_files} files:\n")
+    print(f"{'GetDirectories (os.listdir)':<32}{legacy_seconds:>10.4f} s")
+    print(f"{'ScanDirectories (os.scandir)':<32}{scan_seconds:>10.4f} s")
+    print(f"{'  first path yielded after':<32}{first_seconds:>10.4f} s")
+    print(f"{'Speedup':<32}{results['speedup']:>10.2f} x")
+
+    return results
+
+def TimeStage(function):
+    """Times a single call of a pipeline stage with its console output silenced
+
+    Args:
+        function (callable): function to call without arguments
+
+    Returns:
+        tuple: seconds taken, and the result of the call
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+
+    return seconds, result
+
+def BenchmarkPipeline(n_files, seed = 0, workers = DEFAULT_WORKERS):
+    """Times each stage of the pipeline separately on a generated tree of n_files pappy.csv files
+
+    Args:
+        n_files (int): number of files to generate
+        seed (int): seed of the generator, so every run measures the same data
+        workers (int): number of parallel readers for the ingestion stage
+
+    Returns:
+        dictionary: stage name -> seconds, plus the number of files
+    """
+    cwd = os.getcwd()
+    timings = {'files': n_files}
+
+    with tempfile.TemporaryDirectory() as root:
+        GenerateFiles(root, n_files, seed)
+
+        # The pipeline reads and writes relative to the working directory
+        os.chdir(root)
+        try:
+            timings['discovery'], files = TimeStage(lambda: PepTo3.GetDirectories(root))
+
+            dset = PepTo3.DataSet(['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead'])
+            timings['ingestion'], _ = TimeStage(lambda: dset.FillDataSet(files, workers = workers))
+
+            timings['aggregation'], _ = TimeStage(lambda: (dset.RebuildStatistics(), dset.DisplayData('S Parameter')))
+            timings['regression'], _ = TimeStage(lambda: (dset.FitSvW('ols'), dset.FitSvW('york')))
+            timings['export'], _ = TimeStage(lambda: (dset.ToCSV('bench'), dset.ToBinary('bench')))
+
+            # Rendering is imported here so the other stages never pay for matplotlib's figure setup
+            import PepToRender
+            timings['rendering'], _ = TimeStage(lambda: PepToRender.RenderDataSet(dset, os.path.join(root, 'bench'), formats = ('png',)))
+        finally:
+            os.chdir(cwd)
+
+    return timings
+
+def RunSuite(sizes = DEFAULT_SIZES, seed = 0, workers = DEFAULT_WORKERS, results_path = RESULTS_NAME):
+    """Benchmarks every stage at every size, prints a table and appends the run to a results file
+
+    Args:
+        sizes (list): numbers of pappy.csv files to measure
+        seed (int): seed of the generator
+        workers (int): number of parallel readers for the ingestion stage
+        results_path (string): JSON file holding the list of earlier runs, None to not save
+
+    Returns:
+        dictionary: the run, with its date, machine and the timings at each size
+    """
+    run = {
+        'date': datetime.datetime.now().isoformat(timespec = 'seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'seed': seed,
+        'workers': workers,
+        'timings': [BenchmarkPipeline(n_files, seed, workers) for n_files in sizes]
+    }
+
+    print(f"\n{'Files':>10}" + ''.join(f"{stage.title():>13}" for stage in STAGES))
+    for timings in run['timings']:
+        print(f"{timings['files']:>10}" + ''.join(f"{timings[stage]:>12.4f}s" for stage in STAGES))
+
+    if results_path is not None:
+        runs = LoadResults(results_path)
+
+        # Check against the last run before adding this one
+        if len(runs) > 0:
+            regressions = CompareRuns(runs[-1], run)
+            for (n_files, stage, before, after) in regressions:
+                print(f"REGRESSION: {stage} at {n_files} files went from {before:.4f}s to {after:.4f}s")
+            if len(regressions) == 0:
+                print(f"\nNo regressions against the run of {runs[-1]['date']}")
+
+        with open(results_path, 'w') as file:
+            json.dump(runs + [run], file, indent = 4)
+
+    return run
+
+def LoadResults(results_path = RESULTS_NAME):
+    """Loads the earlier runs saved by RunSuite
+
+    Args:
+        results_path (string): JSON results file
+
+    Returns:
+        list: the runs, oldest first, empty if there is no file yet
+    """
+    if not os.path.exists(results_path):
+        return []
+
+    with open(results_path, 'r') as file:
+        return json.load(file)
+
+def CompareRuns(before, after, tolerance = 1.25, floor = 0.005):
+    """Finds the stages that got slower between two runs
+
+    Args:
+        before (dictionary): earlier run from RunSuite
+        after (dictionary): later run from RunSuite
+        tolerance (float): ratio of the times above which a stage counts as slower
+        floor (float): stages faster than this many seconds in both runs are ignored as noise
+
+    Returns:
+        list: (files, stage, seconds before, seconds after) of every regression
+    """
+    earlier = {timings['files']: timings for timings in before['timings']}
+    regressions = []
+
+    for timings in after['timings']:
+        if timings['files'] not in earlier:
+            continue
+
+        for stage in STAGES:
+            old, new = earlier[timings['files']][stage], timings[stage]
+            if max(old, new) > floor and new > tolerance * old:
+                regressions.append((timings['files'], stage, old, new))
+
+    return regressions
+
+if __name__ == '__main__':
+    # python PepToBench.py [scan | suite [size ...]]
+    if len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        RunSuite([int(size) for size in sys.argv[2:]] or DEFAULT_SIZES)
+    else:
+        BenchmarkScan()
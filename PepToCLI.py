@@ -0,0 +1,327 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Command line entry point for PepTo
+
+Usage:
+    python PepToCLI.py scan [--root ROOT] [--list]
+    python PepToCLI.py ingest [--root ROOT] [--workers N] [--no-cache] [--batch-size N [--spill FOLDER]]
+    python PepToCLI.py stats [--parameter NAME] [--statistic NAME] [--fit {ols,york}]
+    python PepToCLI.py export DATE [--format {csv,binary}]
+    python PepToCLI.py plot {svw,box} [--output FILE] [--no-trendline]
+    python PepToCLI.py pack OUTPUT [--root ROOT]
+    python PepToCLI.py ingest --roots ROOT [ROOT ...] [--processes N]
+    python PepToCLI.py serve [--root ROOT] [--host HOST] [--port PORT]
+    python PepToCLI.py groups [--keys KEY [KEY ...]] [--by KEY [KEY ...]] [--parameter NAME] [--statistic NAME]
+
+Every subcommand after scan groups by material and anneal type, plus any --keys tagged in the file names (e.g.
+'nickel_annealed_temperature-300K_13_trial_01_pappy.csv'). It reads the pappy files below ROOT (through the parse cache), a DataSet.ToBinary folder
+given with --binary, or a pack (from the pack subcommand) or bulk csv given with --bulk. Only plot imports matplotlib, so the other subcommands start in about the time numpy takes.
+"""
+import argparse
+import time
+import sys
+import os
+
+# Materials analyzed when none are given
+MATERIALS = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
+
+def LoadDataSet(args):
+    """Builds the DataSet the subcommand works on, from the pappy files or from a binary export
+
+    Args:
+        args (Namespace): parsed command line arguments
+
+    Returns:
+        DataSet: the filled dataset
+    """
+    import PepTo3
+
+    if args.binary is not None:
+        return PepTo3.FromBinary(args.binary)
+
+    from PepToQuality import MakeQualityCheck
+
+    quality = MakeQualityCheck(args.quality)
+
+    if args.bulk is not None:
+        dset = PepTo3.DataSet(args.materials, keys = args.keys)
+        with PepTo3.Measure('FillFromBulk') as stage:
+            dset.FillFromBulk(args.bulk, quality = quality)
+            stage.items = dset.ingest_report['records']
+
+    # Several roots are read as shards in parallel processes and merged
+    elif args.roots is not None:
+        from PepToShards import MapReduceRoots
+
+        with PepTo3.Measure('MapReduceRoots') as stage:
+            dset = MapReduceRoots(args.roots, args.materials, quality = quality, use_cache = not args.no_cache, processes = args.processes, workers = args.workers, keys = args.keys)
+            stage.items = dset.ingest_report['files']
+
+    # Archives larger than memory are streamed in batches, keeping only the statistics (and any spilled samples)
+    elif args.batch_size is not None:
+        dset = PepTo3.DataSet(args.materials, keep_samples = False, spill = args.spill, keys = args.keys)
+        with PepTo3.Measure('StreamDataSet') as stage:
+            dset.StreamDataSet(args.root, args.batch_size, workers = args.workers, quality = quality)
+            stage.items = dset.ingest_report['files']
+
+    else:
+        from PappyCache import ManifestCache, CACHE_NAME
+
+        dset = PepTo3.DataSet(args.materials, keys = args.keys)
+        cache = None if args.no_cache else ManifestCache(os.path.join(args.root, CACHE_NAME))
+
+        with PepTo3.Measure('GetDirectories') as stage:
+            files = PepTo3.GetDirectories(args.root)
+            stage.items = len(files)
+
+        with PepTo3.Measure('FillDataSet', len(files)):
+            dset.FillDataSet(files, workers = args.workers, cache = cache, root = args.root, quality = quality)
+
+    # Anything quarantined is always shown, ingest shows the checks either way
+    if quality is not None:
+        if args.quality_report is not None:
+            quality.WriteReport(args.quality_report)
+        if len(quality.quarantined) > 0 or args.command == 'ingest':
+            quality.PrintReport()
+
+    return dset
+
+def PrintIngestReport(dset):
+    report = dset.ingest_report
+    if report is None:
+        return None
+
+    if 'records' in report:
+        print(f"Read {report['records']} records from one bulk file in {report['seconds']:.3f} s")
+    else:
+        print(f"Read {report['files']} pappy files in {report['seconds']:.3f} s ({report['files_per_second']:.1f} files/sec)")
+    if 'shards' in report:
+        print(f"Merged {report['shards']} shards")
+    if 'batches' in report:
+        print(f"Streamed in {report['batches']} batches")
+    if 'hits' in report:
+        print(f"Cache: {report['hits']} hits, {report['misses']} misses, {report['evictions']} evictions")
+    print(f"Skipped {report['skipped']} files of other materials or anneal types, rejected {report['rejected']} badly named files")
+
+    return None
+
+def Scan(args):
+    from PappyFiles import ScanDirectories
+
+    start = time.perf_counter()
+    files = list(ScanDirectories(args.root, include = args.include))
+    seconds = time.perf_counter() - start
+
+    if args.list:
+        for file in files:
+            print(file)
+    print(f"Found {len(files)} pappy files below '{args.root}' in {seconds:.3f} s")
+
+    return None
+
+def Ingest(args):
+    dset = LoadDataSet(args)
+    PrintIngestReport(dset)
+    dset.DisplayData('N Samples')
+
+    return None
+
+def Stats(args):
+    dset = LoadDataSet(args)
+    dset.DisplayData(args.parameter, args.statistic)
+
+    # Groups split by the other keys are rolled up in the table above, so they get one row each here
+    if len(dset.keys) > 2:
+        dset.DisplayGroups(args.parameter, args.statistic)
+
+    if args.fit is not None:
+        fit = dset.FitSvW(args.fit)
+        print(f"\nS vs. W fit ({fit['method']})")
+        for g in dset.DisplayOrder():
+            if fit['n'][g] > 1:
+                key = dset.Key(g)
+                tags = ''.join(f"{key[name] or '-':<12}" for name in dset.keys[2:])
+                note = '' if fit['converged'][g] else '    (not converged)'
+                print(f"{key['material'].title():<12}{key['anneal']:<12}{tags}S = {fit['slope'][g]:.6f} W + {fit['intercept'][g]:.6f}    R^2 = {fit['r_squared'][g]:.4f}    n = {int(fit['n'][g])}{note}")
+
+    return None
+
+def Export(args):
+    import PepTo3
+
+    dset = LoadDataSet(args)
+
+    with PepTo3.Measure('ToCSV' if args.format == 'csv' else 'ToBinary', int(dset.stats.count.sum())):
+        if args.format == 'csv':
+            dset.ToCSV(args.date)
+        else:
+            dset.ToBinary(args.date)
+
+    return None
+
+def Plot(args):
+    import PepTo3
+
+    dset = LoadDataSet(args)
+
+    if args.output is None:
+        import matplotlib.pyplot as plt
+        fig = None
+    else:
+        # Saving only needs a plain Agg figure, no window
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure()
+        FigureCanvasAgg(fig)
+
+    with PepTo3.Measure(args.kind, int(dset.stats.count.sum())):
+        if args.kind == 'svw':
+            fig, _ = dset.SvW(not args.no_trendline, method = args.method, fig = fig)
+        else:
+            fig, _ = dset.BoxPlots(fig)
+
+    if args.output is None:
+        plt.show()
+    else:
+        fig.savefig(args.output, dpi = args.dpi)
+        print(f"Saved the {args.kind} plot to '{args.output}'")
+
+    return None
+
+def Pack(args):
+    from PappyFiles import PackPappyFiles, ScanDirectories
+
+    report = PackPappyFiles(ScanDirectories(args.root), args.output, args.root, args.workers)
+    print(f"Packed {report['rows']} pappy files into '{report['path']}' in {report['seconds']:.3f} s ({report['rejected']} badly named files left out)")
+
+    return None
+
+def Serve(args):
+    from PepToServer import Serve
+
+    Serve(args.root, args.materials, args.host, args.port, args.quality, args.cache_size, args.check_interval, args.workers, args.keys)
+
+    return None
+
+def Groups(args):
+    dset = LoadDataSet(args)
+
+    print(f"{int(dset.stats.count.sum())} records in {dset.n_groups} groups of {', '.join(dset.keys)}")
+    dset.DisplayGroups(args.parameter, args.statistic, args.by)
+
+    return None
+
+# Subcommand name -> function running it
+COMMANDS = {
+    'scan': Scan,
+    'ingest': Ingest,
+    'stats': Stats,
+    'export': Export,
+    'plot': Plot,
+    'pack': Pack,
+    'serve': Serve,
+    'groups': Groups
+}
+
+def BuildParser():
+    """Makes the argument parser with one sub-parser per subcommand
+
+    Returns:
+        ArgumentParser: the parser
+    """
+    # Only numbers and names are needed here, so the defaults don't import anything heavy
+    cpu_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument('--root', default = os.getcwd(), help = 'folder to search for pappy files (default: working directory)')
+    common.add_argument('--profile', action = 'store_true', help = 'print the time and memory of every stage and save them as JSON')
+    common.add_argument('--profile-json', default = None, help = "with --profile, JSON file to save the stages to (default: 'pepto_profile/pepto_profile.json')")
+
+    data = argparse.ArgumentParser(add_help = False)
+    data.add_argument('--materials', nargs = '+', default = MATERIALS)
+    data.add_argument('--keys', nargs = '+', default = [], help = 'also group by these keys tagged in the file names, e.g. temperature dose detector')
+    data.add_argument('--workers', type = int, default = cpu_workers, help = 'parallel file readers')
+    data.add_argument('--no-cache', action = 'store_true', help = 'parse every file instead of using the parse cache')
+    data.add_argument('--binary', default = None, help = 'load a DataSet.ToBinary folder instead of the pappy files')
+    data.add_argument('--bulk', default = None, help = 'load a pack or a csv with one row per measurement instead of the pappy files')
+    data.add_argument('--quality', default = 'basic', choices = ['basic', 'mad', 'sigma', 'none'], help = 'records left out of every result: basic quarantines unreadable files and invalid records, mad or sigma outliers of that test too, none stops on a bad file (default: basic)')
+    data.add_argument('--quality-report', default = None, help = 'JSON file to write the quarantined records to')
+    data.add_argument('--roots', nargs = '+', default = None, help = 'read several folders as shards in parallel processes instead of --root')
+    data.add_argument('--processes', type = int, default = None, help = 'with --roots, number of shard processes (default: one per root up to the CPU count)')
+    data.add_argument('--batch-size', type = int, default = None, help = 'stream the files in batches of this size, keeping only the statistics in memory')
+    data.add_argument('--spill', default = None, help = 'with --batch-size, folder to keep the samples in on disk (needed for plots)')
+
+    parser = argparse.ArgumentParser(description = 'Pictoral Extrapolator for Pappy Tabulated Observations - PepTo')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    scan = commands.add_parser('scan', parents = [common], help = 'find the pappy files')
+    scan.add_argument('--include', nargs = '+', default = ['*_pappy.csv'], help = 'glob patterns of the files to find')
+    scan.add_argument('--list', action = 'store_true', help = 'print every file found')
+
+    commands.add_parser('ingest', parents = [common, data], help = 'read the pappy files, refreshing the parse cache')
+
+    stats = commands.add_parser('stats', parents = [common, data], help = 'print a statistic of every group')
+    stats.add_argument('--parameter', default = 'S Parameter')
+    stats.add_argument('--statistic', default = 'mean', choices = ['mean', 'weighted mean', 'weighted mean uncertainty', 'std', 'min', 'max'])
+    stats.add_argument('--fit', default = None, choices = ['ols', 'york'], help = 'also print the S vs. W fit of every group')
+
+    export = commands.add_parser('export', parents = [common, data], help = 'save every sample as csv or as binary columns')
+    export.add_argument('date', help = "date in the output name, e.g. '06_15_2023'")
+    export.add_argument('--format', default = 'csv', choices = ['csv', 'binary'])
+
+    plot = commands.add_parser('plot', parents = [common, data], help = 'draw the S vs. W plot or the box plots')
+    plot.add_argument('kind', choices = ['svw', 'box'])
+    plot.add_argument('--output', default = None, help = 'image file to save to instead of showing a window')
+    plot.add_argument('--dpi', type = int, default = 150)
+    plot.add_argument('--method', default = 'ols', choices = ['ols', 'york'])
+    plot.add_argument('--no-trendline', action = 'store_true')
+
+    pack = commands.add_parser('pack', parents = [common], help = 'merge the pappy files into one indexed pack file')
+    pack.add_argument('output', help = "pack file to write, e.g. 'archive.npz'")
+    pack.add_argument('--workers', type = int, default = cpu_workers, help = 'parallel file readers')
+
+    serve = commands.add_parser('serve', parents = [common], help = 'keep the data loaded and answer queries over HTTP on this machine')
+    serve.add_argument('--materials', nargs = '+', default = MATERIALS)
+    serve.add_argument('--keys', nargs = '+', default = [], help = 'also group by these keys tagged in the file names')
+    serve.add_argument('--workers', type = int, default = cpu_workers, help = 'parallel file readers')
+    serve.add_argument('--quality', default = 'basic', choices = ['basic', 'mad', 'sigma', 'none'], help = 'records left out of every response, see --quality of the data commands (default: basic)')
+    serve.add_argument('--host', default = '127.0.0.1', help = 'address to listen on (default: this machine only)')
+    serve.add_argument('--port', type = int, default = 8050)
+    serve.add_argument('--cache-size', type = int, default = 128, help = 'most responses kept in memory')
+    serve.add_argument('--check-interval', type = float, default = 2.0, help = 'seconds between checks of the pappy files for changes')
+
+    groups = commands.add_parser('groups', parents = [common, data], help = 'print a statistic of every non-empty combination of the material, anneal type and --keys')
+    groups.add_argument('--by', nargs = '+', default = None, help = 'roll the groups up to these keys, e.g. material temperature (default: every key)')
+    groups.add_argument('--parameter', default = 'S Parameter')
+    groups.add_argument('--statistic', default = 'mean', choices = ['mean', 'weighted mean', 'weighted mean uncertainty', 'std', 'min', 'max'])
+
+    return parser
+
+def main(argv = None):
+    """Runs one subcommand
+
+    Args:
+        argv (list): command line arguments, default None uses sys.argv
+
+    Returns:
+        None
+    """
+    args = BuildParser().parse_args(argv)
+
+    if args.profile:
+        import PepToProfile
+        PepToProfile.Enable()
+
+    COMMANDS[args.command](args)
+
+    if args.profile:
+        PepToProfile.PrintSummary()
+        path = PepToProfile.WriteSummary(args.profile_json)
+        if path is not None:
+            print(f"\nProfile saved to '{path}'")
+
+    return None
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
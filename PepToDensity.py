@@ -0,0 +1,219 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Multi-resolution S vs. W density tiles for PepTo, so plots of any number of points draw in constant time
+"""
+import numpy as np
+
+# Bins along each axis of the finest level, a power of two so every coarser level halves it exactly
+BASE_BINS = 512
+
+# Bins along each axis of the coarsest level
+MIN_BINS = 8
+
+# Bins across the visible range a panel aims for, whatever the zoom
+TARGET_BINS = 128
+
+# Padding added around the data on every side, as a fraction of its range (as the SvW trendline used)
+PADDING = 0.01
+
+def Extent(W, S):
+    """Padded (W low, W high, S low, S high) box holding every finite point
+
+    Args:
+        W (array): W parameters
+        S (array): S parameters
+
+    Returns:
+        tuple: the box, a unit box around 0 for no points
+    """
+    finite = np.isfinite(W) & np.isfinite(S)
+    if not finite.any():
+        return (0.0, 1.0, 0.0, 1.0)
+
+    box = []
+    for values in (W[finite], S[finite]):
+        low, high = float(values.min()), float(values.max())
+        # A single value still gets a box around it
+        pad = PADDING * (high - low) if high > low else max(PADDING * abs(low), 1e-6)
+        box.extend((low - pad, high + pad))
+
+    return tuple(box)
+
+class DensityPyramid(object):
+    def __init__(self, W, S, extent = None, base_bins = BASE_BINS, min_bins = MIN_BINS):
+        """2D histograms of S vs. W for one group, at every resolution from base_bins down to min_bins
+
+        The finest level is one vectorized np.bincount over the points, every coarser level sums 2 x 2 blocks of
+        the one below it. A view of any size then draws one level cropped to the view, picked so that about the
+        same number of bins are visible at every zoom, so drawing costs the same however many points there are.
+
+        Args:
+            W (array): W parameters of the group
+            S (array): S parameters of the group
+            extent (tuple): (W low, W high, S low, S high) binned, default None pads the range of the points
+            base_bins (int): bins along each axis of the finest level, a power of two
+            min_bins (int): bins along each axis of the coarsest level
+
+        Raises:
+            ValueError: If base_bins is not a power of two at least min_bins
+        """
+        if base_bins < min_bins or base_bins & (base_bins - 1) != 0:
+            message = f"\nbase_bins ({base_bins}) must be a power of two no smaller than min_bins ({min_bins})"
+            raise ValueError(message)
+
+        W = np.asarray(W, dtype = np.float64)
+        S = np.asarray(S, dtype = np.float64)
+
+        self.extent = Extent(W, S) if extent is None else tuple(float(edge) for edge in extent)
+        self.n_points = len(W)
+
+        # Bin of every point at the finest level, points outside the extent (or not finite) are left out
+        w_low, w_high, s_low, s_high = self.extent
+        with np.errstate(invalid = 'ignore'):
+            ix = np.floor((W - w_low) / (w_high - w_low) * base_bins)
+            iy = np.floor((S - s_low) / (s_high - s_low) * base_bins)
+            inside = (ix >= 0) & (ix < base_bins) & (iy >= 0) & (iy < base_bins)
+        flat = iy[inside].astype(np.intp) * base_bins + ix[inside].astype(np.intp)
+
+        # levels[0] is the finest, counts are indexed [S bin, W bin] so they draw with imshow(origin = 'lower')
+        counts = np.bincount(flat, minlength = base_bins * base_bins).reshape(base_bins, base_bins)
+        self.levels = [counts]
+        while counts.shape[0] > min_bins:
+            half = counts.shape[0] // 2
+            counts = counts.reshape(half, 2, half, 2).sum(axis = (1, 3))
+            self.levels.append(counts)
+
+        return None
+
+    def Bins(self, level):
+        return self.levels[level].shape[0]
+
+    def PickLevel(self, view, target_bins = TARGET_BINS):
+        """Coarsest level that still shows at least target_bins across the view on both axes
+
+        Args:
+            view (tuple): visible (W low, W high, S low, S high)
+            target_bins (int): bins wanted across the view
+
+        Returns:
+            int: level index, 0 (the finest) when zoomed in past it
+        """
+        for level in range(len(self.levels) - 1, -1, -1):
+            if self.Bins(level) * self.Fraction(view) >= target_bins * (1 - 1e-9):
+                return level
+
+        return 0
+
+    def Fraction(self, view):
+        """Share of the pyramid's range the view spans, on the axis zoomed in the most
+        """
+        w_low, w_high, s_low, s_high = self.extent
+        return min(abs(view[1] - view[0]) / (w_high - w_low), abs(view[3] - view[2]) / (s_high - s_low))
+
+    def ZoomedPast(self, view, target_bins = TARGET_BINS):
+        """True when even the finest level shows fewer than target_bins across the view
+        """
+        return self.Bins(0) * self.Fraction(view) < target_bins * (1 - 1e-9)
+
+    def Tile(self, view, target_bins = TARGET_BINS):
+        """Counts of the level picked for the view, cropped to the bins the view overlaps
+
+        Args:
+            view (tuple): visible (W low, W high, S low, S high)
+            target_bins (int): bins wanted across the view
+
+        Returns:
+            tuple: (counts [S bin, W bin], their (W low, W high, S low, S high) extent, level index)
+        """
+        level = self.PickLevel(view, target_bins)
+        bins = self.Bins(level)
+        w_low, w_high, s_low, s_high = self.extent
+        w_step = (w_high - w_low) / bins
+        s_step = (s_high - s_low) / bins
+
+        # Whole bins overlapping the view, clipped to the pyramid
+        w_first = int(np.clip(np.floor((min(view[0], view[1]) - w_low) / w_step), 0, bins - 1))
+        w_last = int(np.clip(np.ceil((max(view[0], view[1]) - w_low) / w_step), w_first + 1, bins))
+        s_first = int(np.clip(np.floor((min(view[2], view[3]) - s_low) / s_step), 0, bins - 1))
+        s_last = int(np.clip(np.ceil((max(view[2], view[3]) - s_low) / s_step), s_first + 1, bins))
+
+        tile = self.levels[level][s_first:s_last, w_first:w_last]
+        extent = (w_low + w_first * w_step, w_low + w_last * w_step, s_low + s_first * s_step, s_low + s_last * s_step)
+
+        return tile, extent, level
+
+class DensityPanel(object):
+    def __init__(self, axis, pyramid, points = None, target_bins = TARGET_BINS, max_points = 2000, cmap = 'viridis'):
+        """Draws a DensityPyramid on an axis and redraws it with the right level whenever the axis is zoomed or panned
+
+        Args:
+            axis (Axes): the axis to draw on
+            pyramid (DensityPyramid): the group's density tiles
+            points (callable): Default 'None' never draws points, otherwise returns the group's (W, S, W error, S error) for the raw points
+            target_bins (int): bins wanted across the view
+            max_points (int): raw points are drawn instead of the density once zoomed past the finest level with at most this many points in view
+            cmap (string): colormap of the density
+        """
+        from matplotlib.colors import LogNorm
+
+        self.axis = axis
+        self.pyramid = pyramid
+        self.points = points
+        self.target_bins = target_bins
+        self.max_points = max_points
+        self.artists = []
+
+        w_low, w_high, s_low, s_high = pyramid.extent
+        axis.set_xlim(w_low, w_high)
+        axis.set_ylim(s_low, s_high)
+        axis.set_autoscale_on(False)
+
+        # One image for the whole life of the panel, only its data and extent change
+        self.image = axis.imshow(
+            np.ma.masked_equal(pyramid.levels[-1], 0), extent = pyramid.extent, origin = 'lower',
+            aspect = 'auto', interpolation = 'nearest', cmap = cmap, norm = LogNorm(vmin = 1)
+        )
+        self.Draw()
+
+        # The lambdas hold the panel, matplotlib only keeps weak references to bound methods
+        axis.callbacks.connect('xlim_changed', lambda _: self.Draw())
+        axis.callbacks.connect('ylim_changed', lambda _: self.Draw())
+
+        return None
+
+    def View(self):
+        (w_low, w_high), (s_low, s_high) = self.axis.get_xlim(), self.axis.get_ylim()
+        return (w_low, w_high, s_low, s_high)
+
+    def Draw(self):
+        """Shows the level fitting the current view, or the raw points when zoomed in far enough
+
+        Returns:
+            None
+        """
+        view = self.View()
+        tile, extent, level = self.pyramid.Tile(view, self.target_bins)
+
+        for artist in self.artists:
+            artist.remove()
+        self.artists = []
+
+        # Past the finest level with few points left in view, the points themselves are drawn
+        raw = self.points is not None and self.pyramid.ZoomedPast(view, self.target_bins) and tile.sum() <= self.max_points
+        if raw:
+            W, S, W_error, S_error = self.points()
+            w_low, w_high, s_low, s_high = min(view[:2]), max(view[:2]), min(view[2:]), max(view[2:])
+            shown = (W >= w_low) & (W <= w_high) & (S >= s_low) & (S <= s_high)
+            bars = self.axis.errorbar(W[shown], S[shown], yerr = S_error[shown], xerr = W_error[shown], ls = 'None', color = 'cadetblue')
+            dots = self.axis.scatter(W[shown], S[shown], color = 'salmon', s = 4)
+            self.artists = [bars, dots]
+
+        self.image.set_visible(not raw)
+        if not raw:
+            self.image.set_data(np.ma.masked_equal(tile, 0))
+            self.image.set_extent(extent)
+            # Every level has its own range of counts, so the colors are scaled to the tile shown
+            self.image.set_clim(1, max(2, int(tile.max())))
+
+        return None
@@ -0,0 +1,403 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+S vs. W line fits for PepTo
+"""
+import numpy as np
+import warnings
+
+# Fit methods FitGroups understands
+FIT_METHODS = ['ols', 'york']
+
+# Most iterations of the York fit, slow groups can take a few hundred to converge
+MAX_YORK_ITERATIONS = 10000
+
+# Moments making up the state of a FitAccumulator, see State() and LoadState()
+FIT_STATE = ['n', 'mean_x', 'mean_y', 'sxx', 'syy', 'sxy']
+
+def ComputeW(left, right, left_error, right_error):
+    """Combines the left and right wing parameters into W, propogating the wing uncertainties
+
+    Args:
+        left (array): left W parameters
+        right (array): right W parameters
+        left_error (array): left W uncertainties
+        right_error (array): right W uncertainties
+
+    Returns:
+        tuple: W and W uncertainty arrays
+    """
+    return np.hypot(left, right), np.hypot(left_error, right_error)
+
+def GroupSums(weights, groups, n_groups):
+    """Sums weights per group, the grouped reduction every fit is built from
+
+    Args:
+        weights (array): one value per record
+        groups (array): group index of every record
+        n_groups (int): number of groups
+
+    Returns:
+        array: n_groups sums
+    """
+    return np.bincount(groups, weights = weights, minlength = n_groups)
+
+def SafeDivide(numerator, denominator):
+    """Elementwise division giving NaN where the denominator is not positive (empty or degenerate groups)
+    """
+    return np.divide(numerator, denominator, out = np.full(np.shape(numerator), np.nan), where = denominator > 0)
+
+def LineFromMoments(n, mean_x, mean_y, sxx, syy, sxy):
+    """Least squares line, r^2 and parameter covariance of every group from its moments
+
+    Args:
+        n (array): number of points in each group
+        mean_x (array): mean x of each group
+        mean_y (array): mean y of each group
+        sxx (array): sum of squared x deviations from the mean
+        syy (array): sum of squared y deviations from the mean
+        sxy (array): sum of products of the x and y deviations
+
+    Returns:
+        dictionary: n, slope, intercept, r_squared and covariance ((n_groups, 2, 2), ordered slope, intercept) arrays
+    """
+    n = np.asarray(n, dtype = np.float64)
+
+    slope = SafeDivide(sxy, sxx)
+    intercept = mean_y - slope * mean_x
+    r_squared = SafeDivide(sxy * sxy, sxx * syy)
+
+    # Residual variance with two fitted parameters, then the parameter covariance
+    residual_variance = SafeDivide(syy - slope * sxy, n - 2)
+    slope_variance = SafeDivide(residual_variance, sxx)
+
+    covariance = np.empty((len(n), 2, 2))
+    covariance[:, 0, 0] = slope_variance
+    covariance[:, 0, 1] = covariance[:, 1, 0] = -mean_x * slope_variance
+    covariance[:, 1, 1] = residual_variance * SafeDivide(np.ones(len(n)), n) + mean_x * mean_x * slope_variance
+
+    return {'n': n.astype(np.int64), 'slope': slope, 'intercept': intercept, 'r_squared': r_squared, 'covariance': covariance}
+
+def FitOLS(x, y, groups, n_groups):
+    """Ordinary least squares line y = slope * x + intercept for every group at once
+
+    The sums are taken about the group means, so they match np.polyfit(x, y, 1, cov = True) on each group.
+
+    Args:
+        x (array): x values of every record
+        y (array): y values of every record
+        groups (array): group index of every record
+        n_groups (int): number of groups
+
+    Returns:
+        dictionary: n, slope, intercept, r_squared and covariance ((n_groups, 2, 2), ordered slope, intercept) arrays
+    """
+    n = np.bincount(groups, minlength = n_groups).astype(np.float64)
+    mean_x = SafeDivide(GroupSums(x, groups, n_groups), n)
+    mean_y = SafeDivide(GroupSums(y, groups, n_groups), n)
+
+    # Deviations from the group means
+    dx = x - mean_x[groups]
+    dy = y - mean_y[groups]
+    sxx = GroupSums(dx * dx, groups, n_groups)
+    syy = GroupSums(dy * dy, groups, n_groups)
+    sxy = GroupSums(dx * dy, groups, n_groups)
+
+    return LineFromMoments(n, mean_x, mean_y, sxx, syy, sxy)
+
+def FitYork(x, y, x_error, y_error, groups, n_groups, tolerance = 1e-12, max_iterations = MAX_YORK_ITERATIONS):
+    """Error weighted straight line fit (York et al. 2004) for every group at once
+
+    Both x and y carry uncertainties, so the fit minimizes the weighted distance to the line in both directions. With
+    equal x and y uncertainties this is the orthogonal (total least squares) fit. The iteration runs for all groups
+    together until every slope has converged. Groups still moving when max_iterations runs out are flagged in
+    'converged' and a RuntimeWarning names them.
+
+    Args:
+        x (array): x values of every record
+        y (array): y values of every record
+        x_error (array): x uncertainties
+        y_error (array): y uncertainties
+        groups (array): group index of every record
+        n_groups (int): number of groups
+        tolerance (float): relative change in the slopes to stop at
+        max_iterations (int): limit on the number of iterations
+
+    Returns:
+        dictionary: n, slope, intercept, r_squared, covariance ((n_groups, 2, 2), ordered slope, intercept) and converged arrays
+    """
+    weight_x = 1.0 / (x_error * x_error)
+    weight_y = 1.0 / (y_error * y_error)
+
+    # Start from the ordinary fit, which also gives r^2 (the correlation doesn't depend on the weighting)
+    fit = FitOLS(x, y, groups, n_groups)
+    slope = fit['slope'].copy()
+
+    for _ in range(max_iterations):
+        b = slope[groups]
+        weights = weight_x * weight_y / (weight_x + b * b * weight_y)
+        total = GroupSums(weights, groups, n_groups)
+        mean_x = SafeDivide(GroupSums(weights * x, groups, n_groups), total)
+        mean_y = SafeDivide(GroupSums(weights * y, groups, n_groups), total)
+
+        u = x - mean_x[groups]
+        v = y - mean_y[groups]
+        beta = weights * (u / weight_y + b * v / weight_x)
+
+        numerator = GroupSums(weights * beta * v, groups, n_groups)
+        denominator = GroupSums(weights * beta * u, groups, n_groups)
+        new_slope = np.divide(numerator, denominator, out = np.full(n_groups, np.nan), where = denominator != 0)
+        # Empty and degenerate groups (NaN slopes) count as converged
+        converged = ~(np.abs(new_slope - slope) > tolerance * np.abs(new_slope))
+        slope = new_slope
+
+        if converged.all():
+            break
+
+    if not converged.all():
+        message = f"\nThe 'york' fit of groups {np.flatnonzero(~converged).tolist()} did not converge in {max_iterations} iterations"
+        warnings.warn(message, RuntimeWarning)
+
+    intercept = mean_y - slope * mean_x
+
+    # Uncertainties from the least squares adjusted x values
+    adjusted_x = mean_x[groups] + beta
+    mean_adjusted = SafeDivide(GroupSums(weights * adjusted_x, groups, n_groups), total)
+    spread = adjusted_x - mean_adjusted[groups]
+    slope_variance = SafeDivide(np.ones(n_groups), GroupSums(weights * spread * spread, groups, n_groups))
+
+    covariance = np.empty((n_groups, 2, 2))
+    covariance[:, 0, 0] = slope_variance
+    covariance[:, 0, 1] = covariance[:, 1, 0] = -mean_adjusted * slope_variance
+    covariance[:, 1, 1] = SafeDivide(np.ones(n_groups), total) + mean_adjusted * mean_adjusted * slope_variance
+
+    return {'n': fit['n'], 'slope': slope, 'intercept': intercept, 'r_squared': fit['r_squared'], 'covariance': covariance, 'converged': converged}
+
+class FitAccumulator(object):
+    def __init__(self, n_groups):
+        """Running moments of the ordinary least squares fit of every group, updated as points arrive
+
+        Only the count, means and co-moments of each group are kept, so a fit can be refreshed after every batch
+        without going back over the earlier points. Accumulators over different points merge exactly.
+
+        Args:
+            n_groups (int): number of groups
+        """
+        self.n_groups = n_groups
+        self.n = np.zeros(n_groups, dtype = np.int64)
+        self.mean_x = np.zeros(n_groups)
+        self.mean_y = np.zeros(n_groups)
+        self.sxx = np.zeros(n_groups)
+        self.syy = np.zeros(n_groups)
+        self.sxy = np.zeros(n_groups)
+
+        return None
+
+    def Add(self, x, y, groups):
+        """Adds a batch of points
+
+        Args:
+            x (array): x values (W)
+            y (array): y values (S)
+            groups (array): group index of every point
+
+        Returns:
+            None: Returns None, but updates the moments
+        """
+        x = np.asarray(x, dtype = np.float64)
+        y = np.asarray(y, dtype = np.float64)
+        groups = np.asarray(groups, dtype = np.intp)
+
+        if len(x) == 0:
+            return None
+
+        # Moments of the batch on its own, about its own means
+        batch = FitAccumulator(self.n_groups)
+        batch.n = np.bincount(groups, minlength = self.n_groups)
+        batch.mean_x = SafeDivide(GroupSums(x, groups, self.n_groups), batch.n)
+        batch.mean_y = SafeDivide(GroupSums(y, groups, self.n_groups), batch.n)
+        batch.mean_x[batch.n == 0] = 0.0
+        batch.mean_y[batch.n == 0] = 0.0
+
+        dx = x - batch.mean_x[groups]
+        dy = y - batch.mean_y[groups]
+        batch.sxx = GroupSums(dx * dx, groups, self.n_groups)
+        batch.syy = GroupSums(dy * dy, groups, self.n_groups)
+        batch.sxy = GroupSums(dx * dy, groups, self.n_groups)
+
+        self.Merge(batch)
+
+        return None
+
+    def Merge(self, other):
+        """Merges the moments of another FitAccumulator over the same groups into this one
+
+        Args:
+            other (FitAccumulator): moments over other points
+
+        Returns:
+            None: Returns None, but updates the moments
+        """
+        n = self.n + other.n
+
+        # Weight of the other side in the combined means, zero for groups with no points on either side
+        fraction = SafeDivide(other.n.astype(np.float64), n.astype(np.float64))
+        fraction[n == 0] = 0.0
+
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        cross = self.n * fraction
+
+        self.mean_x = self.mean_x + dx * fraction
+        self.mean_y = self.mean_y + dy * fraction
+        self.sxx = self.sxx + other.sxx + dx * dx * cross
+        self.syy = self.syy + other.syy + dy * dy * cross
+        self.sxy = self.sxy + other.sxy + dx * dy * cross
+        self.n = n
+
+        return None
+
+    def Resize(self, n_groups):
+        """Adds empty groups at the end, e.g. when a new combination of keys shows up
+
+        Args:
+            n_groups (int): new number of groups, no smaller than the current one
+
+        Returns:
+            None: Returns None, but grows the moments
+        """
+        extra = n_groups - self.n_groups
+        if extra <= 0:
+            return None
+
+        empty = FitAccumulator(extra)
+        for name in FIT_STATE:
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(empty, name))))
+        self.n_groups = n_groups
+
+        return None
+
+    def Expand(self, mapping, n_groups):
+        """Moves every group to a new index among more groups, the others left empty, e.g. to merge groups numbered differently
+
+        Args:
+            mapping (array): new index of every current group, no two the same
+            n_groups (int): number of new groups
+
+        Returns:
+            FitAccumulator: the same moments at their new indeces
+        """
+        expanded = FitAccumulator(n_groups)
+        for name in FIT_STATE:
+            getattr(expanded, name)[mapping] = getattr(self, name)
+
+        return expanded
+
+    def Reduce(self, mapping, n_groups):
+        """Merges groups together, e.g. to roll (material, anneal type, temperature) groups up to (material,)
+
+        Args:
+            mapping (array): new group of every current group
+            n_groups (int): number of new groups
+
+        Returns:
+            FitAccumulator: moments of the new groups, as if their points had been added to them directly
+        """
+        mapping = np.asarray(mapping, dtype = np.intp)
+        reduced = FitAccumulator(n_groups)
+        reduced.n = np.bincount(mapping, self.n, n_groups).astype(np.int64)
+        reduced.mean_x = SafeDivide(np.bincount(mapping, self.n * self.mean_x, n_groups), reduced.n)
+        reduced.mean_y = SafeDivide(np.bincount(mapping, self.n * self.mean_y, n_groups), reduced.n)
+        reduced.mean_x[reduced.n == 0] = 0.0
+        reduced.mean_y[reduced.n == 0] = 0.0
+
+        # Co-moments within the groups plus those of the group means about the pooled means
+        dx = self.mean_x - reduced.mean_x[mapping]
+        dy = self.mean_y - reduced.mean_y[mapping]
+        reduced.sxx = np.bincount(mapping, self.sxx + self.n * dx * dx, n_groups)
+        reduced.syy = np.bincount(mapping, self.syy + self.n * dy * dy, n_groups)
+        reduced.sxy = np.bincount(mapping, self.sxy + self.n * dx * dy, n_groups)
+
+        return reduced
+
+    def State(self):
+        """Gets the moments as plain arrays, e.g. to send them to another process or save them
+
+        Returns:
+            dictionary: name -> array of every moment
+        """
+        return {name: getattr(self, name).copy() for name in FIT_STATE}
+
+    def LoadState(self, state):
+        """Replaces the moments with ones from State()
+
+        Args:
+            state (dictionary): name -> array, as from State()
+
+        Raises:
+            ValueError: If the number of groups doesn't match
+
+        Returns:
+            None
+        """
+        if len(state['n']) != self.n_groups:
+            message = f"\nCannot load fit moments of {len(state['n'])} groups into {self.n_groups}"
+            raise ValueError(message)
+
+        for name in FIT_STATE:
+            setattr(self, name, np.array(state[name], dtype = getattr(self, name).dtype))
+
+        return None
+
+    def Fit(self):
+        """Ordinary least squares fit of every group from the moments so far
+
+        Returns:
+            dictionary: method, n, slope, intercept, r_squared, covariance and converged arrays, as from FitGroups
+        """
+        mean_x = np.where(self.n > 0, self.mean_x, np.nan)
+        mean_y = np.where(self.n > 0, self.mean_y, np.nan)
+
+        fit = LineFromMoments(self.n, mean_x, mean_y, self.sxx, self.syy, self.sxy)
+        fit['method'] = 'ols'
+        fit['converged'] = np.ones(self.n_groups, dtype = bool)
+
+        return fit
+
+def FitGroups(x, y, groups, n_groups, x_error = None, y_error = None, method = 'ols'):
+    """Fits a line y = slope * x + intercept to every group
+
+    Args:
+        x (array): x values of every record (W)
+        y (array): y values of every record (S)
+        groups (array): group index of every record
+        n_groups (int): number of groups
+        x_error (array): x uncertainties, needed for 'york'
+        y_error (array): y uncertainties, needed for 'york'
+        method (string): Default 'ols', or 'york' for the error weighted fit
+
+    Raises:
+        ValueError: If the method is unknown or 'york' is asked for without uncertainties
+
+    Returns:
+        dictionary: method, n, slope, intercept, r_squared, covariance ((n_groups, 2, 2), ordered slope, intercept) and converged arrays
+    """
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    groups = np.asarray(groups, dtype = np.intp)
+
+    if method == 'ols':
+        # The ordinary fit is closed form, so it is always converged
+        fit = FitOLS(x, y, groups, n_groups)
+        fit['converged'] = np.ones(n_groups, dtype = bool)
+    elif method == 'york':
+        if x_error is None or y_error is None:
+            raise ValueError("\nThe 'york' fit needs both x_error and y_error")
+        fit = FitYork(x, y, np.asarray(x_error, dtype = np.float64), np.asarray(y_error, dtype = np.float64), groups, n_groups)
+    else:
+        message = f"\nFit method ({method}) is not available\nEnter one of the options: {FIT_METHODS}"
+        raise ValueError(message)
+
+    fit['method'] = method
+
+    return fit
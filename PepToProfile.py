@@ -0,0 +1,203 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Per-stage timing and memory instrumentation for PepTo
+
+Switch it on with the environment variable PEPTO_PROFILE (set to an output folder, or to 1 for 'pepto_profile' in the
+working directory) and add PEPTO_CPROFILE=1 for a cProfile dump of every stage. From Python, call Enable() instead.
+While it is off, Measure() hands back a shared do-nothing context, so instrumented code costs one check per stage.
+"""
+import cProfile
+import atexit
+import time
+import json
+import os
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is left out there
+    resource = None
+
+# Folder used when PEPTO_PROFILE is set to 1
+DEFAULT_OUTPUT = 'pepto_profile'
+
+# Instrumentation state
+ENABLED = False
+OUTPUT = None
+CPROFILE = False
+RECORDS = []
+
+def PeakRSS():
+    """Peak resident set size of this process so far, in MB
+
+    Returns:
+        float: peak RSS, None where the resource module is not available
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kB, macOS bytes
+    return peak / 1024.0 if os.uname().sysname != 'Darwin' else peak / (1024.0 * 1024.0)
+
+class NullStage(object):
+    """Stand-in returned by Measure() while instrumentation is off"""
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Stage(object):
+    def __init__(self, name, items = None):
+        """Measures wall time, CPU time, peak RSS and items processed for one stage of the pipeline
+
+        Args:
+            name (string): stage name, e.g. 'FillDataSet'
+            items (int): number of items the stage handles, can also be set on the stage inside the with block
+        """
+        self.name = name
+        self.items = items
+        self.profile = cProfile.Profile() if CPROFILE else None
+
+        return None
+
+    def __enter__(self):
+        self.peak_before = PeakRSS()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+
+        if self.profile is not None:
+            self.profile.enable()
+
+        return self
+
+    def __exit__(self, *exception):
+        if self.profile is not None:
+            self.profile.disable()
+
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        peak = PeakRSS()
+
+        record = {
+            'stage': self.name,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'peak_rss_mb': peak,
+            'peak_rss_growth_mb': peak - self.peak_before if peak is not None else None,
+            'items': self.items,
+            'items_per_second': self.items / wall if self.items is not None and wall > 0 else None
+        }
+
+        if self.profile is not None:
+            os.makedirs(OUTPUT, exist_ok = True)
+            record['cprofile'] = os.path.join(OUTPUT, f"{len(RECORDS):02d}_{self.name}.prof")
+            self.profile.dump_stats(record['cprofile'])
+
+        RECORDS.append(record)
+
+        return False
+
+def Measure(name, items = None):
+    """Measures a stage of the pipeline while instrumentation is on
+
+    Usage:
+        with Measure('FillDataSet', len(files)) as stage:
+            ...
+
+    Args:
+        name (string): stage name
+        items (int): number of items the stage handles
+
+    Returns:
+        Stage: a recording Stage when enabled, otherwise the shared do-nothing NULL_STAGE
+    """
+    return Stage(name, items) if ENABLED else NULL_STAGE
+
+def Enable(output = DEFAULT_OUTPUT, cprofile = False):
+    """Switches instrumentation on
+
+    Args:
+        output (string): folder for the JSON summary and cProfile dumps
+        cprofile (bool): Default 'False', if 'True' also dumps a cProfile of every stage
+
+    Returns:
+        None
+    """
+    global ENABLED, OUTPUT, CPROFILE
+
+    ENABLED = True
+    OUTPUT = output
+    CPROFILE = cprofile
+
+    return None
+
+def Disable():
+    global ENABLED
+
+    ENABLED = False
+
+    return None
+
+def Summary():
+    """Collects the recorded stages
+
+    Returns:
+        dictionary: the stages in the order they ran, and their total wall and CPU time
+    """
+    return {
+        'stages': list(RECORDS),
+        'total_wall_seconds': sum(record['wall_seconds'] for record in RECORDS),
+        'total_cpu_seconds': sum(record['cpu_seconds'] for record in RECORDS),
+        'peak_rss_mb': PeakRSS()
+    }
+
+def PrintSummary():
+    """Prints a table of the recorded stages to the console
+
+    Returns:
+        None
+    """
+    print(f"\n{'Stage':<16}{'Wall (s)':>12}{'CPU (s)':>12}{'Peak RSS (MB)':>16}{'Items':>10}")
+    for record in RECORDS:
+        peak = f"{record['peak_rss_mb']:.1f}" if record['peak_rss_mb'] is not None else '-'
+        items = record['items'] if record['items'] is not None else '-'
+        print(f"{record['stage']:<16}{record['wall_seconds']:>12.4f}{record['cpu_seconds']:>12.4f}{peak:>16}{items:>10}")
+
+    return None
+
+def WriteSummary(path = None):
+    """Writes the JSON summary of the recorded stages
+
+    Args:
+        path (string): file to write, default None uses 'pepto_profile.json' in the output folder
+
+    Returns:
+        string: path of the file, None if nothing was recorded
+    """
+    if len(RECORDS) == 0:
+        return None
+
+    if path is None:
+        os.makedirs(OUTPUT, exist_ok = True)
+        path = os.path.join(OUTPUT, 'pepto_profile.json')
+
+    with open(path, 'w') as file:
+        json.dump(Summary(), file, indent = 4)
+
+    return path
+
+# Switch on from the environment, writing the summary when the program ends
+if os.environ.get('PEPTO_PROFILE'):
+    Enable(
+        DEFAULT_OUTPUT if os.environ['PEPTO_PROFILE'] == '1' else os.environ['PEPTO_PROFILE'],
+        os.environ.get('PEPTO_CPROFILE', '') not in ('', '0')
+    )
+    atexit.register(WriteSummary)
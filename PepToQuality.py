@@ -0,0 +1,341 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Data quality checks for PepTo, run on every batch of records as it is ingested
+"""
+from PepToStats import UNCERTAINTY_PAIRS
+import numpy as np
+import json
+
+# Reasons a record is quarantined, as bits of its flag so one record can fail several checks
+FLAGS = {
+    'unreadable': 1,
+    'non-finite': 2,
+    'out of range': 4,
+    'uncertainty': 8,
+    'outlier': 16
+}
+
+# Physical (low, high) range of every parameter: S and W are fractions of the annihilation peak area
+RANGES = [
+    (0.0, 1.0),
+    (0.0, 1.0),
+    (0.0, 1.0),
+    (0.0, 1.0),
+    (0.0, 1.0),
+    (0.0, 1.0)
+]
+
+# Largest uncertainty allowed relative to its parameter, a larger one usually means columns were swapped
+MAX_RELATIVE_UNCERTAINTY = 0.5
+
+# Parameters tested for outliers within their group: S, left W and right W
+OUTLIER_PARAMETERS = (0, 2, 4)
+
+# Groups smaller than this are too small to call any of their records an outlier, the median and MAD of a few
+# records are too noisy to judge by
+MIN_GROUP_SIZE = 20
+
+# Scales the median absolute deviation to a standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+def ValidateRecords(values, ranges = RANGES, uncertainty_pairs = UNCERTAINTY_PAIRS, max_relative_uncertainty = MAX_RELATIVE_UNCERTAINTY):
+    """Checks every record on its own: finite values, physical ranges, and uncertainties that fit their parameters
+
+    Args:
+        values (array): (n, 6) array of the parameters
+        ranges (list): (low, high) of every parameter
+        uncertainty_pairs (dictionary): parameter index -> index of its uncertainty
+        max_relative_uncertainty (float): largest uncertainty / parameter allowed
+
+    Returns:
+        array: flag of every record, 0 where it passed every check
+    """
+    flags = np.zeros(len(values), dtype = np.uint8)
+
+    finite = np.isfinite(values).all(axis = 1)
+    flags[~finite] |= FLAGS['non-finite']
+
+    # NaN compares False, so only the finite records can fail the value checks
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        low = np.array([bounds[0] for bounds in ranges])
+        high = np.array([bounds[1] for bounds in ranges])
+        flags[finite & ((values < low) | (values > high)).any(axis = 1)] |= FLAGS['out of range']
+
+        for parameter, uncertainty in uncertainty_pairs.items():
+            bad = (values[:, uncertainty] <= 0) | (values[:, uncertainty] > max_relative_uncertainty * values[:, parameter])
+            flags[finite & bad] |= FLAGS['uncertainty']
+
+    return flags
+
+def GroupMedians(x, groups, n_groups):
+    """Median of x within every group, for all groups at once with one sort
+
+    Args:
+        x (array): values
+        groups (array): group index of every value
+        n_groups (int): number of groups
+
+    Returns:
+        array: median of every group, NaN for empty groups
+    """
+    order = np.lexsort((x, groups))
+    counts = np.bincount(groups, minlength = n_groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    medians = np.full(n_groups, np.nan)
+    present = counts > 0
+
+    # The two middle values of every group (the same one for odd counts)
+    lower = x[order[offsets[present] + (counts[present] - 1) // 2]]
+    upper = x[order[offsets[present] + counts[present] // 2]]
+    medians[present] = (lower + upper) / 2
+
+    return medians
+
+def MADOutliers(values, groups, n_groups, threshold = 3.5, parameters = OUTLIER_PARAMETERS, min_group_size = MIN_GROUP_SIZE):
+    """Flags records further than threshold scaled median absolute deviations from their group's median
+
+    Args:
+        values (array): (n, 6) array of the parameters
+        groups (array): group index of every record
+        n_groups (int): number of groups
+        threshold (float): robust z-score above which a record is an outlier
+        parameters (list): parameter indeces tested
+        min_group_size (int): smallest group tested
+
+    Returns:
+        array: True for the outliers
+    """
+    outliers = np.zeros(len(values), dtype = bool)
+    tested = np.bincount(groups, minlength = n_groups)[groups] >= min_group_size
+
+    for parameter in parameters:
+        x = values[:, parameter]
+        deviation = np.abs(x - GroupMedians(x, groups, n_groups)[groups])
+        scale = MAD_SCALE * GroupMedians(deviation, groups, n_groups)[groups]
+
+        # A group with more than half its values equal has no spread to measure against, so it is left alone
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            outliers |= tested & (scale > 0) & (deviation > threshold * scale)
+
+    return outliers
+
+def SigmaClipOutliers(values, groups, n_groups, threshold = 3.0, parameters = OUTLIER_PARAMETERS, min_group_size = MIN_GROUP_SIZE, max_iterations = 10):
+    """Flags records further than threshold standard deviations from their group's mean, clipping until nothing changes
+
+    Args:
+        values (array): (n, 6) array of the parameters
+        groups (array): group index of every record
+        n_groups (int): number of groups
+        threshold (float): number of standard deviations above which a record is an outlier
+        parameters (list): parameter indeces tested
+        min_group_size (int): smallest group tested
+        max_iterations (int): most clipping passes
+
+    Returns:
+        array: True for the outliers
+    """
+    outliers = np.zeros(len(values), dtype = bool)
+    tested = np.bincount(groups, minlength = n_groups)[groups] >= min_group_size
+
+    for parameter in parameters:
+        x = values[:, parameter]
+        clipped = np.zeros(len(values), dtype = bool)
+
+        for _ in range(max_iterations):
+            # Mean and standard deviation of the records still in, for every group at once
+            kept = (~clipped).astype(np.float64)
+            n = np.bincount(groups, kept, n_groups)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                mean = np.bincount(groups, kept * x, n_groups) / n
+                std = np.sqrt(np.bincount(groups, kept * (x - mean[groups]) ** 2, n_groups) / (n - 1))
+                now_clipped = tested & (std[groups] > 0) & (np.abs(x - mean[groups]) > threshold * std[groups])
+
+            if np.array_equal(now_clipped, clipped):
+                break
+            clipped = now_clipped
+
+        outliers |= clipped
+
+    return outliers
+
+# Outlier tests QualityCheck can use, and their default thresholds
+OUTLIER_METHODS = {
+    'mad': (MADOutliers, 3.5),
+    'sigma': (SigmaClipOutliers, 3.0)
+}
+
+# Quality levels the entry points take: 'basic' quarantines files that can't be read and invalid records, 'mad' and
+# 'sigma' also quarantine the outliers of that test, and 'none' stops on the first file that can't be read
+QUALITY_LEVELS = ['basic', 'mad', 'sigma', 'none']
+DEFAULT_QUALITY = 'basic'
+
+def MakeQualityCheck(level = DEFAULT_QUALITY):
+    """Makes the QualityCheck of a quality level
+
+    Outliers are only quarantined when their test is asked for, as that changes the statistics. A file that can't
+    be read is set aside at every level but 'none'.
+
+    Args:
+        level (string): Default 'basic', or one of the other QUALITY_LEVELS
+
+    Raises:
+        IndexError: If the level is not one of QUALITY_LEVELS
+
+    Returns:
+        QualityCheck: the check, or None for 'none'
+    """
+    if level not in QUALITY_LEVELS:
+        message = f"\nQuality level ({level}) is not available\nEnter one of the options: {QUALITY_LEVELS}"
+        raise IndexError(message)
+
+    if level == 'none':
+        return None
+
+    return QualityCheck(None if level == 'basic' else level)
+
+def DescribeFlag(flag):
+    """Names the checks a record failed, e.g. 'out of range, uncertainty'
+    """
+    return ', '.join(name for name, bit in FLAGS.items() if flag & bit)
+
+class QualityCheck(object):
+    def __init__(self, method = 'mad', threshold = None, min_group_size = MIN_GROUP_SIZE):
+        """Validates batches of records and quarantines the bad ones, instead of letting them stop or skew the run
+
+        Every record is checked on its own (readable, finite, in range, sensible uncertainties), then the records
+        that passed are tested for outliers within their group. Both steps are vectorized over the whole batch.
+        Quarantined records are kept out of the DataSet and listed, with the reason, in self.quarantined. One
+        QualityCheck can be handed to several ingest calls and collects the results of all of them.
+
+        Args:
+            method (string): Default 'mad' for median/MAD outliers, 'sigma' for sigma clipping, or None to skip the outlier test
+            threshold (float): outlier threshold, default None uses the method's default (3.5 robust z for 'mad', 3 sigma for 'sigma')
+            min_group_size (int): smallest group tested for outliers
+
+        Raises:
+            IndexError: If the method is not one of OUTLIER_METHODS
+        """
+        if method is not None and method not in OUTLIER_METHODS:
+            message = f"\nOutlier method ({method}) is not available\nEnter one of the options: {list(OUTLIER_METHODS)} or None"
+            raise IndexError(message)
+
+        self.method = method
+        self.threshold = OUTLIER_METHODS[method][1] if method is not None and threshold is None else threshold
+        self.min_group_size = min_group_size
+
+        # Source (file, or bulk file row) -> reason it was quarantined
+        self.quarantined = {}
+        self.checked = 0
+        self.counts = {name: 0 for name in FLAGS}
+
+        return None
+
+    def Check(self, values, groups, n_groups, sources, errors = None):
+        """Checks a batch of records
+
+        Outliers are judged against the other records of the batch, so a batch should hold a good share of every
+        group (FillDataSet checks all its files as one batch).
+
+        Args:
+            values (array): (n, 6) array of the parameters
+            groups (array): group index of every record
+            n_groups (int): number of groups
+            sources (list): name of every record for the report, e.g. its file path
+            errors (dictionary): position -> message for the records that could not be read
+
+        Returns:
+            array: True for the records that passed
+        """
+        groups = np.asarray(groups, dtype = np.intp)
+        flags = ValidateRecords(values)
+
+        if errors:
+            flags[list(errors)] = FLAGS['unreadable']
+
+        if self.method is not None:
+            valid = np.flatnonzero(flags == 0)
+            test = OUTLIER_METHODS[self.method][0]
+            outliers = test(values[valid], groups[valid], n_groups, self.threshold, min_group_size = self.min_group_size)
+            flags[valid[outliers]] |= FLAGS['outlier']
+
+        # Only the flagged records are looked at one by one
+        for position in np.flatnonzero(flags):
+            reason = DescribeFlag(flags[position])
+            if errors and position in errors:
+                reason += f" ({errors[position]})"
+            self.quarantined[sources[position]] = reason
+
+        for name, bit in FLAGS.items():
+            self.counts[name] += int(np.count_nonzero(flags & bit))
+        self.checked += len(values)
+
+        return flags == 0
+
+    def Report(self):
+        """Summary of every check made so far
+
+        Returns:
+            dictionary: records checked, number quarantined, count of each reason, and the quarantined sources with their reasons
+        """
+        return {
+            'checked': self.checked,
+            'quarantined': len(self.quarantined),
+            'counts': dict(self.counts),
+            'method': self.method,
+            'threshold': self.threshold,
+            'sources': dict(self.quarantined)
+        }
+
+    def AddReport(self, report):
+        """Adds the results of another QualityCheck, e.g. one run in another process, to this one
+
+        Args:
+            report (dictionary): the other's Report()
+
+        Returns:
+            None
+        """
+        self.quarantined.update(report['sources'])
+        self.checked += report['checked']
+        for name, count in report['counts'].items():
+            self.counts[name] += count
+
+        return None
+
+    def PrintReport(self, limit = 20):
+        """Prints the summary and the first quarantined sources
+
+        Args:
+            limit (int): most sources listed
+
+        Returns:
+            None
+        """
+        print(f"\nQuality: {len(self.quarantined)} of {self.checked} records quarantined")
+        for name, count in self.counts.items():
+            if count > 0:
+                print(f"    {name:<14}{count:>8}")
+
+        for number, (source, reason) in enumerate(self.quarantined.items()):
+            if number == limit:
+                print(f"    ... and {len(self.quarantined) - limit} more")
+                break
+            print(f"    {source}: {reason}")
+
+        return None
+
+    def WriteReport(self, path):
+        """Writes the summary as JSON
+
+        Args:
+            path (string): file to write
+
+        Returns:
+            string: path of the file
+        """
+        with open(path, 'w') as file:
+            json.dump(self.Report(), file, indent = 4)
+
+        return path
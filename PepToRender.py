@@ -0,0 +1,125 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Headless batch rendering of PepTo figures
+"""
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import concurrent.futures
+import PepTo3
+import sys
+import os
+
+# Plots RenderDataSet can draw, and the DataSet method drawing each
+PLOTS = {
+    'svw': lambda dset, fig, options: dset.SvW(options.get('trendline', True), options.get('method', 'ols'), fig, options.get('max_points', PepTo3.DEFAULT_MAX_POINTS)),
+    'box': lambda dset, fig, options: dset.BoxPlots(fig),
+    'density': lambda dset, fig, options: dset.SvWDensity(options.get('trendline', True), options.get('method', 'ols'), fig)
+}
+
+# Figures kept for reuse, one per plot kind in each process
+FIGURES = {}
+
+def GetFigure(plot):
+    """Gets the figure for a plot kind, reusing the one from the previous campaign in this process
+
+    The figures are plain Agg figures, never registered with pyplot, so no GUI backend or display is needed and they
+    are not kept alive by pyplot's figure manager.
+
+    Args:
+        plot (string): key of PLOTS
+
+    Returns:
+        Figure: the figure, cleared by the drawing method before use
+    """
+    if plot not in FIGURES:
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        FIGURES[plot] = fig
+
+    return FIGURES[plot]
+
+def RenderDataSet(dset, prefix, plots = ('svw', 'box'), formats = ('png',), dpi = 150, **options):
+    """Renders the figures of one campaign to image files
+
+    Args:
+        dset (DataSet): filled dataset
+        prefix (string): output path without the extension, '_svw.png' etc. are appended
+        plots (list): keys of PLOTS to draw
+        formats (list): file formats to save, e.g. 'png' and 'svg'
+        dpi (int): resolution of the raster formats
+        options: trendline, method and max_points passed on to DataSet.SvW
+
+    Raises:
+        IndexError: If a plot is not in PLOTS
+
+    Returns:
+        list: paths of the saved files
+    """
+    paths = []
+
+    for plot in plots:
+        if plot not in PLOTS:
+            message = f"\nPlot ({plot}) is not available\nEnter one of the options: {list(PLOTS)}"
+            raise IndexError(message)
+
+        fig, _ = PLOTS[plot](dset, GetFigure(plot), options)
+
+        for file_format in formats:
+            path = f"{prefix}_{plot}.{file_format}"
+            fig.savefig(path, format = file_format, dpi = dpi, facecolor = fig.get_facecolor())
+            paths.append(path)
+
+    return paths
+
+def RenderCampaign(job):
+    """Renders one campaign, the unit of work of RenderCampaigns
+
+    Args:
+        job (tuple): (source, prefix, plots, formats, options) where the source is a DataSet or a folder saved by DataSet.ToBinary
+
+    Returns:
+        list: paths of the saved files
+    """
+    source, prefix, plots, formats, options = job
+
+    # Saved campaigns are memory mapped, so a worker only pages in the columns it draws
+    dset = PepTo3.FromBinary(source, mmap = True) if isinstance(source, str) else source
+
+    return RenderDataSet(dset, prefix, plots, formats, **options)
+
+def RenderCampaigns(campaigns, output_folder, plots = ('svw', 'box'), formats = ('png',), workers = None, **options):
+    """Renders the figures of many campaigns in parallel worker processes
+
+    Args:
+        campaigns (dictionary): campaign name -> DataSet or folder saved by DataSet.ToBinary
+        output_folder (string): folder for the image files, named '<campaign>_<plot>.<format>'
+        plots (list): keys of PLOTS to draw
+        formats (list): file formats to save, e.g. 'png' and 'svg'
+        workers (int): number of worker processes, default None uses one per CPU, 1 renders in this process
+        options: dpi, trendline, method and max_points passed on to RenderDataSet
+
+    Returns:
+        dictionary: campaign name -> paths of the saved files
+    """
+    os.makedirs(output_folder, exist_ok = True)
+
+    jobs = [(source, os.path.join(output_folder, name), tuple(plots), tuple(formats), options) for name, source in campaigns.items()]
+
+    if workers == 1 or len(jobs) <= 1:
+        results = [RenderCampaign(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(RenderCampaign, jobs))
+
+    return dict(zip(campaigns, results))
+
+if __name__ == '__main__':
+    # python PepToRender.py <output folder> <saved campaign folder> [<saved campaign folder> ...]
+    if len(sys.argv) < 3:
+        print("Usage: python PepToRender.py <output folder> <campaign folder saved by DataSet.ToBinary> ...")
+        sys.exit(1)
+
+    campaigns = {os.path.basename(os.path.normpath(folder)): folder for folder in sys.argv[2:]}
+    for name, paths in RenderCampaigns(campaigns, sys.argv[1], formats = ('png', 'svg')).items():
+        print(f"{name}: {', '.join(paths)}")
@@ -0,0 +1,297 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Bootstrap and permutation statistics for comparing annealed and unannealed samples in PepTo
+"""
+from PepTo3 import MISSING
+import concurrent.futures
+import numpy as np
+
+# Resamples handled by one task, fixed so the results don't depend on the number of workers
+TASK_SIZE = 1000
+
+# Most values drawn at once inside a task, to bound the memory of a batch
+BATCH_ELEMENTS = 2_000_000
+
+# Parameters CompareAnnealing can test, and how to get one group of each from a DataSet,
+# through GetGroup and GroupW so spilled samples are read back from disk
+PARAMETERS = {
+    'S Parameter': lambda dset, group: dset.GetGroup(group, 'S Parameter'),
+    'W Parameter': lambda dset, group: dset.GroupW(group)[0]
+}
+
+def BatchSizes(n_resamples, n_values):
+    """Splits a task's resamples into batches of at most BATCH_ELEMENTS drawn values
+
+    Returns:
+        list: number of resamples in each batch
+    """
+    batch = max(1, BATCH_ELEMENTS // max(1, n_values))
+    return [min(batch, n_resamples - start) for start in range(0, n_resamples, batch)]
+
+def BootstrapTask(task):
+    """Means of bootstrap resamples (drawn with replacement) of one set of values
+
+    Args:
+        task (tuple): (values, n_resamples, SeedSequence)
+
+    Returns:
+        array: n_resamples means
+    """
+    values, n_resamples, seed = task
+    rng = np.random.default_rng(seed)
+    means = []
+
+    for batch in BatchSizes(n_resamples, len(values)):
+        draws = rng.integers(0, len(values), size = (batch, len(values)))
+        means.append(values[draws].mean(axis = 1))
+
+    return np.concatenate(means)
+
+def PermutationTask(task):
+    """Differences of means between two sets of values after randomly relabelling them
+
+    Args:
+        task (tuple): (pooled values, size of the first set, n_resamples, SeedSequence)
+
+    Returns:
+        array: n_resamples differences (mean of the first set minus mean of the second)
+    """
+    pooled, n_first, n_resamples, seed = task
+    rng = np.random.default_rng(seed)
+    differences = []
+
+    for batch in BatchSizes(n_resamples, len(pooled)):
+        shuffled = rng.permuted(np.broadcast_to(pooled, (batch, len(pooled))), axis = 1)
+        differences.append(shuffled[:, :n_first].mean(axis = 1) - shuffled[:, n_first:].mean(axis = 1))
+
+    return np.concatenate(differences)
+
+def SplitTasks(n_resamples, seed):
+    """Splits resamples into fixed size tasks, each with its own independent random stream
+
+    Args:
+        n_resamples (int): total number of resamples
+        seed (SeedSequence): seed of this test
+
+    Returns:
+        list: (n_resamples, SeedSequence) of every task
+    """
+    sizes = [min(TASK_SIZE, n_resamples - start) for start in range(0, n_resamples, TASK_SIZE)]
+    return list(zip(sizes, seed.spawn(len(sizes))))
+
+def RunTasks(function, tasks, workers = None):
+    """Runs tasks serially, or across a process pool
+
+    Args:
+        function (callable): top level function taking a task
+        tasks (list): the tasks
+        workers (int): Default 'None' runs in this process, otherwise the number of worker processes
+
+    Returns:
+        list: results in the order of tasks
+    """
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        return list(pool.map(function, tasks))
+
+def PercentileInterval(samples, confidence):
+    """Percentile confidence interval of bootstrap samples
+    """
+    tail = 50.0 * (1.0 - confidence)
+    low, high = np.percentile(samples, [tail, 100.0 - tail])
+    return float(low), float(high)
+
+def BootstrapMean(values, n_resamples = 10_000, seed = 0, confidence = 0.95, workers = None):
+    """Bootstrap confidence interval of the mean of a set of values
+
+    Args:
+        values (array): the values
+        n_resamples (int): number of bootstrap resamples
+        seed (int or SeedSequence): seed, the same seed always gives the same interval
+        confidence (float): confidence level of the interval
+        workers (int): Default 'None' runs in this process, otherwise the number of worker processes
+
+    Returns:
+        dictionary: mean, low and high ends of the interval, and the bootstrap standard error
+    """
+    values = np.asarray(values, dtype = np.float64)
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    tasks = [(values, size, task_seed) for (size, task_seed) in SplitTasks(n_resamples, seed)]
+    means = np.concatenate(RunTasks(BootstrapTask, tasks, workers))
+
+    return SummarizeBootstrap(values, means, confidence)
+
+def SummarizeBootstrap(values, means, confidence):
+    """Mean, percentile interval and standard error from the bootstrap means of a set of values
+    """
+    low, high = PercentileInterval(means, confidence)
+    return {'mean': float(values.mean()), 'low': low, 'high': high, 'std_error': float(means.std(ddof = 1))}
+
+def PermutationTest(first, second, n_resamples = 10_000, seed = 0, workers = None):
+    """Two sided permutation test of the difference of the means of two sets of values
+
+    Args:
+        first (array): values of the first set (e.g. annealed)
+        second (array): values of the second set (e.g. unannealed)
+        n_resamples (int): number of random relabellings
+        seed (int or SeedSequence): seed, the same seed always gives the same p-value
+        workers (int): Default 'None' runs in this process, otherwise the number of worker processes
+
+    Returns:
+        dictionary: observed difference of the means (first - second) and its p-value
+    """
+    first = np.asarray(first, dtype = np.float64)
+    second = np.asarray(second, dtype = np.float64)
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    pooled = np.concatenate((first, second))
+    tasks = [(pooled, len(first), size, task_seed) for (size, task_seed) in SplitTasks(n_resamples, seed)]
+    differences = np.concatenate(RunTasks(PermutationTask, tasks, workers))
+
+    return SummarizePermutation(first, second, differences)
+
+def SummarizePermutation(first, second, differences):
+    """Observed difference of the means and its two sided p-value from the permuted differences
+    """
+    observed = first.mean() - second.mean()
+
+    # The observed labelling counts as one of the permutations, so the p-value is never 0
+    # (the small tolerance keeps ties from being lost to rounding)
+    extreme = np.count_nonzero(np.abs(differences) >= abs(observed) - 1e-15)
+
+    return {'difference': float(observed), 'p_value': (extreme + 1) / (len(differences) + 1)}
+
+def CompareAnnealing(dset, parameters = ('S Parameter', 'W Parameter'), n_resamples = 10_000, seed = 0, confidence = 0.95, workers = None, anneal_types = ('annealed', 'unannealed')):
+    """Tests whether annealing shifts each parameter, for every material of a DataSet
+
+    For each material and parameter this gives bootstrap confidence intervals of the means of two anneal types
+    and a permutation test of their difference. A dataset grouped by more keys (e.g. temperature) is compared
+    within every combination of them. All the resampling tasks of all materials run in one process pool. Every
+    test gets its own seed stream from (seed, material, parameter and the codes of any other keys), so the results
+    are reproducible and don't depend on the number of workers.
+
+    Args:
+        dset (DataSet): filled dataset, which must keep its samples (in memory or spilled to disk)
+        parameters (list): keys of PARAMETERS to test
+        n_resamples (int): number of bootstrap resamples and permutations of every test
+        seed (int): base seed
+        confidence (float): confidence level of the intervals
+        workers (int): Default 'None' runs in this process, otherwise the number of worker processes
+        anneal_types (tuple): the two anneal types compared, the difference is the first's mean minus the second's
+
+    Raises:
+        ValueError: If the dataset keeps no samples
+        IndexError: If an anneal type is not one of the dataset's
+
+    Returns:
+        dictionary: material (followed by the other keys, e.g. 'nickel, temperature 300K') -> parameter -> {first anneal type: bootstrap, second anneal type: bootstrap, 'permutation': test}, materials lacking either anneal type are left out
+    """
+    if not dset.keep_samples and dset.spill is None:
+        raise ValueError("\nResampling needs the samples, but this dataset was made with keep_samples = False and no spill folder")
+
+    for anneal_type in anneal_types:
+        if anneal_type not in dset.row_indeces:
+            message = f"\nAnneal type ({anneal_type}) is not in the dataset\nEnter two of the options: {list(dset.row_indeces)}"
+            raise IndexError(message)
+
+    first_name, second_name = anneal_types
+    first_row = dset.row_indeces[first_name]
+    second_row = dset.row_indeces[second_name]
+
+    # Every group of the first anneal type is paired with the group of the second that matches it on every other key
+    pairs = []
+    for first_group in dset.DisplayOrder():
+        codes = dset.group_keys[first_group].tolist()
+        if codes[1] != first_row:
+            continue
+        second_group = dset.lookup.get(tuple(codes[:1] + [second_row] + codes[2:]))
+        if second_group is not None:
+            key = dset.Key(first_group)
+            name = ', '.join([key['material']] + [f"{tag} {key[tag]}" for tag in dset.keys[2:] if key[tag] != MISSING])
+            pairs.append((name, codes[:1] + codes[2:], first_group, second_group))
+
+    # Collect every task up front so they can share one pool
+    jobs = []
+    bootstrap_tasks = []
+    permutation_tasks = []
+
+    for material, codes, first_group, second_group in pairs:
+        for parameter_index, parameter in enumerate(parameters):
+            first = np.ascontiguousarray(PARAMETERS[parameter](dset, first_group))
+            second = np.ascontiguousarray(PARAMETERS[parameter](dset, second_group))
+
+            if len(first) == 0 or len(second) == 0:
+                continue
+
+            base = np.random.SeedSequence([seed, codes[0], parameter_index] + codes[1:])
+            first_seed, second_seed, permutation_seed = base.spawn(3)
+
+            job = {'material': material, 'parameter': parameter, 'first': first, 'second': second, 'tasks': []}
+            for values, task_seed, name in ((first, first_seed, first_name), (second, second_seed, second_name)):
+                tasks = [(values, size, stream) for (size, stream) in SplitTasks(n_resamples, task_seed)]
+                job['tasks'].append((name, len(bootstrap_tasks), len(tasks)))
+                bootstrap_tasks.extend(tasks)
+
+            tasks = [(np.concatenate((first, second)), len(first), size, stream) for (size, stream) in SplitTasks(n_resamples, permutation_seed)]
+            job['tasks'].append(('permutation', len(permutation_tasks), len(tasks)))
+            permutation_tasks.extend(tasks)
+
+            jobs.append(job)
+
+    if workers is None or workers <= 1:
+        bootstrap_results = [BootstrapTask(task) for task in bootstrap_tasks]
+        permutation_results = [PermutationTask(task) for task in permutation_tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+            bootstrap_results = list(pool.map(BootstrapTask, bootstrap_tasks))
+            permutation_results = list(pool.map(PermutationTask, permutation_tasks))
+
+    results = {}
+    for job in jobs:
+        summary = {}
+        for name, start, count in job['tasks']:
+            if name == 'permutation':
+                summary[name] = SummarizePermutation(job['first'], job['second'], np.concatenate(permutation_results[start:start + count]))
+            else:
+                values = job['first'] if name == first_name else job['second']
+                summary[name] = SummarizeBootstrap(values, np.concatenate(bootstrap_results[start:start + count]), confidence)
+
+        results.setdefault(job['material'], {})[job['parameter']] = summary
+
+    return results
+
+def PrintComparison(results, confidence = 0.95):
+    """Prints the results of CompareAnnealing as a table
+
+    Args:
+        results (dictionary): results of CompareAnnealing
+        confidence (float): confidence level the intervals were made with, for the heading
+
+    Returns:
+        None
+    """
+    # The two anneal types compared, in the order CompareAnnealing was given them
+    summaries = [summary for parameters in results.values() for summary in parameters.values()]
+    first_name, second_name = [name for name in summaries[0] if name != 'permutation'] if len(summaries) > 0 else ('annealed', 'unannealed')
+
+    # Materials are followed by any other keys they were compared within, so the column fits the longest name
+    width = max([12] + [len(material) + 2 for material in results])
+
+    print(f"\n{'Material':<{width}}{'Parameter':<14}{first_name.title() + ' (' + format(confidence, '.0%') + ' CI)':<34}{second_name.title():<34}{'Difference':>12}{'p-value':>10}")
+
+    for material, parameters in results.items():
+        for parameter, summary in parameters.items():
+            first = summary[first_name]
+            second = summary[second_name]
+            print(
+                f"{material.title():<{width}}{parameter:<14}"
+                f"{first['mean']:.6f} [{first['low']:.6f}, {first['high']:.6f}]{'':<4}"
+                f"{second['mean']:.6f} [{second['low']:.6f}, {second['high']:.6f}]{'':<4}"
+                f"{summary['permutation']['difference']:>12.6f}{summary['permutation']['p_value']:>10.4f}"
+            )
+
+    return None
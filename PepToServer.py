@@ -0,0 +1,452 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Local HTTP query service for PepTo, holding one loaded DataSet for everyone who asks
+
+Endpoints (all GET):
+    /status                                         files, records, version and cache counts
+    /stats?parameter=S Parameter&statistic=mean     a statistic of every group, see PepTo3.STATISTICS
+    /fit?method=ols                                 S vs. W fit of every group, and whether it converged
+    /groups?by=material,temperature&statistic=mean  one row per group, rolled up to fewer keys if asked
+    /plot/svw.png?trendline=1&method=ols&dpi=100    the S vs. W plot
+    /plot/box.png?dpi=100                           the box plots
+    /plot/density.png?trendline=1&method=ols        the S vs. W density, for datasets too large to scatter
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+from PappyCache import ManifestCache, CACHE_NAME
+from PappyFiles import ScanDirectories
+from PepToQuality import MakeQualityCheck, DEFAULT_QUALITY
+import collections
+import threading
+import numpy as np
+import json
+import time
+import io
+import os
+
+# Default address of the service, only reachable from this machine
+HOST = '127.0.0.1'
+PORT = 8050
+
+# Most responses kept in the LRU cache
+CACHE_SIZE = 128
+
+# Seconds between checks of the pappy files for changes
+CHECK_INTERVAL = 2.0
+
+# Largest dpi a plot can be asked for, so one request can't tie up the service
+MAX_DPI = 300
+
+class QueryError(Exception):
+    """A request the service can't answer, sent back as JSON with its HTTP status"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def FileStamp(root):
+    """Summarizes the name, size and modification time of every pappy file below root
+
+    Args:
+        root (string): folder to scan
+
+    Returns:
+        tuple: (number of files, hash of their stats), which changes when a file is added, removed or modified
+    """
+    stamps = []
+    for file in ScanDirectories(root):
+        try:
+            stat = os.stat(os.path.join(root, file))
+            stamps.append((file, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            stamps.append((file, -1, -1))
+
+    return len(stamps), hash(tuple(stamps))
+
+def Finite(array):
+    """Turns an array into nested lists for JSON, with NaN as None
+    """
+    return [None if np.isnan(value) else float(value) for value in array]
+
+class QueryService(object):
+    def __init__(self, root = None, materials = None, quality = DEFAULT_QUALITY, cache_size = CACHE_SIZE, check_interval = CHECK_INTERVAL, workers = None, keys = None):
+        """Keeps a DataSet of the pappy files below root loaded, and answers queries on it through an LRU cache
+
+        The files are checked for changes at most every check_interval seconds, when a query comes in. A change
+        reloads the DataSet (through the parse cache, so only new or changed files are parsed) and empties the
+        response cache. Queries are answered from whatever DataSet was loaded last while a reload runs.
+
+        Args:
+            root (string): Default 'None' serves the current working directory, otherwise the folder to serve
+            materials (list): materials analyzed, default None uses the ones PepTo3.main analyzes
+            quality (string): Default 'basic' quarantines files that can't be read and invalid records, 'mad' or 'sigma' outliers of that test too, 'none' keeps every record
+            cache_size (int): most responses kept
+            check_interval (float): seconds between checks of the files, 0 checks on every query
+            workers (int): Default 'None' reads the files serially, otherwise the number of parallel readers
+            keys (list): Default 'None' groups by material and anneal type only, otherwise other keys tagged in the file names to group by too
+        """
+        self.root = os.getcwd() if root is None else root
+        self.materials = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead'] if materials is None else materials
+        self.keys = keys
+        self.quality = quality
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.workers = workers
+        self.parse_cache = ManifestCache(os.path.join(self.root, CACHE_NAME))
+
+        # Response cache: (path, query, load) -> (content type, body), most recently used last
+        self.responses = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # cache_lock guards the response cache and the key locks, load_lock lets one thread reload at a time, and
+        # every response being made has its own lock, so only identical requests wait for each other
+        self.cache_lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.key_locks = {}
+
+        self.dset = None
+        self.stamp = None
+        self.checked = 0.0
+        self.loads = 0
+        self.Load()
+
+        return None
+
+    def Load(self):
+        """Reads the pappy files into a new DataSet and swaps it in, emptying the response cache
+
+        Returns:
+            None
+        """
+        import PepTo3
+
+        stamp = FileStamp(self.root)
+        dset = PepTo3.DataSet(self.materials, keys = self.keys)
+        quality = MakeQualityCheck(self.quality)
+        dset.FillDataSet(PepTo3.GetDirectories(self.root), workers = self.workers, cache = self.parse_cache, root = self.root, quality = quality)
+
+        with self.cache_lock:
+            self.dset = dset
+            self.stamp = stamp
+            self.quarantined = 0 if quality is None else len(quality.quarantined)
+            self.responses.clear()
+            self.loads += 1
+        self.checked = time.monotonic()
+
+        return None
+
+    def Refresh(self):
+        """Reloads the DataSet if the files changed since they were last checked
+
+        Returns:
+            bool: True if the DataSet was reloaded
+        """
+        if time.monotonic() - self.checked < self.check_interval:
+            return False
+
+        # Another thread is already checking or reloading, so keep answering from the current DataSet
+        if not self.load_lock.acquire(blocking = False):
+            return False
+
+        try:
+            if FileStamp(self.root) == self.stamp:
+                self.checked = time.monotonic()
+                return False
+            self.Load()
+            return True
+        finally:
+            self.load_lock.release()
+
+    def Query(self, path, query):
+        """Answers one request, from the response cache when it can
+
+        Args:
+            path (string): endpoint, e.g. '/stats'
+            query (dictionary): query parameters
+
+        Raises:
+            QueryError: If the endpoint doesn't exist or a parameter is wrong
+
+        Returns:
+            tuple: content type and body (bytes)
+        """
+        self.Refresh()
+
+        # /status is always fresh
+        if path == '/status':
+            return 'application/json', self.Status()
+
+        if path not in ENDPOINTS:
+            raise QueryError(404, f"No endpoint '{path}', the endpoints are {list(ENDPOINTS) + ['/status']}")
+
+        # The load count is part of the key, so a response made from an older DataSet is never handed out
+        with self.cache_lock:
+            dset = self.dset
+            key = (path, tuple(sorted(query.items())), self.loads)
+
+        response = self.Cached(key)
+        if response is not None:
+            return response
+
+        with self.cache_lock:
+            lock = self.key_locks.setdefault(key, threading.Lock())
+
+        try:
+            with lock:
+                # Requests for the same thing that came in together wait here, then take the first one's response
+                response = self.Cached(key)
+                if response is not None:
+                    return response
+                response = ENDPOINTS[path](dset, query)
+
+                # Stored before the lock is let go, so the requests waiting on it find it
+                with self.cache_lock:
+                    self.misses += 1
+                    self.responses[key] = response
+                    self.responses.move_to_end(key)
+                    while len(self.responses) > self.cache_size:
+                        self.responses.popitem(last = False)
+        finally:
+            # A later request for the key finds the response cached, or makes a new lock if it was evicted
+            with self.cache_lock:
+                if self.key_locks.get(key) is lock:
+                    del self.key_locks[key]
+
+        return response
+
+    def Cached(self, key):
+        """Gets a response from the cache, marking it as the most recently used
+
+        Returns:
+            tuple: content type and body, or None when it is not cached
+        """
+        with self.cache_lock:
+            if key not in self.responses:
+                return None
+            self.responses.move_to_end(key)
+            self.hits += 1
+            return self.responses[key]
+
+    def Status(self):
+        """Files, records, DataSet version and cache counts, as JSON
+        """
+        dset = self.dset
+        status = {
+            'root': self.root,
+            'files': self.stamp[0],
+            'records': int(dset.stats.count.sum()),
+            'quarantined': self.quarantined,
+            'materials': list(dset.col_indeces),
+            'anneal_types': list(dset.row_indeces),
+            'keys': dset.keys,
+            'groups': dset.n_groups,
+            'version': dset.version,
+            'loads': self.loads,
+            'cache': {'size': len(self.responses), 'hits': self.hits, 'misses': self.misses}
+        }
+        return json.dumps(status).encode()
+
+def GroupTable(dset, array):
+    """Lays out one value per group as anneal type -> material -> value, nested further by the dataset's other keys
+
+    Only groups with records are listed.
+    """
+    table = {}
+    for group in dset.DisplayOrder():
+        key = dset.Key(group)
+        names = [key['anneal'], key['material']] + [key[name] for name in dset.keys[2:]]
+        level = table
+        for name in names[:-1]:
+            level = level.setdefault(name, {})
+        level[names[-1]] = array[group]
+
+    return table
+
+def StatsEndpoint(dset, query):
+    import PepTo3
+
+    parameter = query.get('parameter', 'S Parameter')
+    statistic = query.get('statistic', 'mean')
+
+    if parameter not in dset.depth_indeces:
+        raise QueryError(400, f"Key ({parameter}) was not found, enter one of the options: {list(dset.depth_indeces)}")
+    if statistic not in PepTo3.STATISTICS:
+        raise QueryError(400, f"Statistic ({statistic}) is not available, enter one of the options: {list(PepTo3.STATISTICS)}")
+
+    depth = dset.depth_indeces[parameter]
+    if depth == dset.depth - 1:
+        values = dset.stats.count.astype(np.float64)
+    else:
+        values = dset.StatisticTable(statistic)[:, depth]
+
+    result = {
+        'parameter': parameter,
+        'statistic': statistic,
+        'values': GroupTable(dset, Finite(np.where(dset.stats.count > 0, values, np.nan))),
+        'counts': GroupTable(dset, dset.stats.count.tolist())
+    }
+    return 'application/json', json.dumps(result).encode()
+
+def FitEndpoint(dset, query):
+    from PepToFit import FIT_METHODS
+
+    method = query.get('method', 'ols')
+    if method not in FIT_METHODS:
+        raise QueryError(400, f"Fit method ({method}) is not available, enter one of the options: {FIT_METHODS}")
+
+    try:
+        fit = dset.FitSvW(method)
+    except ValueError as error:
+        raise QueryError(400, str(error).strip())
+
+    columns = {name: Finite(np.asarray(fit[name], dtype = np.float64)) for name in ('slope', 'intercept', 'r_squared')}
+    columns['n'] = [int(n) for n in fit['n']]
+    columns['converged'] = [bool(converged) for converged in fit['converged']]
+
+    result = {
+        'method': method,
+        'fits': GroupTable(dset, [{name: columns[name][group] for name in columns} for group in range(dset.n_groups)])
+    }
+    return 'application/json', json.dumps(result).encode()
+
+def GroupsEndpoint(dset, query):
+    parameter = query.get('parameter', 'S Parameter')
+    statistic = query.get('statistic', 'mean')
+    keys = None if query.get('by', '') == '' else query['by'].split(',')
+
+    try:
+        rows = dset.Table(parameter, statistic, keys)
+    except IndexError as error:
+        raise QueryError(400, str(error).strip())
+
+    # NaN (e.g. a weighted mean without any weights) is not JSON
+    for row in rows:
+        row[statistic] = Finite([row[statistic]])[0]
+
+    result = {'parameter': parameter, 'statistic': statistic, 'keys': dset.keys if keys is None else keys, 'groups': rows}
+    return 'application/json', json.dumps(result).encode()
+
+def PlotEndpoint(kind):
+    """Makes the endpoint rendering one kind of plot to PNG
+    """
+    def Render(dset, query):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        try:
+            dpi = int(query.get('dpi', 100))
+        except ValueError:
+            raise QueryError(400, f"dpi ({query['dpi']}) is not a whole number")
+        if not 10 <= dpi <= MAX_DPI:
+            raise QueryError(400, f"dpi ({dpi}) must be between 10 and {MAX_DPI}")
+
+        # A plain Agg figure per request, pyplot is never touched off the main thread
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        try:
+            if kind == 'box':
+                dset.BoxPlots(fig)
+            else:
+                draw = dset.SvW if kind == 'svw' else dset.SvWDensity
+                draw(query.get('trendline', '1') not in ('0', 'false'), method = query.get('method', 'ols'), fig = fig)
+        except ValueError as error:
+            raise QueryError(400, str(error).strip())
+
+        image = io.BytesIO()
+        fig.savefig(image, format = 'png', dpi = dpi)
+        return 'image/png', image.getvalue()
+
+    return Render
+
+# Endpoint path -> function answering it from a DataSet and the query parameters
+ENDPOINTS = {
+    '/stats': StatsEndpoint,
+    '/fit': FitEndpoint,
+    '/groups': GroupsEndpoint,
+    '/plot/svw.png': PlotEndpoint('svw'),
+    '/plot/box.png': PlotEndpoint('box'),
+    '/plot/density.png': PlotEndpoint('density')
+}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # Set on the subclass made by MakeServer
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            content_type, body = self.service.Query(url.path.rstrip('/') or '/status', dict(parse_qsl(url.query)))
+            status = 200
+        except QueryError as error:
+            content_type, body, status = 'application/json', json.dumps({'error': str(error)}).encode(), error.status
+        except Exception as error:
+            # Anything else (a reload hitting a corrupt file, a plot failing) still gets an answer
+            message = f"{type(error).__name__}: {str(error).strip()}"
+            content_type, body, status = 'application/json', json.dumps({'error': message}).encode(), 500
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        return None
+
+    def log_message(self, format, *args):
+        # Requests are not logged, so a busy service doesn't flood the console
+        return None
+
+def MakeServer(service, host = HOST, port = PORT):
+    """Makes a threaded HTTP server answering from a QueryService, one thread per request
+
+    Args:
+        service (QueryService): the loaded service
+        host (string): address to listen on, the default only accepts connections from this machine
+        port (int): port to listen on, 0 picks a free one (see server.server_address)
+
+    Returns:
+        ThreadingHTTPServer: the server, not yet serving
+    """
+    handler = type('BoundQueryHandler', (QueryHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    return server
+
+def StartServer(service, host = HOST, port = 0):
+    """Serves a QueryService from a background thread, e.g. to query it from the same process
+
+    Args:
+        service (QueryService): the loaded service
+        host (string): address to listen on
+        port (int): Default 0 picks a free port
+
+    Returns:
+        tuple: the server (call server.shutdown() to stop it) and its base url, e.g. 'http://127.0.0.1:54321'
+    """
+    server = MakeServer(service, host, port)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server, f"http://{server.server_address[0]}:{server.server_address[1]}"
+
+def Serve(root = None, materials = None, host = HOST, port = PORT, quality = DEFAULT_QUALITY, cache_size = CACHE_SIZE, check_interval = CHECK_INTERVAL, workers = None, keys = None):
+    """Loads the pappy files below root and serves queries on them until interrupted
+
+    Returns:
+        None
+    """
+    service = QueryService(root, materials, quality, cache_size, check_interval, workers, keys)
+    server = MakeServer(service, host, port)
+    print(f"Serving {int(service.dset.stats.count.sum())} records from '{service.root}' on http://{host}:{server.server_address[1]}")
+    if quality != 'none':
+        print(f"Quality checks on ('{quality}'): {service.quarantined} records quarantined and left out of every response")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return None
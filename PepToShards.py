@@ -0,0 +1,177 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Map-reduce ingest of several data roots for PepTo, one shard per root
+"""
+from PappyCache import ManifestCache, CACHE_NAME
+from PepToQuality import QualityCheck
+import concurrent.futures
+import numpy as np
+import json
+import time
+import os
+
+# Ingest report counts summed over the shards, the seconds are not as the shards run at the same time
+REPORT_TOTALS = ['files', 'skipped', 'rejected', 'quarantined']
+
+def SummarizeRoot(job):
+    """Reads every pappy file below one root into its own DataSet and summarizes it, run in a worker process
+
+    Args:
+        job (tuple): (root, materials, keep_samples, (method, threshold, min_group_size) of the quality checks or None, use the root's parse cache, readers per shard, other keys to group by)
+
+    Returns:
+        tuple: the DataSet.Summary() of the shard and its QualityCheck report (None without quality checks)
+    """
+    import PepTo3
+
+    root, materials, keep_samples, settings, use_cache, workers, keys = job
+
+    dset = PepTo3.DataSet(materials, keep_samples = keep_samples, keys = keys)
+    quality = None if settings is None else QualityCheck(*settings)
+    cache = ManifestCache(os.path.join(root, CACHE_NAME)) if use_cache else None
+
+    dset.FillDataSet(PepTo3.GetDirectories(root), workers = workers, cache = cache, root = root, quality = quality)
+
+    return dset.Summary(), None if quality is None else quality.Report()
+
+def ReduceSummaries(summaries, seconds = None):
+    """Merges shard summaries, in order, into one DataSet
+
+    Args:
+        summaries (list): DataSet.Summary() of every shard
+        seconds (float): wall time of the whole ingest, default None takes the slowest shard's (the shards ran side by side)
+
+    Raises:
+        ValueError: If there are no summaries, or they are over different materials, anneal types or keys
+
+    Returns:
+        DataSet: the merged dataset, its ingest report counts are the sums of the shards'
+    """
+    import PepTo3
+
+    if len(summaries) == 0:
+        raise ValueError("\nThere are no shard summaries to reduce")
+
+    dset = PepTo3.FromSummary(summaries[0])
+    for summary in summaries[1:]:
+        dset.Merge(PepTo3.FromSummary(summary))
+
+    reports = [summary['ingest_report'] for summary in summaries if summary['ingest_report'] is not None]
+    report = {key: sum(shard.get(key, 0) for shard in reports) for key in REPORT_TOTALS}
+    report['seconds'] = max((shard['seconds'] for shard in reports), default = 0.0) if seconds is None else seconds
+    report['files_per_second'] = report['files'] / report['seconds'] if report['seconds'] > 0 else 0.0
+    report['shards'] = len(summaries)
+    dset.ingest_report = report
+
+    return dset
+
+def MapReduceRoots(roots, materials, keep_samples = True, quality = None, use_cache = False, processes = None, workers = None, keys = None):
+    """Ingests several data roots as independent shards in a process pool, then merges them into one DataSet
+
+    Every root is read by its own worker process into a partial DataSet, which comes back as a plain summary of
+    its statistics, fit moments and samples. The summaries are merged in the order of roots, which gives exactly
+    the DataSet of FillRoots (the same roots read one after another in this process), bit for bit.
+
+    Args:
+        roots (list): folders to read the pappy files below, one shard each
+        materials (list): materials analyzed
+        keep_samples (bool): Default 'True' keeps the samples, if 'False' only the statistics are sent back and merged
+        quality (QualityCheck): Default 'None' stops on the first file that can't be read, otherwise every shard runs the same checks (method, threshold and min_group_size, outliers judged within each root) and the results are added to it
+        use_cache (bool): Default 'False' parses every file, if 'True' each root keeps its own parse cache
+        processes (int): Default 'None' uses one process per root up to the number of CPUs, 1 runs the shards in this process
+        workers (int): Default 'None' reads each shard's files serially, otherwise the number of parallel readers in every shard
+        keys (list): Default 'None' groups by material and anneal type only, otherwise other keys tagged in the file names to group by too
+
+    Returns:
+        DataSet: the merged dataset, with the per-shard ingest reports in ingest_report['reports']
+    """
+    start = time.perf_counter()
+
+    # The shards rebuild the check from its settings, its results so far stay here
+    settings = None if quality is None else (quality.method, quality.threshold, quality.min_group_size)
+    jobs = [(root, materials, keep_samples, settings, use_cache, workers, keys) for root in roots]
+
+    if processes is None:
+        processes = min(len(jobs), os.cpu_count() or 1)
+
+    if processes <= 1 or len(jobs) <= 1:
+        results = [SummarizeRoot(job) for job in jobs]
+    else:
+        # map() hands the results back in the order of roots, whichever shard finishes first
+        with concurrent.futures.ProcessPoolExecutor(max_workers = processes) as pool:
+            results = list(pool.map(SummarizeRoot, jobs))
+
+    dset = ReduceSummaries([summary for summary, _ in results], time.perf_counter() - start)
+    dset.ingest_report['reports'] = {root: summary['ingest_report'] for root, (summary, _) in zip(roots, results)}
+
+    if quality is not None:
+        for _, report in results:
+            quality.AddReport(report)
+
+    return dset
+
+def FillRoots(roots, materials, keep_samples = True, quality = None, workers = None, keys = None):
+    """Reads several data roots one after another into one DataSet in this process, the reference MapReduceRoots matches
+
+    Args:
+        roots (list): folders to read the pappy files below
+        materials (list): materials analyzed
+        keep_samples (bool): Default 'True' keeps the samples, if 'False' only the statistics
+        quality (QualityCheck): Default 'None' stops on the first file that can't be read, otherwise checks each root as one batch
+        workers (int): Default 'None' reads the files serially, otherwise the number of parallel readers
+        keys (list): Default 'None' groups by material and anneal type only, otherwise other keys to group by too
+
+    Returns:
+        DataSet: the filled dataset
+    """
+    import PepTo3
+
+    dset = PepTo3.DataSet(materials, keep_samples = keep_samples, keys = keys)
+    for root in roots:
+        dset.FillDataSet(PepTo3.GetDirectories(root), workers = workers, root = root, quality = quality)
+
+    return dset
+
+def SaveSummary(summary, path):
+    """Writes a DataSet.Summary() to one uncompressed .npz file, e.g. to reduce shards summarized on other machines
+
+    Args:
+        summary (dictionary): the summary
+        path (string): file to write
+
+    Returns:
+        string: path of the file
+    """
+    arrays = {f"stats_{name}": array for name, array in summary['stats'].items()}
+    arrays.update({f"fit_{name}": array for name, array in summary['fit_stats'].items()})
+    for key in ('group_keys', 'values', 'groups'):
+        if summary[key] is not None:
+            arrays[key] = summary[key]
+
+    # Everything that isn't an array goes in a JSON header
+    header = {key: summary[key] for key in ('format', 'materials', 'anneal_types', 'keys', 'categories', 'ingest_report')}
+    arrays['header'] = np.array(json.dumps(header))
+
+    with open(path, 'wb') as file:
+        np.savez(file, **arrays)
+
+    return path
+
+def LoadSummary(path):
+    """Reads a summary written by SaveSummary
+
+    Args:
+        path (string): the .npz file
+
+    Returns:
+        dictionary: the summary, ready for ReduceSummaries or PepTo3.FromSummary
+    """
+    with np.load(path) as data:
+        summary = json.loads(str(data['header']))
+        summary['stats'] = {name[len('stats_'):]: data[name] for name in data.files if name.startswith('stats_')}
+        summary['fit_stats'] = {name[len('fit_'):]: data[name] for name in data.files if name.startswith('fit_')}
+        for key in ('group_keys', 'values', 'groups'):
+            summary[key] = data[key] if key in data.files else None
+
+    return summary
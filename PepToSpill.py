@@ -0,0 +1,110 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+On-disk sample store for PepTo, so the samples of archives larger than memory can still be plotted
+"""
+import numpy as np
+import glob
+import os
+
+# Suffix of the raw float64 files, so Clear() only ever removes files this store wrote
+SPILL_SUFFIX = '.f64'
+
+class SpillStore(object):
+    def __init__(self, folder, n_groups, parameters):
+        """Appends the samples of every group to raw column files instead of memory
+
+        Each (group, parameter) pair is its own raw float64 file, appended to batch by batch. Reading a group back
+        memory maps just that file, so the samples are paged in from disk only while they are being used (e.g. by
+        the box plots) and memory stays flat however many records are spilled.
+
+        Args:
+            folder (string): folder for the column files, any files left by an earlier store are removed
+            n_groups (int): number of groups to start with, see Resize()
+            parameters (list): parameter names, in the column order of the values added
+        """
+        self.folder = folder
+        self.parameters = parameters
+
+        # Column files of every group, and the records spilled to every group so far
+        self.file_names = []
+        self.counts = np.zeros(0, dtype = np.int64)
+        self.Resize(n_groups)
+
+        os.makedirs(self.folder, exist_ok = True)
+        self.Clear()
+
+        return None
+
+    def Resize(self, n_groups):
+        """Adds empty groups at the end, e.g. when a new combination of keys shows up
+
+        Args:
+            n_groups (int): new number of groups, no smaller than the current one
+
+        Returns:
+            None
+        """
+        # Column files are named after the group and parameter, e.g. group 3 'S Parameter' -> 'group_0003_s_parameter.f64'
+        for group in range(len(self.file_names), n_groups):
+            self.file_names.append([f"group_{group:04d}_{parameter.lower().replace(' ', '_')}{SPILL_SUFFIX}" for parameter in self.parameters])
+
+        if n_groups > len(self.counts):
+            self.counts = np.concatenate((self.counts, np.zeros(n_groups - len(self.counts), dtype = np.int64)))
+
+        return None
+
+    def Clear(self):
+        """Removes every spilled column file and resets the counts
+
+        Returns:
+            None
+        """
+        for path in glob.glob(os.path.join(self.folder, 'group_*' + SPILL_SUFFIX)):
+            os.remove(path)
+
+        self.counts[:] = 0
+
+        return None
+
+    def Append(self, values, groups):
+        """Appends a batch of records to the column files of their groups
+
+        Args:
+            values (array): (n, n_parameters) array of the parameters
+            groups (array): n group indeces
+
+        Returns:
+            None
+        """
+        # Sort the batch by group so every group's records are written in one piece, keeping their order
+        order = np.argsort(groups, kind = 'stable')
+        values = values[order]
+        counts = np.bincount(groups, minlength = len(self.counts))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        for group in np.flatnonzero(counts):
+            block = values[offsets[group]:offsets[group + 1]]
+            for depth, file_name in enumerate(self.file_names[group]):
+                with open(os.path.join(self.folder, file_name), 'ab') as file:
+                    file.write(np.ascontiguousarray(block[:, depth]).tobytes())
+
+        self.counts += counts
+
+        return None
+
+    def Group(self, group, depth):
+        """Memory maps one parameter of one group read-only
+
+        Args:
+            group (int): group index
+            depth (int): parameter index
+
+        Returns:
+            array: the group's samples of the parameter, in the order they were added
+        """
+        if self.counts[group] == 0:
+            return np.empty(0, dtype = np.float64)
+
+        path = os.path.join(self.folder, self.file_names[group][depth])
+        return np.memmap(path, dtype = np.float64, mode = 'r', shape = (int(self.counts[group]),))
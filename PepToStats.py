@@ -0,0 +1,253 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Streaming statistics for PepTo
+"""
+import numpy as np
+
+# Parameter index -> index of its uncertainty, for the uncertainty weighted means
+# (S Parameter, Left W Parameter and Right W Parameter are weighted by their own uncertainties)
+UNCERTAINTY_PAIRS = {0: 1, 2: 3, 4: 5}
+
+# Accumulators making up the state of a GroupStatistics, see State() and LoadState()
+STATE = ['count', 'mean', 'm2', 'minimum', 'maximum', 'weighted_sum', 'weight_total']
+
+class GroupStatistics(object):
+    def __init__(self, n_groups, n_parameters, uncertainty_pairs = UNCERTAINTY_PAIRS):
+        """One-pass accumulators of count, mean, variance, min/max and uncertainty weighted mean for every group and parameter
+
+        Memory is fixed by the number of groups and parameters, not by the number of records. Records are added with
+        Welford's update (Chan's form for a batch), and two accumulators over different records merge into the same
+        result as one accumulator over all of them.
+
+        Args:
+            n_groups (int): number of groups (e.g. anneal types * materials)
+            n_parameters (int): number of parameters per record
+            uncertainty_pairs (dictionary): parameter index -> index of the uncertainty used to weight it
+        """
+        self.n_groups = n_groups
+        self.n_parameters = n_parameters
+        self.uncertainty_pairs = dict(uncertainty_pairs)
+
+        self.count = np.zeros(n_groups, dtype = np.int64)
+        self.mean = np.zeros((n_groups, n_parameters), dtype = np.float64)
+        self.m2 = np.zeros((n_groups, n_parameters), dtype = np.float64) # Sum of squared deviations from the mean
+        self.minimum = np.full((n_groups, n_parameters), np.inf)
+        self.maximum = np.full((n_groups, n_parameters), -np.inf)
+
+        # Running sums of w * x and w with w = 1 / uncertainty^2, only used for the parameters in uncertainty_pairs
+        self.weighted_sum = np.zeros((n_groups, n_parameters), dtype = np.float64)
+        self.weight_total = np.zeros((n_groups, n_parameters), dtype = np.float64)
+
+        return None
+
+    def Add(self, values, groups):
+        """Adds a batch of records
+
+        Args:
+            values (array): (n, n_parameters) parameters of the records
+            groups (array): n group indeces
+
+        Returns:
+            None: Returns None, but updates the accumulators
+        """
+        values = np.asarray(values, dtype = np.float64).reshape(-1, self.n_parameters)
+        groups = np.asarray(groups, dtype = np.intp)
+
+        if len(values) == 0:
+            return None
+
+        # Summarize the batch on its own first
+        batch = GroupStatistics(self.n_groups, self.n_parameters, self.uncertainty_pairs)
+        batch.count = np.bincount(groups, minlength = self.n_groups)
+        filled = batch.count > 0
+
+        for parameter in range(self.n_parameters):
+            column = values[:, parameter]
+            sums = np.bincount(groups, weights = column, minlength = self.n_groups)
+            batch.mean[filled, parameter] = sums[filled] / batch.count[filled]
+            deviations = column - batch.mean[groups, parameter]
+            batch.m2[:, parameter] = np.bincount(groups, weights = deviations * deviations, minlength = self.n_groups)
+
+        np.minimum.at(batch.minimum, groups, values)
+        np.maximum.at(batch.maximum, groups, values)
+
+        for parameter, uncertainty in self.uncertainty_pairs.items():
+            sigma = values[:, uncertainty]
+            # Records without a positive uncertainty carry no weight
+            weights = np.divide(1.0, sigma * sigma, out = np.zeros_like(sigma), where = sigma > 0)
+            batch.weighted_sum[:, parameter] = np.bincount(groups, weights = weights * values[:, parameter], minlength = self.n_groups)
+            batch.weight_total[:, parameter] = np.bincount(groups, weights = weights, minlength = self.n_groups)
+
+        # Then fold it into the running totals
+        self.Merge(batch)
+
+        return None
+
+    def Merge(self, other):
+        """Merges the accumulators of another GroupStatistics over the same groups into this one
+
+        Args:
+            other (GroupStatistics): accumulators over other records, e.g. from another worker
+
+        Raises:
+            ValueError: If the shapes of the accumulators don't match
+
+        Returns:
+            None: Returns None, but updates the accumulators
+        """
+        if (other.n_groups, other.n_parameters) != (self.n_groups, self.n_parameters):
+            message = f"\nCannot merge statistics of shape {(other.n_groups, other.n_parameters)} into {(self.n_groups, self.n_parameters)}"
+            raise ValueError(message)
+
+        count = self.count + other.count
+        filled = count > 0
+
+        # Weights of the other side in the combined mean, zero for groups with no records on either side
+        fraction = np.zeros(self.n_groups, dtype = np.float64)
+        fraction[filled] = other.count[filled] / count[filled]
+
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * fraction[:, None]
+        self.m2 = self.m2 + other.m2 + delta * delta * (self.count * fraction)[:, None]
+        self.count = count
+
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.weighted_sum = self.weighted_sum + other.weighted_sum
+        self.weight_total = self.weight_total + other.weight_total
+
+        return None
+
+    def Resize(self, n_groups):
+        """Adds empty groups at the end, e.g. when a new combination of keys shows up
+
+        Args:
+            n_groups (int): new number of groups, no smaller than the current one
+
+        Returns:
+            None: Returns None, but grows the accumulators
+        """
+        extra = n_groups - self.n_groups
+        if extra <= 0:
+            return None
+
+        empty = GroupStatistics(extra, self.n_parameters, self.uncertainty_pairs)
+        for name in STATE:
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(empty, name))))
+        self.n_groups = n_groups
+
+        return None
+
+    def Expand(self, mapping, n_groups):
+        """Moves every group to a new index among more groups, the others left empty, e.g. to merge groups numbered differently
+
+        Args:
+            mapping (array): new index of every current group, no two the same
+            n_groups (int): number of new groups
+
+        Returns:
+            GroupStatistics: the same accumulators at their new indeces
+        """
+        expanded = GroupStatistics(n_groups, self.n_parameters, self.uncertainty_pairs)
+        for name in STATE:
+            getattr(expanded, name)[mapping] = getattr(self, name)
+
+        return expanded
+
+    def Reduce(self, mapping, n_groups):
+        """Merges groups together, e.g. to roll (material, anneal type, temperature) groups up to (material,)
+
+        Args:
+            mapping (array): new group of every current group
+            n_groups (int): number of new groups
+
+        Returns:
+            GroupStatistics: accumulators of the new groups, as if their records had been added to them directly
+        """
+        mapping = np.asarray(mapping, dtype = np.intp)
+        reduced = GroupStatistics(n_groups, self.n_parameters, self.uncertainty_pairs)
+        reduced.count = np.bincount(mapping, self.count, n_groups).astype(np.int64)
+        filled = reduced.count > 0
+
+        for parameter in range(self.n_parameters):
+            # Chan's merge of many groups at once: pooled mean, then the spread of the group means about it
+            sums = np.bincount(mapping, self.count * self.mean[:, parameter], n_groups)
+            reduced.mean[filled, parameter] = sums[filled] / reduced.count[filled]
+            deviations = self.mean[:, parameter] - reduced.mean[mapping, parameter]
+            reduced.m2[:, parameter] = np.bincount(mapping, self.m2[:, parameter] + self.count * deviations * deviations, n_groups)
+            reduced.weighted_sum[:, parameter] = np.bincount(mapping, self.weighted_sum[:, parameter], n_groups)
+            reduced.weight_total[:, parameter] = np.bincount(mapping, self.weight_total[:, parameter], n_groups)
+
+        np.minimum.at(reduced.minimum, mapping, self.minimum)
+        np.maximum.at(reduced.maximum, mapping, self.maximum)
+
+        return reduced
+
+    def Mean(self):
+        """Mean of every group and parameter, NaN for empty groups
+
+        Returns:
+            array: (n_groups, n_parameters) means
+        """
+        return np.where(self.count[:, None] > 0, self.mean, np.nan)
+
+    def Variance(self, ddof = 1):
+        """Variance of every group and parameter, NaN where there are not enough records
+
+        Args:
+            ddof (int): Default 1 gives the sample variance, 0 the population variance
+
+        Returns:
+            array: (n_groups, n_parameters) variances
+        """
+        dof = (self.count - ddof).astype(np.float64)[:, None]
+        return np.divide(self.m2, dof, out = np.full_like(self.m2, np.nan), where = dof > 0)
+
+    def StandardDeviation(self, ddof = 1):
+        return np.sqrt(self.Variance(ddof))
+
+    def WeightedMean(self):
+        """Uncertainty weighted mean (sum of x / sigma^2 over sum of 1 / sigma^2) of every group and parameter
+
+        Returns:
+            array: (n_groups, n_parameters) weighted means, NaN for unweighted parameters and empty groups
+        """
+        return np.divide(self.weighted_sum, self.weight_total, out = np.full_like(self.weighted_sum, np.nan), where = self.weight_total > 0)
+
+    def WeightedMeanUncertainty(self):
+        """Uncertainty of the weighted mean, 1 / sqrt(sum of 1 / sigma^2)
+
+        Returns:
+            array: (n_groups, n_parameters) uncertainties, NaN for unweighted parameters and empty groups
+        """
+        return np.divide(1.0, np.sqrt(self.weight_total), out = np.full_like(self.weight_total, np.nan), where = self.weight_total > 0)
+
+    def State(self):
+        """Gets the accumulators as plain arrays, e.g. to send them to another process or save them
+
+        Returns:
+            dictionary: name -> array of every accumulator
+        """
+        return {name: getattr(self, name).copy() for name in STATE}
+
+    def LoadState(self, state):
+        """Replaces the accumulators with ones from State()
+
+        Args:
+            state (dictionary): name -> array, as from State()
+
+        Raises:
+            ValueError: If the shapes don't match this GroupStatistics
+
+        Returns:
+            None
+        """
+        if np.shape(state['mean']) != (self.n_groups, self.n_parameters):
+            message = f"\nCannot load statistics of shape {np.shape(state['mean'])} into {(self.n_groups, self.n_parameters)}"
+            raise ValueError(message)
+
+        for name in STATE:
+            setattr(self, name, np.array(state[name], dtype = getattr(self, name).dtype))
+
+        return None
@@ -0,0 +1,289 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Live watch mode for PepTo, ingesting new pappy.csv files as they land during a beam session
+"""
+from PappyFiles import CompilePatterns, MatchesAny, PappyIndex, TAGGED_PATTERN
+import PepTo3
+import time
+import os
+
+# A folder modified this close to when it was last listed is listed again on the next poll, a file created in the
+# same timestamp tick as the listing (2 s on FAT, 1 s on some network filesystems) leaves its modification time alone
+RACY_SECONDS = 2.0
+
+class Watcher(object):
+    def __init__(self, dset, root = None, include = ('*_pappy.csv',), settle_polls = 1, workers = None, ingest_existing = True):
+        """Polls a data root and adds new pappy.csv files to an existing DataSet
+
+        The tree is walked once up front. After that, every poll only stats the known folders: a folder whose
+        modification time changed, or that was modified within RACY_SECONDS of its last listing, is listed again and
+        its entry names are checked against the files already known; any folders new inside it are added. Files are
+        therefore found without rescanning the whole tree, and only the new files are read. The DataSet's statistics
+        and fit moments update incrementally as the records are added.
+
+        Args:
+            dset (DataSet): dataset to add the new records to
+            root (string): folder to watch, default None uses the current working directory
+            include (list): glob patterns of the files to ingest
+            settle_polls (int): number of polls a new file's size and modification time must stay the same before it is read, so files still being written are not read half way (0 reads them right away)
+            workers (int): number of parallel readers passed on to FillDataSet
+            ingest_existing (bool): Default 'True' ingests the files already in the tree on the first poll, if 'False' only files landing later are ingested
+        """
+        self.dset = dset
+        self.root = os.getcwd() if root is None else root
+        self.include = CompilePatterns(include)
+        self.settle_polls = settle_polls
+        self.workers = workers
+
+        # Folder (relative to root, '' for root itself) -> (modification time, time it was last listed) in ns
+        self.folders = {}
+        # Files seen so far, relative to root
+        self.known = set()
+        # New files waiting to settle, path -> [(mtime, size), polls unchanged]
+        self.pending = {}
+        # Files that could not be ingested, path -> error message
+        self.failed = {}
+        # Files read by no poll because the DataSet doesn't analyze them, path -> reason
+        self.ignored = {}
+
+        # Functions called as callback(dset, new_files) after every poll that added records
+        self.callbacks = []
+
+        self.polls = 0
+        self.ingested = 0
+
+        # Register the existing tree, queueing its files only when they are to be ingested
+        self.ScanFolder('', queue = ingest_existing)
+
+        return None
+
+    def ScanFolder(self, folder, queue = True):
+        """Lists one folder, registering its new subfolders (recursively) and new files
+
+        Args:
+            folder (string): folder relative to root
+            queue (bool): Default 'True' queues the new files to be ingested, if 'False' they are only marked as known
+
+        Returns:
+            int: number of new files found
+        """
+        absolute = os.path.join(self.root, folder)
+        found = 0
+
+        try:
+            # The listing time is taken first, so a file landing during the listing counts as racy
+            listed = time.time_ns()
+            self.folders[folder] = (os.stat(absolute).st_mtime_ns, listed)
+            entries = os.scandir(absolute)
+        except OSError:
+            # The folder went away between the stat and the listing
+            self.folders.pop(folder, None)
+            return 0
+
+        with entries:
+            for entry in entries:
+                relative_path = folder + entry.name
+
+                if entry.is_dir(follow_symlinks = False):
+                    if relative_path + '/' not in self.folders:
+                        found += self.ScanFolder(relative_path + '/', queue)
+                elif relative_path not in self.known and MatchesAny(entry.name, relative_path, self.include):
+                    self.known.add(relative_path)
+                    found += 1
+                    if queue:
+                        self.pending[relative_path] = [None, 0]
+
+        return found
+
+    def Poll(self):
+        """Checks the tree once for new files and ingests the ones that have settled
+
+        Returns:
+            list: files whose records were added to the DataSet by this poll
+        """
+        self.polls += 1
+
+        # Only the folders whose modification time changed, or could have changed within the same tick, are listed again
+        for folder, (mtime, listed) in list(self.folders.items()):
+            try:
+                current = os.stat(os.path.join(self.root, folder)).st_mtime_ns
+            except OSError:
+                self.folders.pop(folder, None)
+                continue
+
+            if current != mtime or listed - current < RACY_SECONDS * 1e9:
+                self.ScanFolder(folder)
+
+        ready = self.SettledFiles()
+        if len(ready) == 0:
+            return []
+
+        added = self.Ingest(ready)
+
+        if len(added) > 0:
+            for callback in self.callbacks:
+                callback(self.dset, added)
+
+        return added
+
+    def SettledFiles(self):
+        """Moves the pending files whose size and modification time held still long enough out of the queue
+
+        Returns:
+            list: files ready to be read
+        """
+        ready = []
+
+        for path, state in list(self.pending.items()):
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                # The file was removed before it was read
+                del self.pending[path]
+                self.known.discard(path)
+                continue
+
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            state[1] = state[1] + 1 if stamp == state[0] else 0
+            state[0] = stamp
+
+            if state[1] >= self.settle_polls:
+                ready.append(path)
+                del self.pending[path]
+
+        return ready
+
+    def Ingest(self, paths):
+        """Adds files to the DataSet, setting aside any that fail to read instead of stopping
+
+        Files the DataSet would skip (other materials or anneal types) or reject (names not following the pappy
+        pattern) are never read, and are listed in self.ignored instead of being reported as added.
+
+        Args:
+            paths (list): files relative to root
+
+        Returns:
+            list: files whose records were added
+        """
+        index = PappyIndex(paths, TAGGED_PATTERN)
+        selected, _, _ = self.dset.SelectIndexed(index)
+        wanted = [index.paths[position] for position in selected]
+
+        for path in index.rejected:
+            self.ignored[path] = 'name does not follow the pappy pattern'
+        for path in set(index.paths).difference(wanted):
+            self.ignored[path] = 'material or anneal type not analyzed'
+
+        if len(wanted) == 0:
+            return []
+
+        try:
+            self.dset.FillDataSet(wanted, workers = self.workers, root = self.root)
+            added = wanted
+        except (OSError, ValueError, IndexError, StopIteration):
+            # Fall back to one file at a time to find the ones that fail
+            added = []
+            for path in wanted:
+                try:
+                    self.dset.FillDataSet([path], root = self.root)
+                    added.append(path)
+                except (OSError, ValueError, IndexError, StopIteration) as error:
+                    self.failed[path] = f"{type(error).__name__}: {error}"
+
+        self.ingested += len(added)
+
+        return added
+
+    def Run(self, interval = 2.0, duration = None, max_polls = None):
+        """Polls until stopped with Ctrl+C, or until the duration or number of polls runs out
+
+        Args:
+            interval (float): seconds between polls
+            duration (float): Default 'None' runs until stopped, otherwise the seconds to run for
+            max_polls (int): Default 'None' runs until stopped, otherwise the number of polls to make
+
+        Returns:
+            int: number of files ingested
+        """
+        start = time.monotonic()
+
+        try:
+            while True:
+                self.Poll()
+
+                if max_polls is not None and self.polls >= max_polls:
+                    break
+                if duration is not None and time.monotonic() - start >= duration:
+                    break
+
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+        return self.ingested
+
+def ConsoleRefresh(depth_index = 'S Parameter'):
+    """Makes a callback that reprints the DataSet table after each poll that added records
+
+    Args:
+        depth_index (string): parameter to show, as in DataSet.DisplayData
+
+    Returns:
+        callable: the callback
+    """
+    def Refresh(dset, new_files):
+        print(f"\n{time.strftime('%H:%M:%S')} - {len(new_files)} new pappy files")
+        dset.DisplayData(depth_index)
+        return None
+
+    return Refresh
+
+def PlotRefresh(fig, trendline = True):
+    """Makes a callback that redraws the S vs. W plot into the same figure after each poll that added records
+
+    Args:
+        fig (Figure): figure to draw into, e.g. plt.figure() shown with plt.ion()
+        trendline (bool): Default 'True' draws the fit lines
+
+    Returns:
+        callable: the callback
+    """
+    def Refresh(dset, new_files):
+        dset.SvW(trendline, fig = fig)
+        fig.canvas.draw_idle()
+        fig.canvas.flush_events()
+        return None
+
+    return Refresh
+
+def main(root = None, interval = 2.0, plot = True):
+    """Watches a data root, printing the table and redrawing the S vs. W plot as files land
+
+    Args:
+        root (string): folder to watch, default None uses the current working directory
+        interval (float): seconds between polls
+        plot (bool): Default 'True' keeps a live S vs. W figure open
+    """
+    dset = PepTo3.DataSet(['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead'])
+    watcher = Watcher(dset, root, workers = PepTo3.DEFAULT_WORKERS)
+    watcher.callbacks.append(ConsoleRefresh())
+
+    if plot:
+        import matplotlib.pyplot as plt
+        plt.ion()
+        watcher.callbacks.append(PlotRefresh(plt.figure()))
+
+    print(f"Watching '{watcher.root}' for new pappy files, press Ctrl+C to stop")
+    watcher.Run(interval)
+
+    print(f"\nIngested {watcher.ingested} pappy files in {watcher.polls} polls")
+    for path, error in watcher.failed.items():
+        print(f"Could not read '{path}': {error}")
+    if len(watcher.ignored) > 0:
+        print(f"Ignored {len(watcher.ignored)} files of other materials or anneal types, or badly named")
+
+    return None
+
+if __name__ == '__main__':
+    main()
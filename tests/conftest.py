@@ -0,0 +1,13 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Shared setup of the PepTo tests, the modules live in the repository root and the random data generator in Data
+"""
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for folder in (ROOT, os.path.join(ROOT, 'Data')):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
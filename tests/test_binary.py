@@ -0,0 +1,57 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests of saving a DataSet with ToBinary and loading it back with FromBinary
+"""
+import RandomData
+import PepTo3
+import numpy as np
+import pytest
+import os
+
+MATERIALS = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """Seeded random files in their own folder, with the binary folders saved next to it
+    """
+    folder = os.path.join(str(tmp_path), 'data')
+    os.mkdir(folder)
+    RandomData.GenerateFiles(folder, 64, seed = 1)
+    monkeypatch.chdir(tmp_path)
+
+    return folder
+
+def Filled(root, **options):
+    dset = PepTo3.DataSet(MATERIALS, **options)
+    dset.FillDataSet(PepTo3.GetDirectories(root), root = root)
+    return dset
+
+def AssertSameSamples(loaded, saved):
+    assert np.array_equal(loaded.group_keys, saved.group_keys)
+    assert np.array_equal(loaded.stats.count, saved.stats.count)
+    assert np.allclose(loaded.stats.mean, saved.stats.mean)
+    for group in range(saved.n_groups):
+        for parameter in saved.parameters:
+            assert np.array_equal(loaded.GetGroup(group, parameter), saved.GetGroup(group, parameter))
+
+def test_round_trip(root):
+    dset = Filled(root)
+    loaded = PepTo3.FromBinary(dset.ToBinary('saved'))
+
+    assert len(loaded.record_groups) == 64
+    AssertSameSamples(loaded, dset)
+
+def test_spilled_samples_round_trip(root, tmp_path):
+    dset = Filled(root, spill = os.path.join(str(tmp_path), 'spill'))
+    loaded = PepTo3.FromBinary(dset.ToBinary('spilled'), mmap = True)
+
+    assert len(loaded.record_groups) == 64
+    AssertSameSamples(loaded, Filled(root))
+
+def test_statistics_only_dataset_is_refused(root):
+    dset = Filled(root, keep_samples = False)
+
+    with pytest.raises(ValueError):
+        dset.ToBinary('statistics')
+    assert not os.path.exists('statistics_all_samples_pepto')
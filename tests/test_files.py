@@ -0,0 +1,65 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests of reading pappy files that hold more than one measurement
+"""
+from PappyCache import ManifestCache
+import RandomData
+import PepTo3
+import numpy as np
+import os
+
+MATERIALS = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
+
+def test_every_row_of_a_file_is_read(tmp_path):
+    root = str(tmp_path)
+    paths = RandomData.GenerateFiles(root, 30, seed = 1)
+
+    # A second measurement of another sample appended to one file
+    with open(os.path.join(root, paths[0]), 'a') as file:
+        file.write(RandomData.FormatRow('gold_annealed_900_trial_01.csv', [0.5, 0.003, 0.2, 0.002, 0.2, 0.002]) + '\n')
+
+    dset = PepTo3.DataSet(MATERIALS)
+    dset.FillDataSet(PepTo3.GetDirectories(root), root = root)
+    assert len(dset.record_groups) == 31
+
+    # The appended row goes to its own sample's group, not the one in the file name
+    group = dset.lookup[(dset.col_indeces['gold'], dset.row_indeces['annealed'])]
+    assert 0.5 in dset.GetGroup(group, 'S Parameter')
+
+    # Read through the parse cache, the file is parsed again rather than cached as a single row
+    cache = ManifestCache(os.path.join(root, 'cache.npz'))
+    for _ in range(2):
+        cached = PepTo3.DataSet(MATERIALS)
+        cached.FillDataSet(PepTo3.GetDirectories(root), cache = cache, root = root)
+        assert np.array_equal(cached.columns['S Parameter'], dset.columns['S Parameter'])
+    assert cached.ingest_report['hits'] == 29
+
+def test_tags_of_bulk_rows_are_keys(tmp_path):
+    root = str(tmp_path)
+    names, values = RandomData.GenerateRecords(40, seed = 2)
+
+    # The same measurements as tagged pappy files and as the tagged sample names of one bulk csv
+    rows = []
+    for number, (name, row) in enumerate(zip(names, values.tolist())):
+        material, anneal, rest = name.split('_', 2)
+        tagged = f"{material}_{anneal}_temperature-{300 + 100 * (number % 2)}K_{rest}"
+        line = RandomData.FormatRow(tagged, row)
+        with open(os.path.join(root, tagged.replace('.csv', '_pappy.csv')), 'w') as file:
+            file.write(RandomData.header + '\n' + line + '\n')
+        rows.append(line)
+
+    bulk = os.path.join(root, 'bulk.csv')
+    with open(bulk, 'w') as file:
+        file.write(RandomData.header + '\n' + '\n'.join(rows) + '\n')
+
+    from_files = PepTo3.DataSet(MATERIALS, keys = ['temperature'])
+    from_files.FillDataSet(PepTo3.GetDirectories(root), root = root)
+    from_bulk = PepTo3.DataSet(MATERIALS, keys = ['temperature'])
+    from_bulk.FillFromBulk(bulk)
+
+    assert sorted(from_bulk.category_names[2]) == ['300K', '400K']
+    table, bulk_table = from_files.Table('S Parameter', 'mean'), from_bulk.Table('S Parameter', 'mean')
+    assert [row['temperature'] for row in bulk_table] == [row['temperature'] for row in table]
+    assert [row['count'] for row in bulk_table] == [row['count'] for row in table]
+    assert np.allclose([row['mean'] for row in bulk_table], [row['mean'] for row in table])
@@ -0,0 +1,56 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests that the grouped fits of PepToFit match fitting every group on its own
+"""
+from PepToFit import FitGroups, FitAccumulator
+import numpy as np
+import pytest
+
+N_GROUPS = 8
+
+@pytest.fixture
+def points():
+    """Seeded S vs. W points along a different line in every group, group 7 left empty
+    """
+    rng = np.random.default_rng(7)
+    groups = rng.integers(0, N_GROUPS - 1, 2000)
+    x = rng.uniform(0.18, 0.32, len(groups))
+    y = 0.7 - (0.2 + 0.05 * groups) * x + rng.normal(0, 0.004, len(groups))
+
+    return x, y, groups
+
+def test_ols_matches_polyfit(points):
+    x, y, groups = points
+    fit = FitGroups(x, y, groups, N_GROUPS, method = 'ols')
+
+    for group in range(N_GROUPS - 1):
+        mask = groups == group
+        (slope, intercept), covariance = np.polyfit(x[mask], y[mask], 1, cov = True)
+
+        assert fit['n'][group] == np.count_nonzero(mask)
+        assert fit['slope'][group] == pytest.approx(slope, rel = 1e-10)
+        assert fit['intercept'][group] == pytest.approx(intercept, rel = 1e-10)
+        assert np.allclose(fit['covariance'][group], covariance, rtol = 1e-8, atol = 0)
+        assert fit['r_squared'][group] == pytest.approx(np.corrcoef(x[mask], y[mask])[0, 1] ** 2, rel = 1e-10)
+
+    assert fit['n'][N_GROUPS - 1] == 0
+    assert fit['converged'].all()
+
+def test_merged_moments_match_one_pass(points):
+    x, y, groups = points
+
+    whole = FitAccumulator(N_GROUPS)
+    whole.Add(x, y, groups)
+
+    merged = FitAccumulator(N_GROUPS)
+    for part in np.array_split(np.arange(len(x)), 5):
+        shard = FitAccumulator(N_GROUPS)
+        shard.Add(x[part], y[part], groups[part])
+        merged.Merge(shard)
+
+    fit, merged_fit = FitGroups(x, y, groups, N_GROUPS), merged.Fit()
+    assert np.array_equal(merged_fit['n'], fit['n'])
+    for name in ('slope', 'intercept', 'r_squared'):
+        assert np.allclose(merged_fit[name], fit[name], rtol = 1e-10, atol = 0, equal_nan = True)
+        assert np.allclose(whole.Fit()[name], fit[name], rtol = 1e-10, atol = 0, equal_nan = True)
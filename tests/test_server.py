@@ -0,0 +1,99 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests of the response cache and reloads of PepToServer
+"""
+from PepToServer import QueryService, StartServer
+from urllib.request import urlopen
+from urllib.error import HTTPError
+import concurrent.futures
+import RandomData
+import pytest
+import json
+import os
+
+@pytest.fixture
+def served(tmp_path):
+    """A service over seeded random files that checks them on every query, and its base url
+    """
+    root = str(tmp_path)
+    RandomData.GenerateFiles(root, 50, seed = 1)
+    service = QueryService(root, check_interval = 0)
+    server, url = StartServer(service)
+    yield service, url
+    server.shutdown()
+    server.server_close()
+
+def Get(url):
+    with urlopen(url) as response:
+        return response.read()
+
+def Error(url):
+    """HTTP status and JSON body of a request that is expected to fail
+    """
+    with pytest.raises(HTTPError) as caught:
+        Get(url)
+    return caught.value.code, json.loads(caught.value.read())
+
+def Records(body):
+    return sum(sum(counts.values()) for counts in json.loads(body)['counts'].values())
+
+def test_repeated_queries_are_cached(served):
+    service, url = served
+
+    first = Get(url + '/stats?statistic=mean')
+    assert (service.hits, service.misses) == (0, 1)
+    assert Get(url + '/stats?statistic=mean') == first
+    assert (service.hits, service.misses) == (1, 1)
+
+    # Identical requests arriving together make the response once
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        bodies = list(pool.map(Get, [url + '/stats?statistic=std'] * 8))
+    assert len(set(bodies)) == 1
+    assert (service.hits, service.misses) == (8, 2)
+
+def test_new_files_reload_the_dataset(served):
+    service, url = served
+    assert Records(Get(url + '/stats')) == 50
+
+    os.mkdir(os.path.join(service.root, 'run2'))
+    RandomData.GenerateFiles(os.path.join(service.root, 'run2'), 25, seed = 2)
+
+    assert Records(Get(url + '/stats')) == 75
+    status = json.loads(Get(url + '/status'))
+    assert (status['files'], status['records'], status['loads']) == (75, 75, 2)
+    assert status['cache']['size'] == 1
+
+def test_bad_queries_get_errors(served):
+    service, url = served
+
+    assert Error(url + '/stats?statistic=mode')[0] == 400
+    assert Error(url + '/groups?by=temperature')[0] == 400
+    assert Error(url + '/nothing')[0] == 404
+
+def test_unreadable_files_are_quarantined(served):
+    service, url = served
+
+    with open(os.path.join(service.root, 'lead_annealed_999_trial_01_pappy.csv'), 'w') as file:
+        file.write('garbage\n')
+
+    assert Records(Get(url + '/stats')) == 50
+    status = json.loads(Get(url + '/status'))
+    assert (status['files'], status['quarantined'], status['loads']) == (51, 1, 2)
+
+def test_unreadable_file_without_quality_checks_is_an_error(tmp_path):
+    root = str(tmp_path)
+    RandomData.GenerateFiles(root, 10, seed = 1)
+    service = QueryService(root, quality = 'none', check_interval = 0)
+    server, url = StartServer(service)
+
+    try:
+        # A reload that can't read a file answers with a 500 instead of dropping the connection
+        with open(os.path.join(root, 'lead_annealed_999_trial_01_pappy.csv'), 'w') as file:
+            file.write('garbage\n')
+        status, body = Error(url + '/stats')
+        assert status == 500
+        assert 'error' in body
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,64 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests that the map-reduce ingest of PepToShards gives the DataSet of reading the roots one after another
+"""
+from PepToShards import MapReduceRoots, FillRoots
+from PepToQuality import QualityCheck
+import RandomData
+import numpy as np
+import pytest
+import os
+
+MATERIALS = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
+
+@pytest.fixture
+def roots(tmp_path):
+    """Three data roots of seeded random files, one of them spread over batch subfolders
+    """
+    folders = []
+    for seed, (n_files, files_per_folder) in enumerate([(60, 1000), (45, 20), (30, 1000)]):
+        folder = os.path.join(str(tmp_path), f"root_{seed}")
+        os.mkdir(folder)
+        RandomData.GenerateFiles(folder, n_files, seed = seed, files_per_folder = files_per_folder)
+        folders.append(folder)
+
+    return folders
+
+def AssertSame(merged, reference):
+    """Checks two DataSets hold the same groups, records, statistics and fit moments, bit for bit
+    """
+    assert np.array_equal(merged.group_keys, reference.group_keys)
+    assert np.array_equal(merged.record_groups, reference.record_groups)
+    for parameter in reference.parameters:
+        assert np.array_equal(merged.columns[parameter], reference.columns[parameter])
+    for name in ('count', 'mean', 'minimum', 'maximum', 'weighted_sum', 'weight_total'):
+        assert np.array_equal(getattr(merged.stats, name), getattr(reference.stats, name))
+    for name in ('n', 'mean_x', 'mean_y', 'sxx', 'syy', 'sxy'):
+        assert np.array_equal(getattr(merged.fit_stats, name), getattr(reference.fit_stats, name))
+
+def test_shards_match_single_process(roots):
+    merged = MapReduceRoots(roots, MATERIALS, processes = 2)
+    reference = FillRoots(roots, MATERIALS)
+
+    AssertSame(merged, reference)
+    assert merged.ingest_report['files'] == 135
+    assert merged.ingest_report['shards'] == 3
+    assert set(merged.ingest_report['reports']) == set(roots)
+
+def test_shards_run_the_same_quality_checks(roots):
+    # Far stricter than the defaults, so the shards would quarantine different records if they fell back to them
+    quality = QualityCheck('mad', 1.5, 2)
+    merged = MapReduceRoots(roots, MATERIALS, quality = quality, processes = 2)
+
+    reference_quality = QualityCheck('mad', 1.5, 2)
+    reference = FillRoots(roots, MATERIALS, quality = reference_quality)
+
+    AssertSame(merged, reference)
+    report, reference_report = quality.Report(), reference_quality.Report()
+    assert 0 < report['quarantined'] < 135
+    assert report['checked'] == reference_report['checked'] == 135
+    assert report['counts'] == reference_report['counts']
+    assert report['sources'] == reference_report['sources']
+    assert merged.ingest_report['quarantined'] == report['quarantined']
+    assert len(merged.record_groups) == 135 - report['quarantined']
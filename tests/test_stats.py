@@ -0,0 +1,70 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests that the one-pass statistics of PepToStats match computing them over all the records at once
+"""
+from PepToStats import GroupStatistics
+import RandomData
+import numpy as np
+import pytest
+
+N_GROUPS = 12
+
+@pytest.fixture
+def records():
+    """Seeded RandomData parameters spread over the groups, the last group left empty
+    """
+    _, values = RandomData.GenerateRecords(3000, seed = 5)
+    groups = np.random.default_rng(5).integers(0, N_GROUPS - 1, len(values))
+
+    return values, groups
+
+def AssertClose(stats, reference):
+    assert np.array_equal(stats.count, reference.count)
+    assert np.array_equal(stats.minimum, reference.minimum)
+    assert np.array_equal(stats.maximum, reference.maximum)
+    for name in ('mean', 'm2', 'weighted_sum', 'weight_total'):
+        assert np.allclose(getattr(stats, name), getattr(reference, name), rtol = 1e-12, atol = 0)
+
+def test_one_pass_matches_numpy(records):
+    values, groups = records
+    stats = GroupStatistics(N_GROUPS, values.shape[1])
+    stats.Add(values, groups)
+
+    for group in range(N_GROUPS - 1):
+        members = values[groups == group]
+        assert stats.count[group] == len(members)
+        assert np.allclose(stats.Mean()[group], members.mean(axis = 0), rtol = 1e-12, atol = 0)
+        assert np.allclose(stats.Variance()[group], members.var(axis = 0, ddof = 1), rtol = 1e-10, atol = 0)
+        for parameter, uncertainty in stats.uncertainty_pairs.items():
+            weights = 1 / members[:, uncertainty] ** 2
+            assert stats.WeightedMean()[group, parameter] == pytest.approx(np.average(members[:, parameter], weights = weights), rel = 1e-12)
+
+    assert stats.count[N_GROUPS - 1] == 0
+    assert np.isnan(stats.Mean()[N_GROUPS - 1]).all()
+
+def test_split_then_merge_matches_one_add(records):
+    values, groups = records
+    whole = GroupStatistics(N_GROUPS, values.shape[1])
+    whole.Add(values, groups)
+
+    # Uneven shards, one of them too small to reach every group
+    merged = GroupStatistics(N_GROUPS, values.shape[1])
+    for part in np.split(np.arange(len(values)), [7, 1200, 2500]):
+        shard = GroupStatistics(N_GROUPS, values.shape[1])
+        shard.Add(values[part], groups[part])
+        merged.Merge(shard)
+
+    AssertClose(merged, whole)
+
+def test_reduce_matches_adding_to_the_coarser_groups(records):
+    values, groups = records
+    stats = GroupStatistics(N_GROUPS, values.shape[1])
+    stats.Add(values, groups)
+
+    # Roll every three groups up into one
+    mapping = np.arange(N_GROUPS) // 3
+    coarse = GroupStatistics(N_GROUPS // 3, values.shape[1])
+    coarse.Add(values, mapping[groups])
+
+    AssertClose(stats.Reduce(mapping, N_GROUPS // 3), coarse)
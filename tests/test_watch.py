@@ -0,0 +1,68 @@
+"""
+BYU-Idaho Positron Annihilation Spectroscopy Team
+
+Tests of the drop-in ingest of PepToWatch
+"""
+from PepToWatch import Watcher
+import RandomData
+import PepTo3
+import numpy as np
+import shutil
+import os
+
+MATERIALS = ['nickel', 'aluminum', 'tungsten', 'gold', 'copper', 'lead']
+
+def Groups(dset):
+    """Sorted S parameters of every group, by name, so datasets filled in a different order can be compared
+    """
+    return {dset.Label(dset.Key(group)): np.sort(dset.GetGroup(group, 'S Parameter')) for group in dset.DisplayOrder()}
+
+def test_dropped_files_are_ingested(tmp_path):
+    root = str(tmp_path)
+    dset = PepTo3.DataSet(MATERIALS)
+    watcher = Watcher(dset, root, settle_polls = 0)
+    assert watcher.Poll() == []
+
+    first = RandomData.GenerateFiles(root, 40, seed = 1)
+    assert sorted(watcher.Poll()) == sorted(first)
+
+    # A second batch in a new folder, next to a material that isn't analyzed and a file that isn't named like a pappy file
+    os.mkdir(os.path.join(root, 'run2'))
+    second = ['run2/' + path for path in RandomData.GenerateFiles(os.path.join(root, 'run2'), 30, seed = 2)]
+    other = ['run2/' + path for path in RandomData.GenerateFiles(os.path.join(root, 'run2'), 3, seed = 3, materials = ['silver'])]
+    with open(os.path.join(root, 'run2', 'notes_pappy.csv'), 'w') as file:
+        file.write('not a measurement\n')
+
+    assert sorted(watcher.Poll()) == sorted(second)
+    assert set(watcher.ignored) == set(other) | {'run2/notes_pappy.csv'}
+    assert watcher.Poll() == []
+
+    # The same records as reading every file at once
+    reference = PepTo3.DataSet(MATERIALS)
+    reference.FillDataSet(first + second, root = root)
+
+    assert len(dset.record_groups) == len(first) + len(second)
+    watched, read = Groups(dset), Groups(reference)
+    assert watched.keys() == read.keys()
+    for name in read:
+        assert np.array_equal(watched[name], read[name])
+    assert np.allclose(dset.StatisticTable('mean')[dset.DisplayOrder()], reference.StatisticTable('mean')[reference.DisplayOrder()])
+
+def test_same_tick_writes_are_found(tmp_path):
+    root = str(tmp_path)
+    dset = PepTo3.DataSet(MATERIALS)
+    watcher = Watcher(dset, root, settle_polls = 0)
+
+    first = RandomData.GenerateFiles(root, 1, seed = 4)
+    assert watcher.Poll() == first
+    stamp = os.stat(root).st_mtime_ns
+
+    # A file added without the folder's modification time moving, as when both writes land in one clock tick
+    os.mkdir(os.path.join(root, 'scratch'))
+    late = RandomData.GenerateFiles(os.path.join(root, 'scratch'), 1, seed = 5)[0]
+    name = late.replace('_1_', '_2_')
+    shutil.move(os.path.join(root, 'scratch', late), os.path.join(root, name))
+    os.rmdir(os.path.join(root, 'scratch'))
+    os.utime(root, ns = (stamp, stamp))
+
+    assert watcher.Poll() == [name]